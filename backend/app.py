@@ -1,9 +1,37 @@
-from fastapi import FastAPI, File, UploadFile, WebSocket
+from fastapi import FastAPI, File, Form, Query, Request, UploadFile, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from starlette.background import BackgroundTask
 import uvicorn
+import asyncio
+import hashlib
+import json
 import os
+import threading
+import time
+from typing import List
+
+from bulk_images import stream_bulk
+from job_queue import JobManager, QueueFullError
+from live_tracking import LiveTrackingSession, sessions as live_sessions
+from metrics import QUEUE_DEPTH, metrics
+from micro_batcher import MicroBatcher
+from model_registry import registry
+from retention import OUTPUT_RETENTION_INTERVAL_S, OutputRetention
+from response_formats import RESPONSE_FORMATS, to_compact, to_npy_array_bytes, to_npy_bytes
+from roi import parse_classes
+from stream_scheduler import StreamScheduler
+from tiling import tiling_options
+from result_cache import ImageResultCache, VideoResultCache, cache_key
+from track_log import TRACK_LOG_MAX_ROWS, load_track_log, query_track_log, rows_to_json
+from uploads import MAX_UPLOAD_BYTES, UploadTooLargeError, save_upload
+from video_delivery import video_response
+from video_encoding import encoding_options
+from video_pipeline import queue_depths
+import video_sharding
+from video_sharding import VIDEO_PROCESS_WORKERS
 
 app = FastAPI(title="Autonomous Driving")
 
@@ -20,33 +48,208 @@ app.add_middleware(
 os.makedirs("static", exist_ok=True)
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
+# File de jobs vidéo : les traitements longs ne bloquent plus la boucle d'événements
+# Avec VIDEO_PROCESS_WORKERS, un job par processus peut tourner en parallèle
+video_jobs = JobManager(
+    max_workers=int(os.environ.get("VIDEO_JOB_WORKERS", str(max(1, VIDEO_PROCESS_WORKERS)))),
+    max_queued=int(os.environ.get("VIDEO_JOB_MAX_QUEUED", "4")),
+)
+
+# Regroupement des requêtes /api/process-image concurrentes en lots
+image_batcher = MicroBatcher() if os.environ.get("IMAGE_BATCHING", "1") != "0" else None
+
+# Flux caméra suivis en continu; les requêtes image y passent en priorité
+stream_scheduler = StreamScheduler()
+
+# Résultats déjà calculés, indexés par hash du contenu + modèle + paramètres
+image_cache = ImageResultCache()
+video_cache = VideoResultCache()
+
+# Nettoyage périodique de static/ (âge maximal et quota disque des sorties)
+output_retention = OutputRetention("static")
+
+# Profondeur des files, lue au moment de la collecte Prometheus
+QUEUE_DEPTH.set_function(lambda: video_jobs.stats()["queued"], queue="video_jobs")
+QUEUE_DEPTH.set_function(lambda: video_jobs.stats()["running"], queue="video_jobs_running")
+QUEUE_DEPTH.set_function(lambda: queue_depths()["decoded"], queue="video_pipeline_decoded")
+QUEUE_DEPTH.set_function(lambda: queue_depths()["inferred"], queue="video_pipeline_inferred")
+if image_batcher is not None:
+    QUEUE_DEPTH.set_function(lambda: image_batcher.stats()["queued"], queue="image_batcher")
+QUEUE_DEPTH.set_function(lambda: stream_scheduler.stats()["image_lane"]["queued"], queue="stream_image_lane")
+
+HTTP_LATENCY = metrics.histogram("http_request_seconds", "Durée des requêtes HTTP par route", ("method", "route"))
+
+
+def _remove_file(path: str):
+    if os.path.exists(path):
+        os.remove(path)
+
+
+async def _submit_video_job(file: UploadFile, process_fn, **options):
+    # Le cache est consulté avant la file : une vidéo déjà traitée est servie même file pleine
+    hasher = hashlib.sha256()
+    try:
+        upload_path = await run_in_threadpool(save_upload, file, MAX_UPLOAD_BYTES, hasher)
+    except UploadTooLargeError as e:
+        return JSONResponse(status_code=413, content={"success": False, "error": str(e)})
+
+    params = {k: v for k, v in options.items() if k != "model_name"}
+    key = cache_key(hasher.hexdigest(), options.get("model_name"), {"process": process_fn.__name__, **params})
+    cached = video_cache.get(key)
+    if cached is not None:
+        # Même vidéo, mêmes paramètres : job terminé immédiatement
+        _remove_file(upload_path)
+        # Sorties resservies : la rétention les compte comme récemment utilisées
+        output_retention.touch(cached["processed_video"])
+        job_id = video_jobs.complete({**cached, "cached": True})
+        return {"success": True, "job_id": job_id, "status": "done", "cached": True}
+
+    def process_and_cache(video_path, progress_callback=None, **kwargs):
+        result = process_fn(video_path, progress_callback=progress_callback, **kwargs)
+        if result.get("success"):
+            video_cache.put(key, result)
+        return result
+
+    try:
+        job_id = video_jobs.submit(process_and_cache, upload_path, cleanup=lambda: _remove_file(upload_path), **options)
+    except QueueFullError as e:
+        _remove_file(upload_path)
+        return JSONResponse(status_code=429, content={"success": False, "error": str(e)})
+
+    return {"success": True, "job_id": job_id, "status": "queued"}
+
+
+@app.middleware("http")
+async def limit_upload_size(request: Request, call_next):
+    # Refuser avant de parser le multipart quand la taille annoncée est trop grande
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > MAX_UPLOAD_BYTES:
+        return JSONResponse(
+            status_code=413,
+            content={"success": False, "error": f"Fichier trop volumineux (max {MAX_UPLOAD_BYTES // (1024 * 1024)} Mo)"}
+        )
+    return await call_next(request)
+
+
+@app.middleware("http")
+async def record_latency(request: Request, call_next):
+    start = time.perf_counter()
+    response = await call_next(request)
+    # Libellé = gabarit de la route (/api/jobs/{job_id}) pour borner la cardinalité
+    route = request.scope.get("route")
+    if route is not None:
+        HTTP_LATENCY.observe(time.perf_counter() - start, method=request.method, route=route.path)
+    return response
+
 
 @app.get("/")
 async def root():
     return {"message": "  Autonomous Driving API", "status": "active"}
 
 
+@app.on_event("startup")
+async def warmup_models():
+    # Échauffement en arrière-plan : /health répond pendant le chargement
+    app.state.warmup_task = asyncio.create_task(run_in_threadpool(registry.warmup))
+
+
+@app.on_event("shutdown")
+async def stop_streams():
+    await run_in_threadpool(stream_scheduler.close)
+
+
+@app.on_event("startup")
+async def start_output_retention():
+    app.state.retention_task = asyncio.create_task(_sweep_outputs_periodically())
+
+
+async def _sweep_outputs_periodically():
+    while True:
+        try:
+            await run_in_threadpool(output_retention.sweep)
+        except Exception as e:
+            print(f"Erreur rétention des sorties: {e}")
+        await asyncio.sleep(OUTPUT_RETENTION_INTERVAL_S)
+
+
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "model_loaded": True}
+    models = registry.status()
+    return {
+        "status": "healthy" if models["warmup"] != "failed" else "degraded",
+        "model_loaded": models["model_loaded"],
+        "models": models,
+        "video_jobs": video_jobs.stats(),
+        "image_batching": image_batcher.stats() if image_batcher is not None else None,
+        "video_sharding": video_sharding.sharded.stats() if VIDEO_PROCESS_WORKERS else None,
+        "streams": stream_scheduler.stats()["aggregate"],
+    }
+
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Métriques au format texte Prometheus (latences par étape, fps, files)"""
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 # Les autres endpoints restent identiques...
 
 
 @app.post("/api/process-image")
-async def process_image_endpoint(file: UploadFile = File(...)):
+async def process_image_endpoint(
+    file: UploadFile = File(...),
+    model: str = Form(None),
+    format: str = Query("json"),
+    tiled: bool = Form(None),
+    tile_size: int = Form(None),
+):
     try:
         from inference_tracking import process_image
+        if format not in RESPONSE_FORMATS:
+            return {"success": False, "error": f"Format inconnu: {format} (disponibles: {', '.join(RESPONSE_FORMATS)})"}
+
         image_data = await file.read()
-        result = process_image(image_data)
+        model_name = registry.resolve(model)
+        # Pas d'image annotée à encoder pour les formats détections seules
+        annotate = {"json": "base64", "jpeg": "jpeg"}.get(format)
+
+        # Découpage en tuiles pour les images haute résolution (petits véhicules lointains)
+        tiling = tiling_options(tiled, tile_size)
+
+        key = cache_key(hashlib.sha256(image_data).hexdigest(), model_name, {"annotate": annotate, "tiling": tiling})
+        result = image_cache.get(key)
+        if result is None:
+            # Pendant un suivi multi-flux, l'image rejoint le prochain lot partagé (voie prioritaire)
+            if stream_scheduler.serves(model_name):
+                infer = stream_scheduler.infer
+            else:
+                infer = image_batcher.infer if image_batcher is not None else None
+            result = await run_in_threadpool(process_image, image_data, model_name, infer, annotate, tiling)
 
-        # Vérifier si le résultat contient une erreur
-        if "error" in result:
-            return {"success": False, "error": result["error"]}
+            # Vérifier si le résultat contient une erreur
+            if "error" in result:
+                return {"success": False, "error": result["error"]}
+            image_cache.put(key, result)
+
+        detections = result.get("detections", [])
+        if format == "compact":
+            return {"success": True, **to_compact(detections)}
+        if format == "npy":
+            return Response(
+                content=to_npy_bytes(detections),
+                media_type="application/octet-stream",
+                headers={"X-Detections": str(len(detections))}
+            )
+        if format == "jpeg":
+            # Sans détection, l'image d'origine est renvoyée telle quelle
+            return Response(
+                content=result.get("processed_image") or image_data,
+                media_type="image/jpeg" if result.get("processed_image") else (file.content_type or "image/jpeg"),
+                headers={"X-Detections": str(len(detections))}
+            )
 
         return {
             "success": True,
-            "detections": result.get("detections", []),
+            "detections": detections,
             "processed_image": result.get("processed_image")
         }
 
@@ -54,47 +257,262 @@ async def process_image_endpoint(file: UploadFile = File(...)):
         return {"success": False, "error": str(e)}
 
 
+@app.post("/api/process-images/bulk")
+async def process_images_bulk_endpoint(
+    files: List[UploadFile] = File(...),
+    model: str = Form(None),
+    annotate: bool = Form(False),
+    format: str = Query("json"),
+):
+    """Lot d'images (zip, tar ou plusieurs fichiers) : une ligne NDJSON par image, puis un résumé"""
+    if format not in ("json", "compact"):
+        return JSONResponse(status_code=400, content={"success": False, "error": f"Format inconnu: {format} (json, compact)"})
+    try:
+        model_name = registry.resolve(model)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"success": False, "error": str(e)})
+
+    # Copie sur disque : les archives sont lues pendant la réponse, après la fin de la requête
+    uploads = []
+    try:
+        for file in files:
+            path = await run_in_threadpool(save_upload, file, MAX_UPLOAD_BYTES)
+            uploads.append((path, file.filename or os.path.basename(path)))
+    except UploadTooLargeError as e:
+        for path, _ in uploads:
+            _remove_file(path)
+        return JSONResponse(status_code=413, content={"success": False, "error": str(e)})
+
+    # Appelé par le pipeline quand il a fini de lire, puis en tâche de fond après la réponse
+    # (client déconnecté avant le début du flux) : chaque fichier n'est supprimé qu'une fois
+    pending = [path for path, _ in uploads]
+    pending_lock = threading.Lock()
+
+    def cleanup():
+        with pending_lock:
+            paths = pending[:]
+            pending.clear()
+        for path in paths:
+            _remove_file(path)
+
+    return StreamingResponse(
+        stream_bulk(uploads, model_name, annotate=annotate, format=format, cleanup=cleanup),
+        media_type="application/x-ndjson",
+        background=BackgroundTask(cleanup),
+    )
+
+
 @app.post("/api/process-video")
-async def process_video_detection_endpoint(file: UploadFile = File(...)):
+async def process_video_detection_endpoint(
+    file: UploadFile = File(...),
+    model: str = Form(None),
+    codec: str = Form(None),
+    preset: str = Form(None),
+    crf: int = Form(None),
+    output_width: int = Form(None),
+    roi: str = Form(None),
+    classes: str = Form(None),
+    tiled: bool = Form(None),
+    tile_size: int = Form(None),
+    tile_every: int = Form(None),
+):
     try:
         from inference_tracking import process_video_detection
-        result = process_video_detection(file)
-        return result
+        if VIDEO_PROCESS_WORKERS:
+            process_video_detection = video_sharding.process_video_detection
+        return await _submit_video_job(
+            file, process_video_detection, model_name=registry.resolve(model),
+            encoding=encoding_options(codec, preset, crf, output_width),
+            roi=json.loads(roi) if roi else None,
+            classes=parse_classes(classes),
+            tiling=tiling_options(tiled, tile_size, tile_every),
+        )
     except Exception as e:
         return {"success": False, "error": str(e)}
 
 
 @app.post("/api/process-video-tracking")
-async def process_video_tracking_endpoint(file: UploadFile = File(...)):
+async def process_video_tracking_endpoint(
+    file: UploadFile = File(...),
+    stride: int = Form(None),
+    adaptive: bool = Form(False),
+    line: str = Form(None),
+    zone: str = Form(None),
+    model: str = Form(None),
+    codec: str = Form(None),
+    preset: str = Form(None),
+    crf: int = Form(None),
+    output_width: int = Form(None),
+    roi: str = Form(None),
+    classes: str = Form(None),
+    tiled: bool = Form(None),
+    tile_size: int = Form(None),
+    tile_every: int = Form(None),
+):
     try:
         from inference_tracking import process_video_tracking
-        result = process_video_tracking(file)
-        return result
+        if VIDEO_PROCESS_WORKERS:
+            process_video_tracking = video_sharding.process_video_tracking
+        # line : [[x1, y1], [x2, y2]], zone et roi : [[x, y], ...] en JSON
+        # classes : "car,truck", "2,7" ou "vehicles"
+        # tiled : inférence par tuiles de tile_size px, une inférence sur tile_every
+        return await _submit_video_job(
+            file, process_video_tracking, stride=stride, adaptive=adaptive,
+            line=json.loads(line) if line else None,
+            zone=json.loads(zone) if zone else None,
+            model_name=registry.resolve(model),
+            encoding=encoding_options(codec, preset, crf, output_width),
+            roi=json.loads(roi) if roi else None,
+            classes=parse_classes(classes),
+            tiling=tiling_options(tiled, tile_size, tile_every),
+        )
     except Exception as e:
         return {"success": False, "error": str(e)}
 
 
+@app.get("/api/cache/stats")
+async def cache_stats_endpoint():
+    return {"image": image_cache.stats(), "video": video_cache.stats(), "outputs": output_retention.stats()}
+
+
+@app.get("/api/jobs/{job_id}")
+async def job_status_endpoint(job_id: str):
+    status = video_jobs.get(job_id)
+    if status is None:
+        return JSONResponse(status_code=404, content={"success": False, "error": "Job introuvable"})
+    return {"success": True, **status}
+
+
+@app.get("/api/jobs/{job_id}/result")
+async def job_result_endpoint(job_id: str, format: str = Query("json")):
+    job = video_jobs.result(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"success": False, "error": "Job introuvable"})
+
+    if job["status"] in ("queued", "running"):
+        return JSONResponse(
+            status_code=409,
+            content={"success": False, "status": job["status"], "error": "Job non terminé"}
+        )
+
+    if job["result"] is None:
+        return {"success": False, "status": job["status"], "error": job["error"]}
+    if format == "compact":
+        # L'aperçu reste accessible via preview_url
+        return {k: v for k, v in job["result"].items() if k != "preview_image"}
+    return job["result"]
+
+
+@app.get("/api/tracks/{run_id}")
+async def track_log_endpoint(
+    run_id: str,
+    start: float = Query(None),
+    end: float = Query(None),
+    track_id: int = Query(None),
+    class_id: int = Query(None),
+    limit: int = Query(TRACK_LOG_MAX_ROWS),
+    format: str = Query("json"),
+):
+    """Détections enregistrées d'un traitement vidéo, sans relancer l'inférence"""
+    if os.path.basename(run_id) != run_id:
+        return JSONResponse(status_code=404, content={"success": False, "error": "Journal introuvable"})
+    try:
+        log, meta = load_track_log(os.path.join("static", run_id + ".mp4"))
+    except (OSError, ValueError):
+        return JSONResponse(status_code=404, content={"success": False, "error": "Journal introuvable"})
+    output_retention.touch(run_id)
+
+    rows = query_track_log(log, meta["fps"], start=start, end=end, track_id=track_id, class_id=class_id)
+    if format == "npy":
+        return Response(content=to_npy_array_bytes(rows), media_type="application/octet-stream",
+                        headers={"X-Rows": str(len(rows)), "X-FPS": str(meta["fps"])})
+
+    limit = max(0, min(limit, TRACK_LOG_MAX_ROWS))
+    return {
+        "success": True,
+        "run_id": run_id,
+        "fps": meta["fps"],
+        "frames": meta["frames"],
+        "class_names": meta["class_names"],
+        "columns": ["frame", "time_s", "tracker_id", "class_id", "confidence", "x1", "y1", "x2", "y2"],
+        "total_rows": len(rows),
+        "truncated": len(rows) > limit,
+        "rows": rows_to_json(rows[:limit], meta["fps"]),
+    }
+
+
 @app.get("/api/download-video/{filename}")
-async def download_video_endpoint(filename: str):
+async def download_video_endpoint(filename: str, request: Request):
+    """Vidéo traitée : requêtes Range (lecture/reprise), flux suivi pendant l'encodage"""
     file_path = os.path.join("static", filename)
-    if os.path.exists(file_path):
-        return FileResponse(
-            file_path,
-            media_type="video/mp4",
-            filename=filename
+    if os.path.basename(filename) != filename or not os.path.isfile(file_path):
+        return JSONResponse(status_code=404, content={"success": False, "error": "File not found"})
+
+    output_retention.touch(filename)
+    return video_response(file_path, range_header=request.headers.get("range"), filename=filename)
+
+
+@app.post("/api/streams")
+async def add_stream_endpoint(
+    source: str = Form(...),
+    name: str = Form(None),
+    line: str = Form(None),
+    zone: str = Form(None),
+    classes: str = Form(None),
+    realtime: bool = Form(True),
+    loop: bool = Form(False),
+):
+    """Ajoute une caméra (rtsp://..., http://...) ou un fichier local au suivi multi-flux"""
+    try:
+        stream = stream_scheduler.add_source(
+            source, name=name,
+            line=json.loads(line) if line else None,
+            zone=json.loads(zone) if zone else None,
+            classes=parse_classes(classes),
+            realtime=realtime, loop=loop,
         )
+    except RuntimeError as e:
+        return JSONResponse(status_code=429, content={"success": False, "error": str(e)})
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"success": False, "error": str(e)})
+    return {"success": True, "stream_id": stream.stream_id, "name": stream.name}
+
+
+@app.get("/api/streams")
+async def streams_stats_endpoint():
+    """Débit par flux et agrégé, équité du partage du modèle"""
+    return {"success": True, **stream_scheduler.stats()}
+
+
+@app.get("/api/streams/{stream_id}")
+async def stream_stats_endpoint(stream_id: int):
+    stream = stream_scheduler.sources.get(stream_id)
+    if stream is None:
+        return JSONResponse(status_code=404, content={"success": False, "error": "Flux introuvable"})
+    return {"success": True, **stream.stats()}
+
+
+@app.delete("/api/streams/{stream_id}")
+async def remove_stream_endpoint(stream_id: int):
+    stream = stream_scheduler.remove_source(stream_id)
+    if stream is None:
+        return JSONResponse(status_code=404, content={"success": False, "error": "Flux introuvable"})
+    return {"success": True, **stream.stats()}
+
 
-    return {"error": "File not found"}
+@app.get("/api/live-tracking/stats")
+async def live_tracking_stats_endpoint():
+    return {"sessions": [session.stats() for session in live_sessions.values()]}
 
 
 @app.websocket("/ws/live-tracking")
 async def websocket_endpoint(websocket: WebSocket):
     await websocket.accept()
     try:
-        await websocket.send_text("Connexion WebSocket établie")
-        while True:
-            data = await websocket.receive_text()
-            await websocket.send_text(f"Message reçu: {data}")
+        from inference_tracking import detect_frame
+        await websocket.send_json({"type": "connected", "message": "Connexion WebSocket établie"})
+        # Le client envoie des frames JPEG binaires; le texte "stats" renvoie les compteurs
+        await LiveTrackingSession(detect_frame).run(websocket)
     except Exception as e:
         print(f"WebSocket error: {e}")
 
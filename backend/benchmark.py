@@ -0,0 +1,646 @@
+"""Benchmark CPU des pipelines d'inférence.
+
+Usage:
+    python benchmark.py --frames 150 --batch-sizes 1,4,8,16
+    python benchmark.py --batch-sizes 4 --strides 1,2,4,8,adaptive
+    python benchmark.py --batch-sizes "" --image-models n:torch,n:onnx
+    python benchmark.py --batch-sizes "" --image-models "" --frames 1800 --width 1920 --height 1080 --memory on,off
+    python benchmark.py --json runs/avant.json
+    python benchmark.py --compare runs/avant.json runs/apres.json --tolerance 0.1
+
+Les entrées (images du dépôt, vidéo synthétique) sont générées hors ligne et
+identiques d'une exécution à l'autre. ``--compare`` retourne le code 1 si une
+mesure régresse de plus de ``--tolerance``.
+"""
+import os
+
+# Benchmark CPU uniquement
+os.environ.setdefault("CUDA_VISIBLE_DEVICES", "")
+
+import argparse
+import json
+import platform
+import resource
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+from box_ops import match_pairs
+
+
+SAMPLE_IMAGES = ["real_vehicle_1.jpg", "real_vehicle_2.jpg", "real_vehicle_0.jpg", "test_bus.jpg"]
+
+
+def create_synthetic_video(path: str, frames: int = 150, width: int = 1280, height: int = 720, fps: int = 30) -> str:
+    """Génère hors ligne une vidéo à partir des images d'exemple du dépôt.
+
+    Chaque image est parcourue par un panoramique (mouvement de caméra),
+    avec un segment immobile au milieu pour exercer le mode adaptatif.
+    """
+    images = [cv2.imread(name) for name in SAMPLE_IMAGES if os.path.exists(name)]
+    if not images:
+        raise FileNotFoundError("Aucune image d'exemple trouvée (lancer depuis backend/)")
+
+    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+    out = cv2.VideoWriter(path, fourcc, fps, (width, height))
+
+    per_image = max(1, frames // len(images))
+    for index in range(frames):
+        image = images[min(index // per_image, len(images) - 1)]
+        canvas = cv2.resize(image, (int(width * 1.25), int(height * 1.25)))
+        max_x, max_y = canvas.shape[1] - width, canvas.shape[0] - height
+
+        # Panoramique, pause, puis retour
+        t = (index % per_image) / per_image
+        if t < 0.4:
+            progress = t / 0.4
+        elif t < 0.7:
+            progress = 1.0
+        else:
+            progress = 1.0 - (t - 0.7) / 0.3
+        x, y = int(max_x * progress), int(max_y * progress / 2)
+        out.write(np.ascontiguousarray(canvas[y:y + height, x:x + width]))
+
+    out.release()
+    return path
+
+
+def _remove_output(result: dict):
+    """Supprime toutes les sorties d'un traitement : vidéo, aperçu et journal des tracks"""
+    from track_log import track_log_paths
+
+    run_id = result.get("run_id") or os.path.splitext(result.get("processed_video") or "")[0]
+    if not run_id:
+        return
+    video_path = os.path.join("static", run_id + ".mp4")
+    for path in (video_path, os.path.join("static", run_id + "_preview.jpg"), *track_log_paths(video_path)):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def peak_rss_mb() -> float:
+    """Pic de mémoire résidente du processus depuis son démarrage"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss est en Ko sous Linux, en octets sous macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def current_rss_mb() -> float:
+    """Mémoire résidente actuelle (Linux, /proc), 0 si indisponible"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        return 0.0
+
+
+def _stage_breakdown(before: dict, after: dict, pipeline: str) -> dict:
+    """Temps moyen (ms) par étape entre deux instantanés de STAGE_LATENCY"""
+    breakdown = {}
+    for (name, stage), (total, count) in after.items():
+        if name != pipeline:
+            continue
+        prev_total, prev_count = before.get((name, stage), (0.0, 0))
+        if count > prev_count:
+            breakdown[stage] = {
+                "mean_ms": round(1000 * (total - prev_total) / (count - prev_count), 3),
+                "total_s": round(total - prev_total, 4),
+                "calls": count - prev_count,
+            }
+    return breakdown
+
+
+def bench_video_batch(video_path: str, frames: int, batch_sizes: list, repeats: int,
+                      process: str = "detection") -> list:
+    """Débit de process_video_detection / process_video_tracking pour chaque taille de lot
+
+    Les percentiles portent sur la durée de chaque appel au modèle (un lot),
+    relevée par le pipeline sur toutes les répétitions : quelques durées de
+    vidéo entière ne font pas une distribution de latence.
+    """
+    from inference_tracking import process_video_detection, process_video_tracking
+    from metrics import STAGE_LATENCY
+
+    process_fn = process_video_tracking if process == "tracking" else process_video_detection
+    pipeline = "video_tracking" if process == "tracking" else "video_detection"
+
+    # Échauffement (chargement des poids, allocations)
+    _remove_output(process_fn(video_path, batch_size=1))
+
+    rows = []
+    for batch_size in batch_sizes:
+        timings = []
+        before = STAGE_LATENCY.snapshot()
+        with STAGE_LATENCY.recording(pipeline=pipeline, stage="inference") as batch_timings:
+            for _ in range(repeats):
+                start = time.perf_counter()
+                result = process_fn(video_path, batch_size=batch_size)
+                timings.append(time.perf_counter() - start)
+                _remove_output(result)
+                if not result.get("success"):
+                    raise RuntimeError(result.get("error"))
+        best = min(timings)
+        rows.append({
+            "process": process,
+            "batch_size": batch_size,
+            "seconds": round(best, 4),
+            "fps": round(frames / best, 2),
+            "batches": len(batch_timings),
+            "p50_ms": percentile(batch_timings, 50),
+            "p95_ms": percentile(batch_timings, 95),
+            "p99_ms": percentile(batch_timings, 99),
+            "stages": _stage_breakdown(before, STAGE_LATENCY.snapshot(), pipeline),
+            "peak_rss_mb": peak_rss_mb(),
+        })
+    return rows
+
+
+def match_boxes(reference: np.ndarray, candidate: np.ndarray, threshold: float = 0.5) -> list:
+    """IoU des paires retenues par match_pairs"""
+    return [iou for _, _, iou in match_pairs(reference, candidate, threshold)]
+
+
+def _collect_tracking(video_path: str, batch_size: int, stride, adaptive: bool, tiling=None):
+    from inference_tracking import _process_video
+
+    boxes = {}
+
+    def collect(frame_index, detections):
+        boxes[frame_index] = detections.xyxy.copy()
+
+    start = time.perf_counter()
+    result = _process_video(video_path, "benchmark", track=True, batch_size=batch_size,
+                            stride=stride, adaptive=adaptive, detections_callback=collect, tiling=tiling)
+    elapsed = time.perf_counter() - start
+    _remove_output(result)
+    if not result.get("success"):
+        raise RuntimeError(result.get("error"))
+    return boxes, elapsed, result["sampling"]
+
+
+def bench_stride(video_path: str, frames: int, batch_size: int, strides: list) -> list:
+    """Compromis précision / fps du saut de frames, par rapport à stride=1"""
+    reference, _, _ = _collect_tracking(video_path, batch_size, 1, False)
+
+    rows = []
+    for stride in strides:
+        adaptive = stride == "adaptive"
+        boxes, elapsed, sampling = _collect_tracking(video_path, batch_size, None if adaptive else int(stride), adaptive)
+
+        matched_ious = []
+        reference_total = 0
+        for frame_index, ref_boxes in reference.items():
+            reference_total += len(ref_boxes)
+            matched_ious.extend(match_boxes(ref_boxes, boxes.get(frame_index, np.zeros((0, 4)))))
+
+        rows.append({
+            "stride": stride,
+            "fps": round(frames / elapsed, 2),
+            "detection_rate": sampling["detection_rate"],
+            "recall": round(len(matched_ious) / reference_total, 4) if reference_total else 1.0,
+            "mean_iou": round(float(np.mean(matched_ious)), 4) if matched_ious else 0.0,
+        })
+    return rows
+
+
+def bench_tiling(video_path: str, frames: int, batch_size: int, everies: list, tile_size: int) -> list:
+    """Débit et rappel de l'inférence par tuiles (une sur K), par rapport aux tuiles sur chaque frame"""
+    from tiling import tiling_options
+
+    reference, _, _ = _collect_tracking(video_path, batch_size, 1, False, tiling_options(True, tile_size, 1))
+
+    rows = []
+    for every in everies:
+        # "full" : image entière uniquement, sans tuiles
+        tiling = None if every == "full" else tiling_options(True, tile_size, int(every))
+        boxes, elapsed, _ = _collect_tracking(video_path, batch_size, 1, False, tiling)
+
+        matched_ious = []
+        reference_total = 0
+        for frame_index, ref_boxes in reference.items():
+            reference_total += len(ref_boxes)
+            matched_ious.extend(match_boxes(ref_boxes, boxes.get(frame_index, np.zeros((0, 4)))))
+
+        rows.append({
+            "tile_every": every,
+            "fps": round(frames / elapsed, 2),
+            "recall": round(len(matched_ious) / reference_total, 4) if reference_total else 1.0,
+            "mean_iou": round(float(np.mean(matched_ious)), 4) if matched_ious else 0.0,
+        })
+    return rows
+
+
+def bench_streams(video_path: str, counts: list, seconds: float) -> list:
+    """N caméras rejouées en temps réel sur un modèle partagé : débit, équité, latence image"""
+    from stream_scheduler import StreamScheduler
+
+    image = cv2.imread(SAMPLE_IMAGES[0]) if os.path.exists(SAMPLE_IMAGES[0]) else None
+    rows = []
+    for count in counts:
+        scheduler = StreamScheduler(file_root=os.path.dirname(video_path))
+        for i in range(count):
+            scheduler.add_source(os.path.basename(video_path), name=f"cam{i}", loop=True)
+
+        # Requêtes image pendant la charge : la voie prioritaire doit rester rapide
+        image_latencies = []
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            if image is not None:
+                start = time.perf_counter()
+                scheduler.infer(image)
+                image_latencies.append(time.perf_counter() - start)
+            time.sleep(0.1)
+
+        stats = scheduler.stats()
+        scheduler.close()
+        fps = [s["fps"] for s in stats["streams"]]
+        rows.append({
+            "streams": count,
+            "fps": stats["aggregate"]["fps"],
+            "min_stream_fps": min(fps),
+            "max_stream_fps": max(fps),
+            "fairness": stats["aggregate"]["fairness"],
+            "drop_rate": round(stats["aggregate"]["dropped"] / stats["aggregate"]["received"], 4)
+            if stats["aggregate"]["received"] else 0.0,
+            "avg_batch_size": stats["aggregate"]["avg_batch_size"],
+            "image_p50_ms": percentile(image_latencies, 50),
+            "image_p95_ms": percentile(image_latencies, 95),
+        })
+    return rows
+
+
+def bench_memory(video_path: str, frames: int, batch_size: int, pools: list, process: str = "tracking") -> list:
+    """Pression mémoire de la boucle vidéo, buffers de frames réutilisés ou non
+
+    Une passe chronométrée (fps, défauts de page mineurs, pic RSS échantillonné)
+    puis une passe sous tracemalloc (pic des allocations Python/numpy).
+    """
+    from inference_tracking import process_video_detection, process_video_tracking
+
+    process_fn = process_video_tracking if process == "tracking" else process_video_detection
+    _remove_output(process_fn(video_path, batch_size=batch_size))
+
+    rows = []
+    for pool in pools:
+        enabled = pool == "on"
+        baseline_rss = current_rss_mb()
+        peak = [baseline_rss]
+        done = threading.Event()
+
+        def sample():
+            while not done.wait(0.02):
+                peak[0] = max(peak[0], current_rss_mb())
+
+        sampler = threading.Thread(target=sample, daemon=True)
+        sampler.start()
+        faults = resource.getrusage(resource.RUSAGE_SELF).ru_minflt
+        start = time.perf_counter()
+        result = process_fn(video_path, batch_size=batch_size, frame_pool=enabled)
+        elapsed = time.perf_counter() - start
+        faults = resource.getrusage(resource.RUSAGE_SELF).ru_minflt - faults
+        done.set()
+        sampler.join()
+        _remove_output(result)
+        if not result.get("success"):
+            raise RuntimeError(result.get("error"))
+
+        tracemalloc.start()
+        _remove_output(process_fn(video_path, batch_size=batch_size, frame_pool=enabled))
+        _, traced_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        frame_pool = result.get("frame_pool") or {}
+        rows.append({
+            "frame_pool": pool,
+            "process": process,
+            "fps": round(frames / elapsed, 2),
+            "traced_peak_mb": round(traced_peak / (1024 * 1024), 1),
+            "rss_growth_mb": round(peak[0] - baseline_rss, 1),
+            "minor_faults_per_frame": round(faults / frames, 1),
+            "frame_buffers": frame_pool.get("allocated", frames),
+        })
+    return rows
+
+
+def bench_ingest(width: int, height: int, repeats: int) -> list:
+    """Décodage d'une photo JPEG de téléphone : PIL pleine résolution vs image_ingest réduit"""
+    import io
+    from PIL import Image
+    from image_ingest import decode_image
+
+    rng = np.random.default_rng(0)
+    photo = cv2.resize(rng.integers(0, 255, (height // 16, width // 16, 3), dtype=np.uint8), (width, height))
+    ok, encoded = cv2.imencode(".jpg", photo, [cv2.IMWRITE_JPEG_QUALITY, 90])
+    data = encoded.tobytes()
+
+    def legacy():
+        # Ancien chemin de process_image (RGB pleine résolution)
+        image = Image.open(io.BytesIO(data))
+        image.load()
+        return np.array(image)
+
+    rows = []
+    for name, decode in (("pil", legacy), ("ingest", lambda: decode_image(data).image)):
+        timings = []
+        for _ in range(max(repeats, 5)):
+            start = time.perf_counter()
+            image = decode()
+            timings.append(time.perf_counter() - start)
+        rows.append({
+            "decoder": name,
+            "source": f"{width}x{height}",
+            "decoded": f"{image.shape[1]}x{image.shape[0]}",
+            "p50_ms": percentile(timings, 50),
+            "array_mb": round(image.nbytes / (1024 * 1024), 2),
+        })
+    return rows
+
+
+def percentile(values: list, q: float) -> float:
+    return round(float(np.percentile(np.asarray(values) * 1000, q)), 3) if values else 0.0
+
+
+def bench_images(models: list, repeats: int) -> list:
+    """Latence et débit de process_image sur les images d'exemple, par modèle/backend"""
+    from inference_tracking import process_image
+    from metrics import STAGE_LATENCY
+
+    images = []
+    for name in SAMPLE_IMAGES:
+        if os.path.exists(name):
+            with open(name, "rb") as f:
+                images.append(f.read())
+
+    rows = []
+    for model_name in models:
+        # Échauffement (export éventuel, chargement, allocations)
+        process_image(images[0], model_name)
+
+        latencies = []
+        before = STAGE_LATENCY.snapshot()
+        start = time.perf_counter()
+        for _ in range(repeats):
+            for image_data in images:
+                t0 = time.perf_counter()
+                result = process_image(image_data, model_name)
+                latencies.append(time.perf_counter() - t0)
+                if "error" in result:
+                    raise RuntimeError(result["error"])
+        elapsed = time.perf_counter() - start
+
+        rows.append({
+            "model": model_name,
+            "images": len(latencies),
+            "images_per_s": round(len(latencies) / elapsed, 2),
+            "p50_ms": percentile(latencies, 50),
+            "p95_ms": percentile(latencies, 95),
+            "p99_ms": percentile(latencies, 99),
+            "stages": _stage_breakdown(before, STAGE_LATENCY.snapshot(), "image"),
+            "peak_rss_mb": peak_rss_mb(),
+        })
+    return rows
+
+
+# Mesures comparées entre deux exécutions : +1 = plus haut est meilleur
+COMPARED_METRICS = {
+    "fps": 1, "images_per_s": 1, "recall": 1,
+    "p50_ms": -1, "p95_ms": -1, "p99_ms": -1, "fairness": 1, "image_p95_ms": -1,
+    "traced_peak_mb": -1, "minor_faults_per_frame": -1,
+}
+
+
+def _row_key(section: str, row: dict) -> str:
+    if section == "video":
+        return f"{row['process']} lot={row['batch_size']}"
+    if section == "stride":
+        return f"stride={row['stride']}"
+    if section == "tiling":
+        return f"tile_every={row['tile_every']}"
+    if section == "streams":
+        return f"flux={row['streams']}"
+    if section == "ingest":
+        return f"{row['decoder']} {row['source']}"
+    if section == "memory":
+        return f"{row['process']} pool={row['frame_pool']}"
+    return row["model"]
+
+
+def compare_reports(baseline: dict, candidate: dict, tolerance: float) -> list:
+    """Écarts relatifs entre deux rapports JSON; ``regression`` si au-delà de la tolérance"""
+    rows = []
+    for section in ("video", "stride", "tiling", "streams", "ingest", "memory", "images"):
+        base_rows = {_row_key(section, r): r for r in baseline.get(section, [])}
+        for row in candidate.get(section, []):
+            key = _row_key(section, row)
+            base = base_rows.get(key)
+            if base is None:
+                continue
+            for metric, direction in COMPARED_METRICS.items():
+                if metric not in row or not base.get(metric):
+                    continue
+                change = (row[metric] - base[metric]) / base[metric]
+                rows.append({
+                    "section": section, "key": key, "metric": metric,
+                    "baseline": base[metric], "candidate": row[metric], "change": change,
+                    "regression": change * direction < -tolerance,
+                })
+
+    base_rss, rss = baseline.get("peak_rss_mb"), candidate.get("peak_rss_mb")
+    if base_rss and rss:
+        change = (rss - base_rss) / base_rss
+        rows.append({"section": "process", "key": "-", "metric": "peak_rss_mb", "baseline": base_rss,
+                     "candidate": rss, "change": change, "regression": change > tolerance})
+    return rows
+
+
+def run_compare(baseline_path: str, candidate_path: str, tolerance: float) -> int:
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    with open(candidate_path) as f:
+        candidate = json.load(f)
+
+    rows = compare_reports(baseline, candidate, tolerance)
+    print(f"\n{'section':>8} {'cas':>22} {'mesure':>12} {'avant':>10} {'après':>10} {'écart':>8}")
+    for row in rows:
+        flag = "  RÉGRESSION" if row["regression"] else ""
+        print(f"{row['section']:>8} {row['key']:>22} {row['metric']:>12} {row['baseline']:>10.2f} "
+              f"{row['candidate']:>10.2f} {row['change'] * 100:>+7.1f}%{flag}")
+
+    regressions = sum(row["regression"] for row in rows)
+    print(f"\n{regressions} régression(s) au-delà de {tolerance * 100:.0f}%")
+    return 1 if regressions else 0
+
+
+def environment() -> dict:
+    """Contexte d'exécution enregistré avec les mesures"""
+    info = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "opencv": cv2.__version__,
+        "opencv_threads": cv2.getNumThreads(),
+        "numpy": np.__version__,
+    }
+    try:
+        import torch
+        info["torch"] = torch.__version__
+        info["torch_threads"] = torch.get_num_threads()
+    except ImportError:
+        pass
+    try:
+        import ultralytics
+        info["ultralytics"] = ultralytics.__version__
+    except (ImportError, AttributeError):
+        pass
+    return info
+
+
+def print_report(report: dict):
+    rows = report["video"]
+    if rows:
+        print(f"\n{'traitement':>10} {'lot':>5} {'durée (s)':>10} {'fps':>8} {'gain':>6} {'lot p50':>8} "
+              f"{'lot p95':>8} {'lot p99':>8}  étapes (ms/appel)")
+        baselines = {}
+        for row in rows:
+            baseline = baselines.setdefault(row["process"], row["fps"])
+            stages = " ".join(f"{k}={v['mean_ms']:.2f}" for k, v in row["stages"].items())
+            print(f"{row['process']:>10} {row['batch_size']:>5} {row['seconds']:>10.2f} {row['fps']:>8.1f} "
+                  f"{row['fps'] / baseline:>5.2f}x {row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} "
+                  f"{row['p99_ms']:>8.1f}  {stages}")
+
+    if report["stride"]:
+        print(f"\n{'stride':>9} {'fps':>8} {'détection':>10} {'rappel':>7} {'IoU':>6}")
+        for row in report["stride"]:
+            print(f"{row['stride']:>9} {row['fps']:>8.1f} {row['detection_rate']:>10.2f} "
+                  f"{row['recall']:>7.3f} {row['mean_iou']:>6.3f}")
+
+    if report.get("tiling"):
+        print(f"\n{'tuiles':>9} {'fps':>8} {'rappel':>7} {'IoU':>6}")
+        for row in report["tiling"]:
+            print(f"{row['tile_every']:>9} {row['fps']:>8.1f} {row['recall']:>7.3f} {row['mean_iou']:>6.3f}")
+
+    if report.get("streams"):
+        print(f"\n{'flux':>5} {'fps total':>10} {'fps min':>8} {'fps max':>8} {'équité':>7} {'pertes':>7} "
+              f"{'lot':>5} {'image p95 (ms)':>15}")
+        for row in report["streams"]:
+            print(f"{row['streams']:>5} {row['fps']:>10.1f} {row['min_stream_fps']:>8.1f} {row['max_stream_fps']:>8.1f} "
+                  f"{row['fairness']:>7.3f} {row['drop_rate']:>7.1%} {row['avg_batch_size']:>5.1f} "
+                  f"{row['image_p95_ms']:>15.1f}")
+
+    if report.get("ingest"):
+        print(f"\n{'décodeur':>9} {'source':>10} {'décodée':>10} {'p50 (ms)':>9} {'tableau (Mo)':>13}")
+        for row in report["ingest"]:
+            print(f"{row['decoder']:>9} {row['source']:>10} {row['decoded']:>10} {row['p50_ms']:>9.1f} "
+                  f"{row['array_mb']:>13.1f}")
+
+    if report.get("memory"):
+        print(f"\n{'pool':>5} {'traitement':>10} {'fps':>8} {'tracemalloc (Mo)':>17} {'+RSS (Mo)':>10} "
+              f"{'défauts/frame':>14} {'buffers':>8}")
+        for row in report["memory"]:
+            print(f"{row['frame_pool']:>5} {row['process']:>10} {row['fps']:>8.1f} {row['traced_peak_mb']:>17.1f} "
+                  f"{row['rss_growth_mb']:>10.1f} {row['minor_faults_per_frame']:>14.1f} {row['frame_buffers']:>8}")
+
+    if report["images"]:
+        print(f"\n{'modèle':>12} {'images/s':>9} {'p50 (ms)':>9} {'p95 (ms)':>9} {'p99 (ms)':>9}  étapes (ms)")
+        for row in report["images"]:
+            stages = " ".join(f"{k}={v['mean_ms']:.2f}" for k, v in row["stages"].items())
+            print(f"{row['model']:>12} {row['images_per_s']:>9.1f} {row['p50_ms']:>9.1f} "
+                  f"{row['p95_ms']:>9.1f} {row['p99_ms']:>9.1f}  {stages}")
+
+    print(f"\nPic mémoire (RSS): {report['peak_rss_mb']} Mo")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark CPU des pipelines image et vidéo")
+    parser.add_argument("--frames", type=int, default=150)
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--batch-sizes", default="1,4,8,16")
+    parser.add_argument("--video-processes", default="detection,tracking", help="detection et/ou tracking")
+    parser.add_argument("--repeats", type=int, default=2)
+    parser.add_argument("--strides", default="", help="ex: 1,2,4,8,adaptive (compromis précision / fps)")
+    parser.add_argument("--tile-every", default="",
+                        help="ex: full,1,4 (inférence par tuiles une fois sur K, rappel vs tuiles partout)")
+    parser.add_argument("--tile-size", type=int, default=640)
+    parser.add_argument("--streams", default="", help="ex: 1,4,8 (caméras simultanées sur un modèle partagé)")
+    parser.add_argument("--stream-seconds", type=float, default=5.0)
+    parser.add_argument("--ingest", default="", help="ex: 4000x3000 (décodage d'une photo 12 MP)")
+    parser.add_argument("--memory", default="",
+                        help="ex: on,off (tracemalloc / RSS de la boucle vidéo, buffers de frames réutilisés ou non)")
+    parser.add_argument("--image-models", default=None,
+                        help="ex: n:torch,n:onnx (latence process_image; défaut : modèle par défaut, \"\" pour ignorer)")
+    parser.add_argument("--json", default=None, help="écrit le rapport complet dans ce fichier")
+    parser.add_argument("--compare", nargs=2, metavar=("AVANT", "APRES"), help="compare deux rapports JSON")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="écart relatif toléré avant régression")
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(run_compare(args.compare[0], args.compare[1], args.tolerance))
+
+    batch_sizes = [int(b) for b in args.batch_sizes.split(",") if b]
+    processes = [p for p in args.video_processes.split(",") if p]
+    strides = [s for s in args.strides.split(",") if s]
+    tile_everies = [t for t in args.tile_every.split(",") if t]
+    stream_counts = [int(n) for n in args.streams.split(",") if n]
+    memory_pools = [p for p in args.memory.split(",") if p]
+    if args.image_models is None:
+        from model_registry import registry
+        image_models = [registry.resolve()]
+    else:
+        image_models = [m for m in args.image_models.split(",") if m]
+
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "args": vars(args),
+        "environment": environment(),
+        "video": [],
+        "stride": [],
+        "tiling": [],
+        "streams": [],
+        "ingest": [],
+        "memory": [],
+        "images": [],
+    }
+    if batch_sizes or strides or tile_everies or stream_counts or memory_pools:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            video_path = create_synthetic_video(
+                os.path.join(temp_dir, "synthetic.mp4"), args.frames, args.width, args.height
+            )
+            if batch_sizes:
+                for process in processes:
+                    report["video"] += bench_video_batch(video_path, args.frames, batch_sizes, args.repeats, process)
+            if strides:
+                report["stride"] = bench_stride(video_path, args.frames, batch_sizes[-1] if batch_sizes else None,
+                                                strides)
+            if tile_everies:
+                report["tiling"] = bench_tiling(video_path, args.frames, batch_sizes[-1] if batch_sizes else None,
+                                                tile_everies, args.tile_size)
+            if stream_counts:
+                report["streams"] = bench_streams(video_path, stream_counts, args.stream_seconds)
+            if memory_pools:
+                for process in processes:
+                    report["memory"] += bench_memory(video_path, args.frames,
+                                                     batch_sizes[-1] if batch_sizes else None, memory_pools, process)
+    if args.ingest:
+        width, height = (int(v) for v in args.ingest.split("x"))
+        report["ingest"] = bench_ingest(width, height, args.repeats)
+    if image_models:
+        report["images"] = bench_images(image_models, args.repeats)
+    report["peak_rss_mb"] = peak_rss_mb()
+
+    print_report(report)
+
+    if args.json:
+        os.makedirs(os.path.dirname(os.path.abspath(args.json)), exist_ok=True)
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Rapport écrit dans {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+import numpy as np
+
+
+def box_iou(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Matrice d'IoU entre deux ensembles de boîtes xyxy"""
+    tl = np.maximum(a[:, None, :2], b[None, :, :2])
+    br = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.prod(np.clip(br - tl, 0, None), axis=2)
+    area_a = np.prod(a[:, 2:] - a[:, :2], axis=1)
+    area_b = np.prod(b[:, 2:] - b[:, :2], axis=1)
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-9)
+
+
+def match_pairs(reference: np.ndarray, candidate: np.ndarray, threshold: float = 0.5) -> list:
+    """Appariement glouton par IoU décroissante; retourne les paires (i, j, iou)"""
+    if len(reference) == 0 or len(candidate) == 0:
+        return []
+    iou = box_iou(reference, candidate)
+    pairs = []
+    while True:
+        i, j = np.unravel_index(np.argmax(iou), iou.shape)
+        if iou[i, j] < threshold:
+            break
+        pairs.append((int(i), int(j), float(iou[i, j])))
+        iou[i, :] = -1
+        iou[:, j] = -1
+    return pairs
+
+
+def box_ios(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Intersection rapportée à la plus petite des deux boîtes (boîtes coupées par une tuile)"""
+    tl = np.maximum(a[:, None, :2], b[None, :, :2])
+    br = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.prod(np.clip(br - tl, 0, None), axis=2)
+    area_a = np.prod(a[:, 2:] - a[:, :2], axis=1)
+    area_b = np.prod(b[:, 2:] - b[:, :2], axis=1)
+    return inter / np.maximum(np.minimum(area_a[:, None], area_b[None, :]), 1e-9)
+
+
+def nms(boxes: np.ndarray, scores: np.ndarray, class_ids: np.ndarray = None, threshold: float = 0.5,
+        metric: str = "iou") -> np.ndarray:
+    """NMS par classe; retourne les indices conservés, par score décroissant
+
+    La matrice de recouvrement est calculée en une fois; seule la
+    suppression gloutonne parcourt les boîtes.
+    """
+    if len(boxes) == 0:
+        return np.empty(0, dtype=np.int64)
+    # À score égal, la plus grande boîte l'emporte sur ses fragments (tuiles)
+    areas = np.prod(boxes[:, 2:] - boxes[:, :2], axis=1)
+    order = np.lexsort((-areas, -scores))
+    sorted_boxes = boxes[order]
+    overlap = (box_ios if metric == "ios" else box_iou)(sorted_boxes, sorted_boxes)
+    if class_ids is not None:
+        # Deux classes différentes ne se suppriment jamais
+        sorted_classes = class_ids[order]
+        overlap[sorted_classes[:, None] != sorted_classes[None, :]] = 0
+    suppressed = np.triu(overlap > threshold, k=1)
+    keep = np.ones(len(order), dtype=bool)
+    for i in range(len(order)):
+        if keep[i]:
+            keep &= ~suppressed[i]
+    return order[keep]
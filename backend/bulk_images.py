@@ -0,0 +1,208 @@
+import base64
+import itertools
+import json
+import os
+import queue
+import tarfile
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+import supervision as sv
+
+from image_ingest import decode_image
+from metrics import MODEL_INFERENCE, stage_timer
+from model_registry import registry
+from response_formats import to_compact
+from video_pipeline import VideoPipeline
+
+# Images envoyées au modèle en un seul appel
+BULK_BATCH_SIZE = int(os.environ.get("BULK_BATCH_SIZE", "8"))
+# Threads de décodage / annotation (cv2 relâche le GIL)
+BULK_WORKERS = int(os.environ.get("BULK_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Lots en attente entre deux étages : borne la mémoire quelle que soit l'archive
+BULK_QUEUE_SIZE = int(os.environ.get("BULK_QUEUE_SIZE", "2"))
+BULK_MAX_IMAGE_BYTES = int(os.environ.get("BULK_MAX_IMAGE_MB", "50")) * 1024 * 1024
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp", ".tif", ".tiff", ".gif")
+
+_END = object()
+
+
+class _Cancelled(Exception):
+    """Le client s'est déconnecté : le pipeline s'arrête"""
+
+
+def _is_image_member(name: str) -> bool:
+    base = os.path.basename(name)
+    return name.lower().endswith(IMAGE_EXTENSIONS) and not base.startswith(".") and "__MACOSX/" not in name
+
+
+def _read_member(f, size: int):
+    if size > BULK_MAX_IMAGE_BYTES:
+        return ValueError(f"Image trop volumineuse (max {BULK_MAX_IMAGE_BYTES // (1024 * 1024)} Mo)")
+    # Lecture bornée : la taille annoncée par l'archive n'est pas fiable
+    data = f.read(BULK_MAX_IMAGE_BYTES + 1)
+    if len(data) > BULK_MAX_IMAGE_BYTES:
+        return ValueError(f"Image trop volumineuse (max {BULK_MAX_IMAGE_BYTES // (1024 * 1024)} Mo)")
+    return data
+
+
+def iter_upload(path: str, filename: str):
+    """(nom, octets ou exception) pour chaque image d'un fichier uploadé
+
+    Zip et tar (compressé ou non) sont parcourus membre par membre, sans
+    extraction sur disque; tout autre fichier est traité comme une image.
+    """
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                if info.is_dir() or not _is_image_member(info.filename):
+                    continue
+                with archive.open(info) as f:
+                    yield info.filename, _read_member(f, info.file_size)
+    elif tarfile.is_tarfile(path):
+        # Lecture séquentielle ("r|*") : chaque membre est lu au passage, sans retour en arrière
+        with tarfile.open(path, "r|*") as archive:
+            for member in archive:
+                if not member.isfile() or not _is_image_member(member.name):
+                    continue
+                with archive.extractfile(member) as f:
+                    yield member.name, _read_member(f, member.size)
+    else:
+        with open(path, "rb") as f:
+            yield filename, _read_member(f, os.path.getsize(path))
+
+
+def stream_bulk(uploads: list, model_name=None, annotate: bool = False, format: str = "json",
+                batch_size: int = BULK_BATCH_SIZE, cleanup=None):
+    """Générateur NDJSON : une ligne par image dès qu'elle est traitée, puis un résumé
+
+    ``uploads`` : liste de (chemin, nom d'origine). Décodage (parallèle),
+    inférence par lots et formatage (parallèle) se recouvrent via
+    VideoPipeline; les files bornées font remonter la contre-pression
+    jusqu'à la lecture de l'archive si le client lit lentement.
+    ``cleanup`` est appelé quand plus aucune archive n'est lue (il doit
+    supporter un second appel, l'API le relance après la réponse).
+    """
+    from inference_tracking import annotate_jpeg, format_detections
+
+    model_key = registry.resolve(model_name)
+    class_names = registry.class_names(model_key)
+    batch_size = max(1, batch_size)
+    out = queue.Queue(maxsize=max(1, BULK_QUEUE_SIZE) * batch_size)
+    cancelled = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=max(1, BULK_WORKERS), thread_name_prefix="bulk")
+    counts = {"images": 0, "failed": 0}
+
+    entries = ((name, data) for path, filename in uploads for name, data in iter_upload(path, filename))
+    indexed = zip(itertools.count(), entries)
+
+    def decode(entry):
+        index, (name, data) = entry
+        item = {"index": index, "name": name}
+        if isinstance(data, Exception):
+            item["error"] = str(data)
+            return item
+        try:
+            item["ingested"] = decode_image(data)
+        except ValueError as e:
+            item["error"] = str(e)
+        return item
+
+    def read_batch():
+        entries_batch = list(itertools.islice(indexed, batch_size))
+        with stage_timer("bulk", "decode"):
+            return list(executor.map(decode, entries_batch))
+
+    def infer(items):
+        valid = [item for item in items if "ingested" in item]
+        results = [None] * len(items)
+        if valid:
+            with stage_timer("bulk", "inference"), registry.acquire(model_key) as model:
+                with MODEL_INFERENCE.time(model=model_key):
+                    batch_results = iter(model([item["ingested"].image for item in valid], verbose=False))
+            results = [next(batch_results) if "ingested" in item else None for item in items]
+        return results
+
+    def to_line(pair) -> bytes:
+        item, result = pair
+        line = {"index": item["index"], "name": item["name"]}
+        if result is None:
+            line.update(success=False, error=item.get("error", "Image illisible"))
+        else:
+            ingested = item["ingested"]
+            detections = sv.Detections.from_ultralytics(result)
+            formatted = format_detections(detections, class_names, ingested.to_original(detections.xyxy))
+            line["success"] = True
+            if format == "compact":
+                line.update(to_compact(formatted))
+            else:
+                line["detections"] = formatted
+            if annotate:
+                line["processed_image"] = base64.b64encode(
+                    annotate_jpeg(ingested.image, detections, "bulk")).decode()
+        return (json.dumps(line) + "\n").encode()
+
+    def emit(line):
+        while True:
+            if cancelled.is_set():
+                raise _Cancelled()
+            try:
+                out.put(line, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def consume(items, results):
+        with stage_timer("bulk", "postprocess"):
+            lines = list(executor.map(to_line, zip(items, results)))
+        for item, line in zip(items, lines):
+            counts["images"] += 1
+            counts["failed"] += "ingested" not in item
+            emit(line)
+
+    def run():
+        start = time.perf_counter()
+        try:
+            stats = VideoPipeline(read_batch, infer, consume, queue_size=BULK_QUEUE_SIZE).run()
+            elapsed = time.perf_counter() - start
+            summary = {
+                "summary": True,
+                **counts,
+                "seconds": round(elapsed, 3),
+                "images_per_s": round(counts["images"] / elapsed, 2) if elapsed > 0 else 0.0,
+                "pipeline_stats": stats,
+            }
+            emit((json.dumps(summary) + "\n").encode())
+            emit(_END)
+        except _Cancelled:
+            print(f"Traitement en lot interrompu après {counts['images']} image(s)")
+        except Exception as e:
+            print(f"Erreur traitement en lot: {e}")
+            try:
+                emit((json.dumps({"summary": True, **counts, "error": str(e)}) + "\n").encode())
+                emit(_END)
+            except _Cancelled:
+                pass
+        finally:
+            executor.shutdown(wait=True)
+            if cleanup is not None:
+                cleanup()
+
+    threading.Thread(target=run, name="bulk-images", daemon=True).start()
+    try:
+        while True:
+            line = out.get()
+            if line is _END:
+                break
+            yield line
+    finally:
+        cancelled.set()
+        # Débloque un consume en attente de place dans la file
+        try:
+            while True:
+                out.get_nowait()
+        except queue.Empty:
+            pass
@@ -0,0 +1,141 @@
+"""Test de parité des détections entre PyTorch et un autre backend.
+
+Usage:
+    python compare_backends.py --backend onnx
+    python compare_backends.py --backend int8,int8-dynamic --iou 0.5 --json reports/int8.json
+
+Lance process_image sur les images d'exemple avec les deux backends et
+apparie les boîtes (IoU, classe, confiance). Code de sortie 1 si écart.
+Le résumé par backend (latence, rappel, IoU moyenne, accord des classes)
+sert à choisir le compromis vitesse / précision des modèles quantifiés.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from benchmark import SAMPLE_IMAGES, percentile
+from box_ops import match_pairs
+
+
+def compare_detections(reference: list, candidate: list, iou_threshold: float, conf_tolerance: float) -> dict:
+    """Compare deux listes de détections au format de process_image"""
+    ref_boxes = np.array([d["bbox"] for d in reference], dtype=np.float32).reshape(-1, 4)
+    cand_boxes = np.array([d["bbox"] for d in candidate], dtype=np.float32).reshape(-1, 4)
+    pairs = match_pairs(ref_boxes, cand_boxes, iou_threshold)
+
+    class_mismatch = sum(reference[i]["class_id"] != candidate[j]["class_id"] for i, j, _ in pairs)
+    conf_deltas = [abs(reference[i]["confidence"] - candidate[j]["confidence"]) for i, j, _ in pairs]
+    report = {
+        "reference": len(reference),
+        "candidate": len(candidate),
+        "matched": len(pairs),
+        "class_mismatch": class_mismatch,
+        "mean_iou": round(float(np.mean([iou for _, _, iou in pairs])), 4) if pairs else 0.0,
+        "min_iou": round(min((iou for _, _, iou in pairs), default=1.0), 4),
+        "max_conf_delta": round(max(conf_deltas, default=0.0), 4),
+    }
+    report["passed"] = (
+        report["matched"] == report["reference"] == report["candidate"]
+        and class_mismatch == 0
+        and report["max_conf_delta"] <= conf_tolerance
+    )
+    return report
+
+
+def timed_detections(process_image, image_data: bytes, model_name: str, repeats: int) -> tuple:
+    """Détections et latences de process_image (sans image annotée)"""
+    # Premier appel hors mesure : chargement, export ou quantification du modèle
+    result = process_image(image_data, model_name, annotate=None)
+    if "error" in result:
+        # Sans modèle, zéro détection de chaque côté passerait pour une parité parfaite
+        raise RuntimeError(f"{model_name}: {result['error']}")
+    detections = result.get("detections", [])
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        process_image(image_data, model_name, annotate=None)
+        timings.append(time.perf_counter() - start)
+    return detections, timings
+
+
+def summarize(reports: list, reference_timings: list, candidate_timings: list) -> dict:
+    """Accord global d'un backend avec la référence FP32, sur toutes les images"""
+    reference = sum(r["reference"] for r in reports)
+    candidate = sum(r["candidate"] for r in reports)
+    matched = sum(r["matched"] for r in reports)
+    ious = [r["mean_iou"] for r in reports for _ in range(r["matched"])]
+    reference_ms = percentile(reference_timings, 50)
+    candidate_ms = percentile(candidate_timings, 50)
+    return {
+        "images": len(reports),
+        "recall": round(matched / reference, 4) if reference else 1.0,
+        "precision": round(matched / candidate, 4) if candidate else 1.0,
+        "mean_iou": round(float(np.mean(ious)), 4) if ious else 0.0,
+        "class_agreement": round(1 - sum(r["class_mismatch"] for r in reports) / matched, 4) if matched else 1.0,
+        "reference_p50_ms": reference_ms,
+        "p50_ms": candidate_ms,
+        "speedup": round(reference_ms / candidate_ms, 2) if candidate_ms else 0.0,
+        "passed": all(r["passed"] for r in reports),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parité des détections entre backends")
+    parser.add_argument("--model", default="n")
+    parser.add_argument("--backend", default="onnx", help="un ou plusieurs backends, ex: onnx,int8,int8-dynamic")
+    parser.add_argument("--iou", type=float, default=0.9)
+    parser.add_argument("--conf-tolerance", type=float, default=0.05)
+    parser.add_argument("--repeats", type=int, default=5, help="mesures de latence par image")
+    parser.add_argument("--json", default=None, help="écrit le résumé par backend dans ce fichier")
+    args = parser.parse_args()
+
+    from inference_tracking import process_image
+
+    images = {}
+    for name in SAMPLE_IMAGES:
+        if os.path.exists(name):
+            with open(name, "rb") as f:
+                images[name] = f.read()
+
+    reference_model = f"{args.model}:torch"
+    references = {name: timed_detections(process_image, data, reference_model, args.repeats)
+                  for name, data in images.items()}
+    reference_timings = [t for _, timings in references.values() for t in timings]
+
+    failures = 0
+    summaries = {}
+    for backend in [b for b in args.backend.split(",") if b]:
+        print(f"\n--- {reference_model} vs {args.model}:{backend} ---")
+        reports, candidate_timings = [], []
+        for name, data in images.items():
+            candidate, timings = timed_detections(process_image, data, f"{args.model}:{backend}", args.repeats)
+            candidate_timings += timings
+            report = compare_detections(references[name][0], candidate, args.iou, args.conf_tolerance)
+            reports.append(report)
+            failures += not report["passed"]
+
+            status = "OK" if report["passed"] else "ÉCART"
+            print(f"{status:6} {name}: {report}")
+        summaries[backend] = summarize(reports, reference_timings, candidate_timings)
+
+    print(f"\n{'backend':>14} {'p50 (ms)':>9} {'gain':>6} {'rappel':>7} {'précision':>10} {'IoU':>6} {'classes':>8}")
+    for backend, row in summaries.items():
+        print(f"{backend:>14} {row['p50_ms']:>9.1f} {row['speedup']:>5.2f}x {row['recall']:>7.3f} "
+              f"{row['precision']:>10.3f} {row['mean_iou']:>6.3f} {row['class_agreement']:>8.3f}")
+
+    if args.json:
+        os.makedirs(os.path.dirname(os.path.abspath(args.json)), exist_ok=True)
+        with open(args.json, "w") as f:
+            json.dump({"model": args.model, "iou_threshold": args.iou, "backends": summaries}, f, indent=2)
+        print(f"Rapport écrit dans {args.json}")
+
+    print(f"\n{'✓ Parité respectée' if failures == 0 else f'✗ {failures} image(s) en écart'}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
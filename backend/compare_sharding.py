@@ -0,0 +1,136 @@
+"""Test de parité entre le traitement vidéo mono-processus et le découpage en segments.
+
+Usage:
+    python compare_sharding.py --workers 3 --frames 900
+    python compare_sharding.py --video ma_video.mp4 --workers 4 --min-segment-frames 300
+
+Sans ``--video``, la vidéo synthétique du benchmark (images d'exemple du
+dépôt) est générée. La même vidéo est traitée par process_video_tracking
+puis par ShardedVideoProcessor; comptages, franchissements de ligne et
+lignes du journal des tracks sont comparés. Code de sortie 1 si un écart
+dépasse la tolérance.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+from benchmark import _remove_output, create_synthetic_video
+from track_log import load_track_log
+
+
+def _log(result: dict) -> np.ndarray:
+    log, _ = load_track_log(os.path.join("static", result["run_id"] + ".mp4"))
+    return np.array(log)
+
+
+def _relative(reference: float, candidate: float) -> float:
+    return abs(candidate - reference) / max(abs(reference), 1)
+
+
+def compare_runs(reference: dict, candidate: dict, reference_log: np.ndarray, candidate_log: np.ndarray) -> dict:
+    """Écarts entre deux résultats de process_video_tracking"""
+    classes = sorted(set(reference["final_counts"]) | set(candidate["final_counts"]))
+    report = {
+        "total_vehicles": [reference["total_vehicles"], candidate["total_vehicles"]],
+        "final_counts": {c: [reference["final_counts"].get(c, 0), candidate["final_counts"].get(c, 0)]
+                         for c in classes},
+        "log_rows": [len(reference_log), len(candidate_log)],
+    }
+    if "line_counts" in reference:
+        report["line_crossings"] = [
+            reference["line_counts"]["total_in"] + reference["line_counts"]["total_out"],
+            candidate["line_counts"]["total_in"] + candidate["line_counts"]["total_out"],
+        ]
+
+    # Frames dont le nombre de boîtes diffère (les ids globaux peuvent différer)
+    frames = int(max(reference_log["frame"].max(initial=0), candidate_log["frame"].max(initial=0)))
+    per_frame = [np.bincount(log["frame"].astype(np.int64), minlength=frames + 1) for log in
+                 (reference_log, candidate_log)]
+    differing = np.flatnonzero(per_frame[0] != per_frame[1])
+    report["frames"] = frames
+    report["differing_frames"] = differing.tolist()[:50]
+    report["differing_frame_count"] = int(len(differing))
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parité du traitement vidéo découpé en segments")
+    parser.add_argument("--video", default=None, help="vidéo à comparer (défaut : vidéo synthétique)")
+    parser.add_argument("--frames", type=int, default=900)
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--min-segment-frames", type=int, default=200)
+    parser.add_argument("--overlap", type=int, default=None, help="défaut : VIDEO_SEGMENT_OVERLAP")
+    parser.add_argument("--line", default=None, help="x1,y1,x2,y2 (défaut : ligne horizontale au milieu)")
+    parser.add_argument("--tolerance", type=float, default=0.05,
+                        help="écart relatif toléré sur les comptages et le journal")
+    parser.add_argument("--json", default=None, help="écrit le rapport dans ce fichier")
+    args = parser.parse_args()
+
+    from inference_tracking import process_video_tracking
+    from video_sharding import VIDEO_SEGMENT_OVERLAP, ShardedVideoProcessor
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        video_path = args.video or create_synthetic_video(
+            os.path.join(temp_dir, "synthetic.mp4"), args.frames, args.width, args.height
+        )
+        if args.line:
+            x1, y1, x2, y2 = (float(v) for v in args.line.split(","))
+        else:
+            x1, y1, x2, y2 = 0, args.height / 2, args.width, args.height / 2
+        line = [[x1, y1], [x2, y2]]
+
+        reference = process_video_tracking(video_path, line=line)
+        processor = ShardedVideoProcessor(
+            workers=args.workers,
+            min_segment_frames=args.min_segment_frames,
+            overlap=VIDEO_SEGMENT_OVERLAP if args.overlap is None else args.overlap,
+        )
+        try:
+            candidate = processor.process(video_path, "output", True, line=line)
+        finally:
+            processor.shutdown()
+
+        for result in (reference, candidate):
+            if not result.get("success"):
+                raise RuntimeError(result.get("error"))
+        try:
+            report = compare_runs(reference, candidate, _log(reference), _log(candidate))
+        finally:
+            _remove_output(reference)
+            _remove_output(candidate)
+    report["segments"] = candidate.get("segments")
+
+    checked = [report["total_vehicles"], report["log_rows"], *report["final_counts"].values()]
+    if "line_crossings" in report:
+        checked.append(report["line_crossings"])
+    worst = max(_relative(a, b) for a, b in checked)
+    report["max_relative_error"] = round(worst, 4)
+    report["passed"] = worst <= args.tolerance
+
+    print(f"Segments: {report['segments']}")
+    print(f"{'mesure':>16} {'mono':>8} {'segments':>9}")
+    print(f"{'véhicules':>16} {report['total_vehicles'][0]:>8} {report['total_vehicles'][1]:>9}")
+    for name, (a, b) in report["final_counts"].items():
+        print(f"{name:>16} {a:>8} {b:>9}")
+    if "line_crossings" in report:
+        print(f"{'franchissements':>16} {report['line_crossings'][0]:>8} {report['line_crossings'][1]:>9}")
+    print(f"{'lignes journal':>16} {report['log_rows'][0]:>8} {report['log_rows'][1]:>9}")
+    print(f"Frames dont le nombre de boîtes diffère: {report['differing_frame_count']}/{report['frames']} "
+          f"{report['differing_frames'][:10]}")
+    print(f"Écart relatif max: {report['max_relative_error']:.2%} -> {'OK' if report['passed'] else 'ÉCART'}")
+
+    if args.json:
+        os.makedirs(os.path.dirname(os.path.abspath(args.json)), exist_ok=True)
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    sys.exit(0 if report["passed"] else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+from collections import OrderedDict, defaultdict
+
+import numpy as np
+import supervision as sv
+
+# Mises à jour pendant lesquelles sv.ByteTrack garde un track perdu (lost_track_buffer par défaut)
+TRACK_LOST_BUFFER = 30
+# Expiration minimale des identifiants dans les compteurs, en frames
+COUNTER_TTL_FRAMES = 90
+
+
+def counter_ttl(max_gap: int = 1, lost_track_buffer: int = TRACK_LOST_BUFFER) -> int:
+    """Expiration des compteurs (en frames source) pour un tracker mis à jour toutes les ``max_gap`` frames
+
+    ByteTrack compte ses mises à jour, pas les frames : avec un stride, un
+    track perdu garde son identifiant lost_track_buffer × stride frames. Un
+    compteur qui l'oublierait avant le compterait deux fois à son retour.
+    """
+    return max(COUNTER_TTL_FRAMES, (lost_track_buffer + 1) * max(1, int(max_gap)))
+
+
+def _anchors(detections: sv.Detections) -> np.ndarray:
+    """Point bas-centre de chaque boîte (contact avec la route)"""
+    xyxy = detections.xyxy
+    return np.stack([(xyxy[:, 0] + xyxy[:, 2]) / 2, xyxy[:, 3]], axis=1)
+
+
+class _ExpiringIds:
+    """Ensemble de tracker_id avec expiration après ttl_frames sans observation.
+
+    Les identifiants sont rangés par dernière observation : l'expiration
+    ne parcourt que les plus anciens (coût amorti O(1) par mise à jour).
+    """
+
+    def __init__(self, ttl_frames: int):
+        self.ttl_frames = ttl_frames
+        self._last_seen = OrderedDict()
+
+    def __contains__(self, tracker_id) -> bool:
+        return tracker_id in self._last_seen
+
+    def __len__(self) -> int:
+        return len(self._last_seen)
+
+    def get(self, tracker_id, default=None):
+        entry = self._last_seen.get(tracker_id)
+        return default if entry is None else entry[1]
+
+    def touch(self, tracker_id, frame_index: int, value=None):
+        self._last_seen[tracker_id] = (frame_index, value)
+        self._last_seen.move_to_end(tracker_id)
+
+    def evict(self, frame_index: int):
+        while self._last_seen:
+            tracker_id, (last_seen, _) = next(iter(self._last_seen.items()))
+            if frame_index - last_seen <= self.ttl_frames:
+                break
+            del self._last_seen[tracker_id]
+
+
+class UniqueVehicleCounter:
+    """Compte chaque tracker_id une seule fois, avec la classe de sa première observation"""
+
+    def __init__(self, class_names: dict, ttl_frames: int = COUNTER_TTL_FRAMES):
+        self.class_names = class_names
+        self.counts = defaultdict(int)
+        self.total = 0
+        self._active = _ExpiringIds(ttl_frames)
+
+    def update(self, frame_index: int, detections: sv.Detections):
+        if detections.tracker_id is not None and len(detections) > 0:
+            class_ids = detections.class_id if detections.class_id is not None else np.zeros(len(detections), dtype=int)
+            for tracker_id, class_id in zip(detections.tracker_id.tolist(), class_ids.tolist()):
+                if tracker_id not in self._active:
+                    self.counts[self.class_names.get(int(class_id), "unknown")] += 1
+                    self.total += 1
+                self._active.touch(tracker_id, frame_index)
+        self._active.evict(frame_index)
+
+    @property
+    def active_tracks(self) -> int:
+        return len(self._active)
+
+
+class LineCounter:
+    """Compte les franchissements d'un segment [(x1, y1), (x2, y2)] par tracker_id.
+
+    Le côté de chaque boîte est calculé pour toutes les détections de la
+    frame en une opération (produit vectoriel); un franchissement est compté
+    quand le signe change et que le point croise bien le segment.
+    """
+
+    def __init__(self, line, class_names: dict, ttl_frames: int = COUNTER_TTL_FRAMES):
+        (x1, y1), (x2, y2) = line
+        self.start = np.array([x1, y1], dtype=np.float32)
+        self.vector = np.array([x2 - x1, y2 - y1], dtype=np.float32)
+        self.class_names = class_names
+        self.in_counts = defaultdict(int)
+        self.out_counts = defaultdict(int)
+        self._sides = _ExpiringIds(ttl_frames)
+
+    def update(self, frame_index: int, detections: sv.Detections):
+        if detections.tracker_id is not None and len(detections) > 0:
+            relative = _anchors(detections) - self.start
+            cross = self.vector[0] * relative[:, 1] - self.vector[1] * relative[:, 0]
+            sides = np.sign(cross).astype(int)
+            # Position projetée sur le segment : 0..1 quand le point est en face de la ligne
+            along = relative @ self.vector / max(float(self.vector @ self.vector), 1e-9)
+            within = (along >= 0.0) & (along <= 1.0)
+
+            class_ids = detections.class_id if detections.class_id is not None else np.zeros(len(detections), dtype=int)
+            for tracker_id, side, inside, class_id in zip(detections.tracker_id.tolist(), sides.tolist(),
+                                                          within.tolist(), class_ids.tolist()):
+                if side == 0:
+                    continue
+                previous = self._sides.get(tracker_id)
+                if previous is not None and previous != side and inside:
+                    class_name = self.class_names.get(int(class_id), "unknown")
+                    if side > 0:
+                        self.in_counts[class_name] += 1
+                    else:
+                        self.out_counts[class_name] += 1
+                self._sides.touch(tracker_id, frame_index, side)
+        self._sides.evict(frame_index)
+
+    def as_dict(self) -> dict:
+        return {
+            "in": dict(self.in_counts),
+            "out": dict(self.out_counts),
+            "total_in": sum(self.in_counts.values()),
+            "total_out": sum(self.out_counts.values()),
+        }
+
+
+def points_in_polygon(points: np.ndarray, polygon: np.ndarray) -> np.ndarray:
+    """Test point-dans-polygone (ray casting) vectorisé sur tous les points"""
+    x, y = points[:, 0:1], points[:, 1:2]
+    x1, y1 = polygon[:, 0], polygon[:, 1]
+    x2, y2 = np.roll(x1, -1), np.roll(y1, -1)
+    crosses = (y1 > y) != (y2 > y)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        x_intersect = x1 + (y - y1) * (x2 - x1) / (y2 - y1)
+    return np.count_nonzero(crosses & (x < x_intersect), axis=1) % 2 == 1
+
+
+class ZoneCounter:
+    """Compte les véhicules uniques entrés dans un polygone et l'occupation courante"""
+
+    def __init__(self, polygon, class_names: dict, ttl_frames: int = COUNTER_TTL_FRAMES):
+        self.polygon = np.asarray(polygon, dtype=np.float32)
+        self.class_names = class_names
+        self.counts = defaultdict(int)
+        self.occupancy = 0
+        self.max_occupancy = 0
+        self._entered = _ExpiringIds(ttl_frames)
+
+    def update(self, frame_index: int, detections: sv.Detections):
+        self.occupancy = 0
+        if detections.tracker_id is not None and len(detections) > 0:
+            inside = points_in_polygon(_anchors(detections), self.polygon)
+            self.occupancy = int(np.count_nonzero(inside))
+            self.max_occupancy = max(self.max_occupancy, self.occupancy)
+
+            class_ids = detections.class_id if detections.class_id is not None else np.zeros(len(detections), dtype=int)
+            for tracker_id, class_id in zip(detections.tracker_id[inside].tolist(), class_ids[inside].tolist()):
+                if tracker_id not in self._entered:
+                    self.counts[self.class_names.get(int(class_id), "unknown")] += 1
+                self._entered.touch(tracker_id, frame_index)
+        self._entered.evict(frame_index)
+
+    def as_dict(self) -> dict:
+        return {
+            "counts": dict(self.counts),
+            "total": sum(self.counts.values()),
+            "max_occupancy": self.max_occupancy,
+        }
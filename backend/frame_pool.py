@@ -0,0 +1,60 @@
+import os
+import threading
+from collections import deque
+
+# Réutilisation des buffers de frames décodées (0 = une allocation par frame)
+VIDEO_FRAME_POOL = os.environ.get("VIDEO_FRAME_POOL", "1") != "0"
+# Buffers libres gardés au maximum; au-delà, les frames rendues sont abandonnées au GC
+FRAME_POOL_MAX_FREE = int(os.environ.get("FRAME_POOL_MAX_FREE", "64"))
+
+
+class FramePool:
+    """Buffers de frames réutilisés d'une frame à l'autre
+
+    ``read`` décode directement dans un buffer libre (``cap.read(image=...)``),
+    ``release`` le rend une fois la frame encodée ou abandonnée. Le pool ne
+    bloque jamais : sans buffer libre, OpenCV en alloue un nouveau, qui
+    rejoindra le pool à sa libération. Il se stabilise donc au nombre de
+    frames en vol (files du pipeline et de l'encodeur). Un buffer dont la
+    forme ne correspond pas (rotation, changement de résolution) est
+    réalloué par OpenCV, l'ancien est oublié.
+    """
+
+    def __init__(self, max_free: int = FRAME_POOL_MAX_FREE):
+        self.max_free = max_free
+        self._free = deque()
+        self._lock = threading.Lock()
+        self.allocated = 0
+        self.reused = 0
+
+    def read(self, cap):
+        """cap.read() dans un buffer du pool : (ret, frame)"""
+        try:
+            buffer = self._free.pop()
+        except IndexError:
+            buffer = None
+        ret, frame = cap.read(image=buffer) if buffer is not None else cap.read()
+        if not ret:
+            if buffer is not None:
+                self.release(buffer)
+            return False, None
+        with self._lock:
+            if frame is buffer:
+                self.reused += 1
+            else:
+                self.allocated += 1
+        return True, frame
+
+    def release(self, frame):
+        """Rend un buffer : la frame ne doit plus être lue ni écrite ensuite"""
+        if frame is not None and len(self._free) < self.max_free:
+            self._free.append(frame)
+
+    def stats(self) -> dict:
+        total = self.allocated + self.reused
+        return {
+            "allocated": self.allocated,
+            "reused": self.reused,
+            "free": len(self._free),
+            "reuse_ratio": round(self.reused / total, 3) if total else 0.0,
+        }
@@ -0,0 +1,122 @@
+import cv2
+import numpy as np
+import supervision as sv
+
+
+class FrameSampler:
+    """Choisit les frames sur lesquelles lancer la détection.
+
+    En mode fixe, une frame sur ``stride`` est détectée. En mode adaptatif,
+    le pas varie entre ``min_stride`` et ``max_stride`` selon le mouvement
+    mesuré sur une vignette en niveaux de gris : il double quand la scène
+    est statique et revient au minimum dès que le mouvement est fort.
+    """
+
+    def __init__(self, stride: int = 1, adaptive: bool = False, min_stride: int = 1, max_stride: int = 8,
+                 low_motion: float = 1.5, high_motion: float = 6.0):
+        self.adaptive = adaptive
+        self.min_stride = max(1, min_stride)
+        self.max_stride = max(self.min_stride, max_stride)
+        self.stride = max(1, stride) if not adaptive else self.min_stride
+        self.low_motion = low_motion
+        self.high_motion = high_motion
+        self.frame_index = 0
+        self.detected = 0
+        self._since_detection = 0
+        self._previous_thumb = None
+        self._detection_thumb = None
+        self._motion = 0.0
+
+    def should_detect(self, frame: np.ndarray) -> bool:
+        """À appeler une fois par frame, dans l'ordre"""
+        first = self.frame_index == 0
+        self.frame_index += 1
+
+        if not self.adaptive:
+            detect = first or self._since_detection + 1 >= self.stride
+        else:
+            thumb = cv2.cvtColor(cv2.resize(frame, (64, 36), interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+            thumb = thumb.astype(np.int16)
+            if self._previous_thumb is not None:
+                # Moyenne glissante du mouvement entre frames consécutives
+                frame_motion = float(np.abs(thumb - self._previous_thumb).mean())
+                self._motion = 0.7 * self._motion + 0.3 * frame_motion
+            self._previous_thumb = thumb
+
+            # Changement brusque depuis la dernière détection : détecter tout de suite
+            drift = 0.0
+            if self._detection_thumb is not None:
+                drift = float(np.abs(thumb - self._detection_thumb).mean())
+
+            detect = first or self._since_detection + 1 >= self.stride or drift > self.high_motion
+            if detect:
+                self._detection_thumb = thumb
+                self._update_stride()
+
+        if detect:
+            self._since_detection = 0
+            self.detected += 1
+        else:
+            self._since_detection += 1
+        return detect
+
+    @property
+    def max_gap(self) -> int:
+        """Plus grand nombre de frames entre deux détections (mises à jour du tracker)"""
+        return self.max_stride if self.adaptive else self.stride
+
+    def _update_stride(self):
+        if self._motion >= self.high_motion:
+            self.stride = self.min_stride
+        elif self._motion <= self.low_motion:
+            self.stride = min(self.max_stride, self.stride * 2)
+        elif self.stride > self.min_stride:
+            self.stride -= 1
+
+    def stats(self) -> dict:
+        return {
+            "adaptive": self.adaptive,
+            "max_gap": self.max_gap,
+            "frames": self.frame_index,
+            "detected_frames": self.detected,
+            "detection_rate": round(self.detected / self.frame_index, 3) if self.frame_index else 0.0,
+        }
+
+
+class TrackPredictor:
+    """Prolonge les dernières détections sur les frames non détectées.
+
+    Chaque track est extrapolé linéairement à partir de sa vitesse mesurée
+    entre ses deux dernières observations; sans tracker_id, les boîtes sont
+    simplement maintenues en place.
+    """
+
+    def __init__(self):
+        self._last = sv.Detections.empty()
+        self._last_frame = 0
+        self._history = {}
+        self._velocity = np.zeros((0, 4), dtype=np.float32)
+
+    def update(self, frame_index: int, detections: sv.Detections):
+        self._last = detections
+        self._last_frame = frame_index
+        velocity = np.zeros((len(detections), 4), dtype=np.float32)
+
+        if detections.tracker_id is not None:
+            history = {}
+            for i, (tracker_id, box) in enumerate(zip(detections.tracker_id, detections.xyxy)):
+                tracker_id = int(tracker_id)
+                previous = self._history.get(tracker_id)
+                if previous is not None and frame_index > previous[0]:
+                    velocity[i] = (box - previous[1]) / (frame_index - previous[0])
+                history[tracker_id] = (frame_index, box.copy())
+            self._history = history
+
+        self._velocity = velocity
+
+    def predict(self, frame_index: int) -> sv.Detections:
+        if len(self._last) == 0:
+            return self._last
+        predicted = self._last[np.arange(len(self._last))]
+        predicted.xyxy = self._last.xyxy + self._velocity * (frame_index - self._last_frame)
+        return predicted
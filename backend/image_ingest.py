@@ -0,0 +1,87 @@
+import io
+import os
+
+import cv2
+import numpy as np
+from PIL import Image
+
+# Plus grand côté visé au décodage : le modèle redimensionne de toute façon à 640
+IMAGE_DECODE_SIZE = int(os.environ.get("IMAGE_DECODE_SIZE", "640"))
+
+# Facteurs de réduction DCT du décodeur JPEG (du plus fort au plus faible)
+_REDUCED_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+
+# Orientation EXIF ignorée : coordonnées identiques au décodage PIL d'origine
+_COLOR_FLAGS = cv2.IMREAD_COLOR | cv2.IMREAD_IGNORE_ORIENTATION
+
+
+class IngestedImage:
+    """Image décodée en BGR 8 bits 3 canaux, éventuellement réduite.
+
+    ``to_original`` ramène des boîtes xyxy dans les coordonnées de l'image
+    envoyée par le client.
+    """
+
+    def __init__(self, image: np.ndarray, original_size: tuple, source_format: str = None):
+        self.image = image
+        self.original_size = original_size
+        self.source_format = source_format
+        width, height = original_size
+        self.scale = np.array([width / image.shape[1], height / image.shape[0]] * 2, dtype=np.float32)
+
+    @property
+    def reduced(self) -> bool:
+        return self.image.shape[1] != self.original_size[0] or self.image.shape[0] != self.original_size[1]
+
+    def to_original(self, xyxy: np.ndarray) -> np.ndarray:
+        return xyxy * self.scale if self.reduced else xyxy
+
+
+def reduction_factor(size: tuple, target_size) -> int:
+    """Plus forte réduction qui garde le plus grand côté >= target_size"""
+    if not target_size:
+        return 1
+    longest = max(size)
+    for factor, _ in _REDUCED_FLAGS:
+        if longest // factor >= target_size:
+            return factor
+    return 1
+
+
+def decode_image(data: bytes, target_size=IMAGE_DECODE_SIZE) -> IngestedImage:
+    """Octets d'image -> BGR uint8 (H, W, 3), décodage JPEG réduit si possible
+
+    Niveaux de gris, RGBA, palettes et images 16 bits sont ramenés en BGR
+    8 bits. ``target_size`` None décode à la résolution d'origine (tuiles).
+    Lève ValueError si les données ne sont pas une image lisible.
+    """
+    if not data:
+        raise ValueError("Données image vides")
+    try:
+        # Lecture de l'en-tête seulement : taille et format sans décoder les pixels
+        header = Image.open(io.BytesIO(data))
+        size, source_format = header.size, header.format
+    except Exception as e:
+        raise ValueError(f"Image corrompue: {e}")
+
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    flags = _COLOR_FLAGS
+    if source_format == "JPEG":
+        factor = reduction_factor(size, target_size)
+        flags = dict(_REDUCED_FLAGS).get(factor, cv2.IMREAD_COLOR) | cv2.IMREAD_IGNORE_ORIENTATION
+    image = cv2.imdecode(buffer, flags)
+
+    if image is None:
+        # Formats inconnus d'OpenCV (GIF, certaines variantes TIFF...) : repli PIL
+        try:
+            header.load()
+            rgb = np.asarray(header.convert("RGB"))
+        except Exception as e:
+            raise ValueError(f"Image corrompue: {e}")
+        image = cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR)
+
+    return IngestedImage(image, size, source_format)
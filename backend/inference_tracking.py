@@ -1,28 +1,97 @@
 import cv2
 import numpy as np
-from ultralytics import YOLO
 import supervision as sv
-from PIL import Image
 import base64
-import io
 import os
+import time
+import uuid
 from collections import defaultdict
 
-# Charger le modèle
-def load_model():
-    try:
-        model = YOLO('yolov8n.pt')
-        print("✓ Modèle YOLOv8n chargé")
-        return model
-    except Exception as e:
-        print(f"✗ Erreur chargement modèle: {e}")
-        raise
+from counting import LineCounter, UniqueVehicleCounter, ZoneCounter, counter_ttl
+from frame_pool import VIDEO_FRAME_POOL, FramePool
+from frame_sampling import FrameSampler, TrackPredictor
+from image_ingest import IMAGE_DECODE_SIZE, decode_image
+from metrics import FRAMES_PROCESSED, MODEL_INFERENCE, STAGE_LATENCY, VIDEO_FPS, stage_timer
+from model_registry import registry
+from retention import active_output
+from roi import RegionOfInterest, resolve_class_ids
+from tiling import TiledBatch
+from track_log import TrackLogWriter
+from uploads import copy_upload
+from video_encoding import encoding_options, open_writer
+from video_pipeline import VideoPipeline
+
+# Les modèles sont chargés par le registre (model_registry.py) : chaque
+# inférence réserve une instance, jamais partagée entre deux threads
+
+# Nombre de frames envoyées au modèle en un seul appel
+VIDEO_BATCH_SIZE = int(os.environ.get("VIDEO_BATCH_SIZE", "4"))
+
+# Nombre de lots en attente entre deux étages du pipeline vidéo
+VIDEO_PIPELINE_QUEUE_SIZE = int(os.environ.get("VIDEO_PIPELINE_QUEUE_SIZE", "4"))
+
+# Détection sur une frame sur VIDEO_STRIDE (1 = toutes les frames)
+VIDEO_STRIDE = int(os.environ.get("VIDEO_STRIDE", "1"))
+
+
+def _write_temp_video(video_file, temp_dir: str) -> str:
+    """Retourne le chemin de la vidéo à lire (chemin déjà sur disque ou upload copié)"""
+    if isinstance(video_file, (str, os.PathLike)):
+        return os.fspath(video_file)
 
-model = load_model()
-class_list = model.names
+    # Copie par blocs : la vidéo n'est jamais chargée entière en mémoire
+    temp_video_path = os.path.join(temp_dir, "temp_video.mp4")
+    copy_upload(video_file.file, temp_video_path)
+    return temp_video_path
 
-def process_image(image_data: bytes) -> dict:
-    """Version robuste avec gestion d'erreurs complète"""
+def detect_frame(frame: np.ndarray, model_name=None) -> sv.Detections:
+    """Détection sur une frame BGR isolée (suivi temps réel)"""
+    with registry.acquire(model_name) as model:
+        with MODEL_INFERENCE.time(model=registry.resolve(model_name)):
+            result = model(frame, verbose=False)[0]
+    return sv.Detections.from_ultralytics(result)
+
+def format_detections(detections: sv.Detections, class_names: dict, boxes: np.ndarray = None) -> list:
+    """sv.Detections -> liste de dicts de l'API; ``boxes`` remplace detections.xyxy (coordonnées d'origine)"""
+    boxes = detections.xyxy if boxes is None else boxes
+    formatted = []
+    for i in range(len(detections)):
+        try:
+            class_id = int(detections.class_id[i]) if detections.class_id is not None else 0
+            formatted.append({
+                "bbox": boxes[i].tolist(),
+                "confidence": float(detections.confidence[i]) if detections.confidence is not None else 0.0,
+                "class_name": class_names.get(class_id, "unknown"),
+                "class_id": class_id,
+                "tracker_id": None
+            })
+        except Exception as e:
+            print(f"Erreur formatage détection {i}: {e}")
+    return formatted
+
+def annotate_jpeg(image: np.ndarray, detections: sv.Detections, pipeline: str) -> bytes:
+    """Boîtes dessinées sur une copie de l'image BGR, encodée en JPEG"""
+    with stage_timer(pipeline, "annotate"):
+        annotated_image = sv.BoxAnnotator().annotate(scene=image.copy(), detections=detections)
+    with stage_timer(pipeline, "encode"):
+        ok, encoded = cv2.imencode(".jpg", annotated_image, [cv2.IMWRITE_JPEG_QUALITY, 85])
+    if not ok:
+        raise RuntimeError("Encodage JPEG impossible")
+    return encoded.tobytes()
+
+def process_image(image_data: bytes, model_name=None, infer=None, annotate="base64", tiling=None) -> dict:
+    """Version robuste avec gestion d'erreurs complète
+
+    ``infer(image_np, model_name)`` remplace l'appel direct au modèle
+    (ex: MicroBatcher.infer pour regrouper les requêtes concurrentes).
+    ``annotate`` : "base64" (chaîne), "jpeg" (octets bruts) ou None (pas
+    d'image annotée, détections seules).
+    ``tiling`` : options de tiling.tiling_options; les tuiles et l'image
+    entière partent en un seul appel au modèle, sans passer par ``infer``.
+    Hors tuiles, les grands JPEG sont décodés réduits (image_ingest.py) :
+    les boîtes restent en coordonnées de l'image d'origine, l'image annotée
+    est à la résolution de décodage.
+    """
     try:
         print("=== PROCESS_IMAGE START ===")
         
@@ -32,72 +101,64 @@ def process_image(image_data: bytes) -> dict:
         
         print(f"Taille données reçues: {len(image_data)} bytes")
         
-        # Conversion bytes -> PIL Image avec vérification
+        # Décodage direct en BGR (ordre attendu par le modèle), réduit si possible
         try:
-            image = Image.open(io.BytesIO(image_data))
-            # Forcer le chargement pour vérifier l'intégrité
-            image.load()
-        except Exception as e:
-            return {"error": f"Image corrompue: {str(e)}"}
+            with stage_timer("image", "decode"):
+                ingested = decode_image(image_data, None if tiling is not None else IMAGE_DECODE_SIZE)
+                image_np = ingested.image
+        except ValueError as e:
+            return {"error": str(e)}
         
-        image_np = np.array(image)
-        print(f"Image chargée: {image_np.shape}")
+        print(f"Image chargée: {image_np.shape} (originale {ingested.original_size[0]}x{ingested.original_size[1]})")
         
-        # Run YOLO inference
-        results = model(image_np)
+        # Run YOLO inference (attente du micro-batch comprise)
+        with stage_timer("image", "inference"):
+            if tiling is not None:
+                batch = TiledBatch([image_np], [True], tiling)
+                with registry.acquire(model_name) as model:
+                    with MODEL_INFERENCE.time(model=registry.resolve(model_name)):
+                        results = model(batch.inputs)
+                print(f"Tuiles: {batch.tile_count}")
+            elif infer is not None:
+                results = [infer(image_np, model_name)]
+            else:
+                with registry.acquire(model_name) as model:
+                    with MODEL_INFERENCE.time(model=registry.resolve(model_name)):
+                        results = model(image_np)
         result = results[0]
-        print(f"Boxes détectées: {len(result.boxes)}")
+        
+        # Conversion supervision (fusion des tuiles par NMS)
+        with stage_timer("image", "postprocess"):
+            if tiling is not None:
+                detections = batch.merge(results)[0]
+            else:
+                detections = sv.Detections.from_ultralytics(result)
+        print(f"Détections supervision: {len(detections)}")
         
         # Si pas de détections
-        if len(result.boxes) == 0:
+        if len(detections) == 0:
             return {
                 "detections": [],
                 "processed_image": None,
                 "message": "Aucun objet détecté"
             }
         
-        # Conversion supervision
-        detections = sv.Detections.from_ultralytics(result)
-        print(f"Détections supervision: {len(detections)}")
-        
-        # Formatage des détections
-        formatted_detections = []
-        for i in range(len(detections.xyxy)):
-            try:
-                bbox = detections.xyxy[i].tolist()
-                confidence = float(detections.confidence[i]) if detections.confidence is not None else 0.0
-                class_id = int(detections.class_id[i]) if detections.class_id is not None else 0
-                class_name = model.names.get(class_id, "unknown")
-                
-                formatted_detections.append({
-                    "bbox": bbox,
-                    "confidence": confidence,
-                    "class_name": class_name,
-                    "class_id": class_id,
-                    "tracker_id": None
-                })
-            except Exception as e:
-                print(f"Erreur formatage détection {i}: {e}")
-                continue
-        
+        # Formatage des détections, en coordonnées de l'image d'origine
+        formatted_detections = format_detections(detections, result.names, ingested.to_original(detections.xyxy))
         print(f"Détections formatées: {len(formatted_detections)}")
         
         # Annotation de l'image
-        try:
-            box_annotator = sv.BoxAnnotator()
-            annotated_image = box_annotator.annotate(
-                scene=image_np.copy(),
-                detections=detections
-            )
-            
-            # Conversion base64
-            annotated_pil = Image.fromarray(annotated_image)
-            buffered = io.BytesIO()
-            annotated_pil.save(buffered, format="JPEG", quality=85)
-            processed_image = base64.b64encode(buffered.getvalue()).decode()
-        except Exception as e:
-            print(f"Erreur annotation image: {e}")
-            processed_image = None
+        processed_image = None
+        if annotate:
+            try:
+                encoded = annotate_jpeg(image_np, detections, "image")
+                if annotate == "jpeg":
+                    processed_image = encoded
+                else:
+                    # Conversion base64
+                    processed_image = base64.b64encode(encoded).decode()
+            except Exception as e:
+                print(f"Erreur annotation image: {e}")
         
         print("=== PROCESS_IMAGE SUCCESS ===")
         
@@ -114,101 +175,320 @@ def process_image(image_data: bytes) -> dict:
         traceback.print_exc()
         return {"error": str(e)}
 
-def process_video_detection(video_file) -> dict:
-    """Traite la vidéo et détecte les véhicules sans tracking"""
-    try:
-        print("=== PROCESS_VIDEO_DETECTION START ===")
+def _read_batch(cap, batch_size: int, pool: FramePool = None) -> list:
+    """Lit jusqu'à batch_size frames consécutives (dans les buffers de ``pool``)"""
+    frames = []
+    while len(frames) < batch_size:
+        ret, frame = pool.read(cap) if pool is not None else cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    return frames
+
+
+def _process_video(video_file, output_prefix: str, track: bool, progress_callback=None, batch_size=None,
+                   stride=None, adaptive=False, line=None, zone=None, model_name=None,
+                   detections_callback=None, encoding=None, roi=None, classes=None,
+                   start_frame=0, end_frame=None, warmup_frames=0, tiling=None, frame_pool=None,
+                   predicted_frames=None) -> dict:
+    """Boucle commune aux traitements vidéo, inférence par lots de frames
+
+    ``encoding`` : options de video_encoding.encoding_options (codec,
+    preset, crf, output_width); codec "none" ne rend aucune vidéo.
+    ``roi`` : polygone [[x, y], ...], seul son rectangle englobant est
+    envoyé au modèle. ``classes`` : allowlist (noms, ids ou "vehicles")
+    appliquée par le modèle avant la NMS.
+    ``tiling`` : options de tiling.tiling_options; une inférence sur
+    ``every`` découpe la frame en tuiles, dans le même appel que le lot.
+    ``start_frame`` / ``end_frame`` limitent le traitement à un segment
+    (video_sharding.py); les ``warmup_frames`` précédant start_frame
+    alimentent le tracker et le journal mais ne sont ni rendues ni comptées.
+    ``frame_pool`` (défaut VIDEO_FRAME_POOL) : frames décodées dans des
+    buffers réutilisés (frame_pool.py).
+    ``predicted_frames`` : liste complétée avec le numéro des frames sautées
+    (stride), dont les boîtes du journal sont extrapolées.
+    """
+    import tempfile
+
+    batch_size = max(1, int(batch_size or VIDEO_BATCH_SIZE))
+    pipeline_name = "video_tracking" if track else "video_detection"
+    model_key = registry.resolve(model_name)
+    encoding = encoding or encoding_options()
+    render_video = encoding["codec"] != "none"
+    class_names = registry.class_names(model_name)
+    class_ids = resolve_class_ids(classes, class_names)
+    sampler = FrameSampler(stride=int(stride or VIDEO_STRIDE), adaptive=adaptive)
+    predictor = TrackPredictor()
+    pool = FramePool() if (VIDEO_FRAME_POOL if frame_pool is None else frame_pool) else None
+
+    # Suffixe aléatoire : deux jobs terminés la même seconde ne s'écrasent pas
+    output_video_path = os.path.join(
+        "static", f"{output_prefix}_{int(time.time())}_{uuid.uuid4().hex[:8]}.mp4"
+    )
+    run_id = os.path.splitext(os.path.basename(output_video_path))[0]
+
+    # Vidéo, journal (.raw compris) et aperçu restent hors rétention jusqu'à la fin du job
+    with tempfile.TemporaryDirectory() as temp_dir, active_output(run_id):
+        temp_video_path = _write_temp_video(video_file, temp_dir)
         
-        import tempfile
-        from pathlib import Path
+        print(f"Vidéo temporaire: {temp_video_path}")
         
-        with tempfile.TemporaryDirectory() as temp_dir:
-            temp_video_path = os.path.join(temp_dir, "temp_video.mp4")
-            
-            video_content = video_file.file.read()
-            with open(temp_video_path, 'wb') as f:
-                f.write(video_content)
-            
-            print(f"Vidéo temporaire: {temp_video_path}")
-            
-            cap = cv2.VideoCapture(temp_video_path)
-            if not cap.isOpened():
-                return {"success": False, "error": "Impossible d'ouvrir la vidéo"}
-            
-            fps = cap.get(cv2.CAP_PROP_FPS)
-            width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-            height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-            
-            print(f"Vidéo: {width}x{height}, {fps}fps, {total_frames} frames")
-            
-            output_video_path = os.path.join("static", f"detection_{int(__import__('time').time())}.mp4")
-            os.makedirs("static", exist_ok=True)
-            
-            fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-            out = cv2.VideoWriter(output_video_path, fourcc, fps, (width, height))
+        cap = cv2.VideoCapture(temp_video_path)
+        if not cap.isOpened():
+            return {"success": False, "error": "Impossible d'ouvrir la vidéo"}
+        
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        
+        print(f"Vidéo: {width}x{height}, {fps}fps, {total_frames} frames, lots de {batch_size}")
+        
+        first_frame = max(0, start_frame - warmup_frames)
+        if first_frame > 0:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, first_frame)
+        if end_frame is not None:
+            total_frames = min(total_frames, end_frame)
+        next_frame = first_frame
+        
+        region = RegionOfInterest(roi, (width, height)) if roi else None
+        if region is not None:
+            print(f"ROI: {region.as_dict()['crop']}")
+        
+        os.makedirs("static", exist_ok=True)
+        
+        # L'encodage tourne dans son propre thread (ou dans ffmpeg)
+        # Le buffer d'une frame revient au pool une fois encodée
+        out = open_writer(output_video_path, fps, (width, height), encoding, pipeline=pipeline_name,
+                          on_written=pool.release if pool is not None else None)
+        if out.streaming and progress_callback is not None:
+            # MP4 fragmenté : le client peut lire la vidéo pendant le traitement
+            progress_callback(0, total_frames, processed_video=os.path.basename(output_video_path),
+                              streaming=True)
+        # Journal des détections par frame, interrogeable via /api/tracks/{run_id}
+        track_log = TrackLogWriter(output_video_path, fps, class_names)
+        
+        vehicle_counts = defaultdict(int)
+        total_detections = 0
+        # Numéro (à partir de 1) de la dernière frame traitée dans la vidéo source
+        frame_count = first_frame
+        preview_frame = None
+        
+        byte_track = sv.ByteTrack() if track else None
+        box_annotator = sv.BoxAnnotator()
+        
+        # Nombre d'inférences effectuées, pour l'alternance tuiles / image entière
+        inferred_frames = 0
+        tiled_frames = 0
+        
+        # Le tracker n'avance qu'aux frames détectées : expiration à l'échelle du stride
+        ttl = counter_ttl(sampler.max_gap)
+        unique_counter = UniqueVehicleCounter(class_names, ttl) if track else None
+        line_counter = LineCounter(line, class_names, ttl) if track and line else None
+        zone_counter = ZoneCounter(zone, class_names, ttl) if track and zone else None
+        
+        def infer(frames):
+            # Les frames sautées (stride) reçoivent None et seront prédites
+            # Seule la ROI compte, y compris pour la mesure de mouvement
+            inputs = [region.crop(frame) for frame in frames] if region is not None else frames
+            with stage_timer(pipeline_name, "sampling"):
+                selected = [i for i, frame in enumerate(inputs) if sampler.should_detect(frame)]
+            nonlocal inferred_frames, tiled_frames
+            results = [None] * len(frames)
+            if not selected:
+                return results
             
-            vehicle_counts = defaultdict(int)
-            total_detections = 0
-            frame_count = 0
-            preview_frame = None
+            images = [inputs[i] for i in selected]
+            batch = None
+            if tiling is not None:
+                tiled = [(inferred_frames + k) % tiling["every"] == 0 for k in range(len(images))]
+                batch = TiledBatch(images, tiled, tiling)
+                images = batch.inputs
+                tiled_frames += sum(tiled)
+            inferred_frames += len(selected)
             
-            box_annotator = sv.BoxAnnotator()
+            # Une seule inférence pour tout le lot (tuiles comprises)
+            with stage_timer(pipeline_name, "inference"), registry.acquire(model_name) as model:
+                with MODEL_INFERENCE.time(model=model_key):
+                    batch_results = model(images, classes=class_ids)
+            if batch is not None:
+                batch_results = batch.merge(batch_results)
+            for i, result in zip(selected, batch_results):
+                results[i] = result
+            return results
+        
+        def consume(frames, results):
+            nonlocal frame_count, total_detections, preview_frame
             
-            while True:
-                ret, frame = cap.read()
-                if not ret:
-                    break
-                
+            # Les résultats sont dans l'ordre des frames : le tracker les reçoit dans l'ordre
+            for frame, result in zip(frames, results):
                 frame_count += 1
                 
-                results = model(frame)
-                result = results[0]
+                t0 = time.perf_counter()
+                if result is None:
+                    # Frame sautée : prolonger les tracks de la dernière détection
+                    detections = predictor.predict(frame_count)
+                    if predicted_frames is not None:
+                        predicted_frames.append(frame_count)
+                else:
+                    if isinstance(result, sv.Detections):
+                        # Déjà converties et fusionnées (tuiles)
+                        detections = result
+                    elif len(result.boxes) > 0:
+                        detections = sv.Detections.from_ultralytics(result)
+                    else:
+                        detections = sv.Detections.empty()
+                    if len(detections) > 0:
+                        if region is not None:
+                            # Coordonnées ROI -> frame, hors polygone écarté avant le tracking
+                            detections = region.to_frame(detections)
+                        if byte_track is not None:
+                            detections = byte_track.update_with_detections(detections)
+                    predictor.update(frame_count, detections)
                 
-                if len(result.boxes) > 0:
-                    detections = sv.Detections.from_ultralytics(result)
-                    
-                    for class_id in result.boxes.cls:
-                        class_name = model.names[int(class_id)]
-                        vehicle_counts[class_name] += 1
+                if detections_callback is not None:
+                    detections_callback(frame_count, detections)
+                track_log.append(frame_count, detections)
+                
+                if frame_count <= start_frame:
+                    # Frames d'amorçage du tracker (segment) : ni comptées ni rendues
+                    if pool is not None:
+                        pool.release(frame)
+                    continue
+                
+                if unique_counter is not None:
+                    # Comptage par tracker_id : chaque véhicule n'est compté qu'une fois
+                    unique_counter.update(frame_count, detections)
+                    # Ligne et zone : positions détectées uniquement, une boîte extrapolée
+                    # peut franchir la ligne alors que le véhicule s'est arrêté ou a fait demi-tour
+                    if result is not None:
+                        for counter in (line_counter, zone_counter):
+                            if counter is not None:
+                                counter.update(frame_count, detections)
+                elif detections.class_id is not None:
+                    # Sans tracking : nombre de boîtes cumulé sur toutes les frames
+                    for class_id in detections.class_id:
+                        vehicle_counts[class_names[int(class_id)]] += 1
                         total_detections += 1
-                    
-                    annotated_frame = box_annotator.annotate(
-                        scene=frame.copy(),
-                        detections=detections
-                    )
-                else:
-                    annotated_frame = frame.copy()
                 
-                if preview_frame is None:
-                    preview_frame = annotated_frame.copy()
+                t1 = time.perf_counter()
+                STAGE_LATENCY.observe(t1 - t0, pipeline=pipeline_name, stage="track")
                 
-                out.write(annotated_frame)
+                # Sans vidéo rendue, seule la frame d'aperçu est annotée
+                if render_video or preview_frame is None:
+                    # La frame brute ne sert plus après l'inférence : annotation sur place,
+                    # aucune copie quand il n'y a pas de boîte
+                    annotated_frame = frame
+                    if len(detections) > 0:
+                        annotated_frame = box_annotator.annotate(
+                            scene=frame,
+                            detections=detections
+                        )
+                    if region is not None:
+                        cv2.polylines(annotated_frame, [region.polygon.astype(np.int32)], True, (0, 255, 255), 2)
+                    
+                    if preview_frame is None:
+                        preview_frame = annotated_frame.copy()
+                    
+                    STAGE_LATENCY.observe(time.perf_counter() - t1, pipeline=pipeline_name, stage="annotate")
+                    out.write(annotated_frame)
+                elif pool is not None:
+                    pool.release(frame)
                 
                 if frame_count % 30 == 0:
                     print(f"Traitement frame {frame_count}/{total_frames}")
-            
-            cap.release()
-            out.release()
-            
-            print(f"Vidéo traitée: {frame_count} frames")
-            print(f"Objets détectés: {dict(vehicle_counts)}")
-            
-            preview_image = None
-            if preview_frame is not None:
-                preview_pil = Image.fromarray(cv2.cvtColor(preview_frame, cv2.COLOR_BGR2RGB))
-                buffered = io.BytesIO()
-                preview_pil.save(buffered, format="JPEG", quality=85)
-                preview_image = base64.b64encode(buffered.getvalue()).decode()
-            
-            return {
-                "success": True,
-                "processed_video": os.path.basename(output_video_path),
-                "preview_image": preview_image,
-                "final_counts": dict(vehicle_counts),
-                "total_vehicles": total_detections
-            }
-            
+                    if progress_callback is not None:
+                        progress_callback(frame_count, total_frames)
+        
+        def read_batch():
+            nonlocal next_frame
+            count = batch_size if end_frame is None else min(batch_size, end_frame - next_frame)
+            with stage_timer(pipeline_name, "decode"):
+                frames = _read_batch(cap, count, pool) if count > 0 else []
+            next_frame += len(frames)
+            return frames
+        
+        # Décodage, inférence et annotation+encodage se recouvrent
+        pipeline = VideoPipeline(
+            read_batch=read_batch,
+            infer=infer,
+            consume=consume,
+            queue_size=VIDEO_PIPELINE_QUEUE_SIZE,
+        )
+        try:
+            try:
+                pipeline_stats = pipeline.run()
+            finally:
+                cap.release()
+                out.release()
+        except BaseException:
+            track_log.abort()
+            raise
+        track_log.close(frame_count)
+        
+        if progress_callback is not None:
+            progress_callback(frame_count, max(total_frames, frame_count))
+        
+        processed_frames = frame_count - first_frame
+        FRAMES_PROCESSED.inc(processed_frames, pipeline=pipeline_name)
+        if pipeline_stats["wall_s"] > 0:
+            VIDEO_FPS.observe(processed_frames / pipeline_stats["wall_s"], pipeline=pipeline_name)
+        
+        if unique_counter is not None:
+            vehicle_counts = unique_counter.counts
+            total_detections = unique_counter.total
+        
+        print(f"Vidéo traitée: {processed_frames} frames")
+        print(f"Objets détectés: {dict(vehicle_counts)}")
+        print(f"Étages du pipeline: {pipeline_stats}")
+        print(f"Échantillonnage: {sampler.stats()}")
+        if pool is not None:
+            print(f"Buffers de frames: {pool.stats()}")
+        
+        preview_image = None
+        preview_url = None
+        if preview_frame is not None:
+            # Aperçu servi aussi en fichier : les clients compacts évitent le base64
+            ok, encoded = cv2.imencode(".jpg", preview_frame, [cv2.IMWRITE_JPEG_QUALITY, 85])
+            if ok:
+                preview_path = os.path.splitext(output_video_path)[0] + "_preview.jpg"
+                with open(preview_path, "wb") as f:
+                    f.write(encoded.tobytes())
+                preview_url = f"/static/{os.path.basename(preview_path)}"
+                preview_image = base64.b64encode(encoded.tobytes()).decode()
+        
+        return {
+            "success": True,
+            "processed_video": os.path.basename(output_video_path) if render_video else None,
+            "encoding": encoding,
+            "run_id": run_id,
+            "roi": region.as_dict() if region is not None else None,
+            "classes": [class_names[i] for i in class_ids] if class_ids is not None else None,
+            "tiling": {**tiling, "tiled_frames": tiled_frames} if tiling is not None else None,
+            "track_log_url": f"/api/tracks/{run_id}",
+            "preview_image": preview_image,
+            "preview_url": preview_url,
+            "final_counts": dict(vehicle_counts),
+            "total_vehicles": total_detections,
+            "pipeline_stats": pipeline_stats,
+            "sampling": sampler.stats(),
+            "frame_pool": pool.stats() if pool is not None else None,
+            **({"line_counts": line_counter.as_dict()} if line_counter is not None else {}),
+            **({"zone_counts": zone_counter.as_dict()} if zone_counter is not None else {})
+        }
+
+
+def process_video_detection(video_file, progress_callback=None, batch_size=None, stride=None, adaptive=False,
+                            model_name=None, encoding=None, roi=None, classes=None, tiling=None,
+                            frame_pool=None) -> dict:
+    """Traite la vidéo et détecte les véhicules sans tracking"""
+    try:
+        print("=== PROCESS_VIDEO_DETECTION START ===")
+        return _process_video(video_file, "detection", track=False,
+                              progress_callback=progress_callback, batch_size=batch_size,
+                              stride=stride, adaptive=adaptive, model_name=model_name,
+                              encoding=encoding, roi=roi, classes=classes, tiling=tiling,
+                              frame_pool=frame_pool)
     except Exception as e:
         print(f"=== PROCESS_VIDEO_DETECTION ERROR ===")
         print(f"Erreur: {e}")
@@ -217,103 +497,17 @@ def process_video_detection(video_file) -> dict:
         return {"success": False, "error": str(e)}
 
 
-def process_video_tracking(video_file) -> dict:
-    """Traite la vidéo et détecte les véhicules"""
+def process_video_tracking(video_file, progress_callback=None, batch_size=None, stride=None, adaptive=False,
+                           line=None, zone=None, model_name=None, encoding=None, roi=None, classes=None,
+                           tiling=None, frame_pool=None) -> dict:
+    """Traite la vidéo, suit les véhicules et compte chaque tracker_id une seule fois"""
     try:
         print("=== PROCESS_VIDEO START ===")
-        
-        import tempfile
-        from pathlib import Path
-        
-        with tempfile.TemporaryDirectory() as temp_dir:
-            temp_video_path = os.path.join(temp_dir, "temp_video.mp4")
-            
-            video_content = video_file.file.read()
-            with open(temp_video_path, 'wb') as f:
-                f.write(video_content)
-            
-            print(f"Vidéo temporaire: {temp_video_path}")
-            
-            cap = cv2.VideoCapture(temp_video_path)
-            if not cap.isOpened():
-                return {"success": False, "error": "Impossible d'ouvrir la vidéo"}
-            
-            fps = cap.get(cv2.CAP_PROP_FPS)
-            width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-            height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-            
-            print(f"Vidéo: {width}x{height}, {fps}fps, {total_frames} frames")
-            
-            output_video_path = os.path.join("static", f"output_{int(__import__('time').time())}.mp4")
-            os.makedirs("static", exist_ok=True)
-            
-            fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-            out = cv2.VideoWriter(output_video_path, fourcc, fps, (width, height))
-            
-            vehicle_counts = defaultdict(int)
-            total_detections = 0
-            frame_count = 0
-            preview_frame = None
-            
-            byte_track = sv.ByteTrack()
-            box_annotator = sv.BoxAnnotator()
-            
-            while True:
-                ret, frame = cap.read()
-                if not ret:
-                    break
-                
-                frame_count += 1
-                
-                results = model(frame)
-                result = results[0]
-                
-                if len(result.boxes) > 0:
-                    detections = sv.Detections.from_ultralytics(result)
-                    detections = byte_track.update_with_detections(detections)
-                    
-                    for class_id in result.boxes.cls:
-                        class_name = model.names[int(class_id)]
-                        vehicle_counts[class_name] += 1
-                        total_detections += 1
-                    
-                    annotated_frame = box_annotator.annotate(
-                        scene=frame.copy(),
-                        detections=detections
-                    )
-                else:
-                    annotated_frame = frame.copy()
-                
-                if preview_frame is None:
-                    preview_frame = annotated_frame.copy()
-                
-                out.write(annotated_frame)
-                
-                if frame_count % 30 == 0:
-                    print(f"Traitement frame {frame_count}/{total_frames}")
-            
-            cap.release()
-            out.release()
-            
-            print(f"Vidéo traitée: {frame_count} frames")
-            print(f"Véhicules détectés: {dict(vehicle_counts)}")
-            
-            preview_image = None
-            if preview_frame is not None:
-                preview_pil = Image.fromarray(cv2.cvtColor(preview_frame, cv2.COLOR_BGR2RGB))
-                buffered = io.BytesIO()
-                preview_pil.save(buffered, format="JPEG", quality=85)
-                preview_image = base64.b64encode(buffered.getvalue()).decode()
-            
-            return {
-                "success": True,
-                "processed_video": os.path.basename(output_video_path),
-                "preview_image": preview_image,
-                "final_counts": dict(vehicle_counts),
-                "total_vehicles": total_detections
-            }
-            
+        return _process_video(video_file, "output", track=True,
+                              progress_callback=progress_callback, batch_size=batch_size,
+                              stride=stride, adaptive=adaptive, line=line, zone=zone,
+                              model_name=model_name, encoding=encoding, roi=roi, classes=classes,
+                              tiling=tiling, frame_pool=frame_pool)
     except Exception as e:
         print(f"=== PROCESS_VIDEO ERROR ===")
         print(f"Erreur: {e}")
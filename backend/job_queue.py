@@ -0,0 +1,159 @@
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class QueueFullError(Exception):
+    """Levée quand la file de jobs a atteint sa capacité maximale"""
+
+
+class JobManager:
+    """File de jobs bornée exécutée par un pool de threads.
+
+    Le nombre de jobs en attente ou en cours est limité à
+    ``max_workers + max_queued`` : au-delà, ``submit`` lève
+    ``QueueFullError`` (l'API répond alors 429).
+    """
+
+    def __init__(self, max_workers: int = 1, max_queued: int = 4, max_finished: int = 100):
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.max_finished = max_finished
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="video-job")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._pending = 0
+
+    def is_full(self) -> bool:
+        with self._lock:
+            return self._pending >= self.max_workers + self.max_queued
+
+    def submit(self, fn, *args, cleanup=None, **kwargs) -> str:
+        """Ajoute un job; ``fn`` reçoit ``progress_callback`` en argument nommé
+
+        ``progress_callback(frame, total_frames, **details)`` : les détails
+        (ex: processed_video en cours d'écriture) sont ajoutés à la progression.
+        """
+        with self._lock:
+            if self._pending >= self.max_workers + self.max_queued:
+                raise QueueFullError("File de traitement pleine, réessayez plus tard")
+            self._pending += 1
+            job_id = uuid.uuid4().hex
+            self._jobs[job_id] = {
+                "job_id": job_id,
+                "status": "queued",
+                "progress": {"frame": 0, "total_frames": 0, "percent": 0.0},
+                "created_at": time.time(),
+                "started_at": None,
+                "finished_at": None,
+                "result": None,
+                "error": None,
+            }
+            self._prune()
+
+        self._executor.submit(self._run, job_id, fn, args, kwargs, cleanup)
+        return job_id
+
+    def complete(self, result: dict) -> str:
+        """Enregistre un job déjà terminé (ex: résultat servi par le cache)"""
+        now = time.time()
+        with self._lock:
+            job_id = uuid.uuid4().hex
+            self._jobs[job_id] = {
+                "job_id": job_id,
+                "status": "done",
+                "progress": {"frame": 0, "total_frames": 0, "percent": 100.0},
+                "created_at": now,
+                "started_at": now,
+                "finished_at": now,
+                "result": result,
+                "error": None,
+            }
+            self._prune()
+        return job_id
+
+    def get(self, job_id: str):
+        """Retourne l'état du job (sans le résultat) ou None"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            status = {k: v for k, v in job.items() if k != "result"}
+            status["progress"] = dict(job["progress"])
+            status["queue_position"] = self._queue_position(job_id)
+            return status
+
+    def result(self, job_id: str):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return None if job is None else dict(job)
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = {"queued": 0, "running": 0, "done": 0, "failed": 0}
+            for job in self._jobs.values():
+                counts[job["status"]] += 1
+            counts["max_workers"] = self.max_workers
+            counts["max_queued"] = self.max_queued
+            return counts
+
+    def _run(self, job_id, fn, args, kwargs, cleanup):
+        with self._lock:
+            job = self._jobs[job_id]
+            job["status"] = "running"
+            job["started_at"] = time.time()
+
+        def progress_callback(frame, total_frames, **details):
+            percent = round(100.0 * frame / total_frames, 1) if total_frames > 0 else 0.0
+            with self._lock:
+                job["progress"] = {
+                    **job["progress"],
+                    **details,
+                    "frame": frame,
+                    "total_frames": total_frames,
+                    "percent": min(percent, 100.0),
+                }
+
+        try:
+            result = fn(*args, progress_callback=progress_callback, **kwargs)
+            with self._lock:
+                job["result"] = result
+                if isinstance(result, dict) and result.get("success") is False:
+                    job["status"] = "failed"
+                    job["error"] = result.get("error")
+                else:
+                    job["status"] = "done"
+        except Exception as e:
+            traceback.print_exc()
+            with self._lock:
+                job["status"] = "failed"
+                job["error"] = str(e)
+        finally:
+            with self._lock:
+                job["finished_at"] = time.time()
+                self._pending -= 1
+            if cleanup is not None:
+                try:
+                    cleanup()
+                except Exception as e:
+                    print(f"Erreur nettoyage job {job_id}: {e}")
+
+    def _queue_position(self, job_id):
+        if self._jobs[job_id]["status"] != "queued":
+            return 0
+        position = 0
+        for other_id, job in self._jobs.items():
+            if job["status"] == "queued":
+                position += 1
+            if other_id == job_id:
+                return position
+        return 0
+
+    def _prune(self):
+        # Oublier les plus anciens jobs terminés pour borner la mémoire
+        finished = [k for k, j in self._jobs.items() if j["status"] in ("done", "failed")]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self._jobs[job_id]
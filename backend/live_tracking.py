@@ -0,0 +1,141 @@
+import asyncio
+import itertools
+import time
+
+import cv2
+import numpy as np
+import supervision as sv
+from fastapi.concurrency import run_in_threadpool
+
+# Sessions WebSocket actives, exposées par /api/live-tracking/stats
+sessions = {}
+_session_ids = itertools.count(1)
+
+
+class LiveTrackingSession:
+    """Suivi temps réel d'un flux de frames JPEG reçues par WebSocket.
+
+    Seule la frame la plus récente est conservée : si le client envoie plus
+    vite que l'inférence, les frames en attente sont remplacées (et comptées
+    comme perdues), ce qui borne la latence. L'inférence tourne hors de la
+    boucle d'événements; chaque connexion a son propre ByteTrack.
+    """
+
+    def __init__(self, detect_fn):
+        self.detect_fn = detect_fn
+        self.byte_track = sv.ByteTrack()
+        self.session_id = next(_session_ids)
+        self.connected_at = time.time()
+        self.received = 0
+        self.processed = 0
+        self.dropped = 0
+        self.last_latency_ms = 0.0
+        self.avg_latency_ms = 0.0
+        self.max_latency_ms = 0.0
+        self._pending = None
+        self._stats_requested = False
+        self._closed = False
+        self._ready = asyncio.Event()
+
+    async def run(self, websocket):
+        sessions[self.session_id] = self
+        receiver = asyncio.create_task(self._receive(websocket))
+        try:
+            await self._process(websocket)
+        finally:
+            receiver.cancel()
+            sessions.pop(self.session_id, None)
+
+    def stats(self) -> dict:
+        return {
+            "session_id": self.session_id,
+            "connected_s": round(time.time() - self.connected_at, 1),
+            "received": self.received,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "last_latency_ms": round(self.last_latency_ms, 1),
+            "avg_latency_ms": round(self.avg_latency_ms, 1),
+            "max_latency_ms": round(self.max_latency_ms, 1),
+        }
+
+    async def _receive(self, websocket):
+        try:
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+                if message.get("bytes") is not None:
+                    self.received += 1
+                    if self._pending is not None:
+                        # Frame précédente jamais traitée : on ne garde que la plus récente
+                        self.dropped += 1
+                    self._pending = (self.received, message["bytes"], time.perf_counter())
+                    self._ready.set()
+                elif message.get("text") == "stats":
+                    self._stats_requested = True
+                    self._ready.set()
+        finally:
+            self._closed = True
+            self._ready.set()
+
+    async def _process(self, websocket):
+        while True:
+            await self._ready.wait()
+            self._ready.clear()
+
+            if self._stats_requested:
+                self._stats_requested = False
+                await websocket.send_json({"type": "stats", **self.stats()})
+
+            if self._pending is None:
+                if self._closed:
+                    break
+                continue
+
+            frame_id, data, received_at = self._pending
+            self._pending = None
+
+            message = await run_in_threadpool(self._track, frame_id, data)
+            latency_ms = (time.perf_counter() - received_at) * 1000
+            self._record_latency(latency_ms)
+            message["latency_ms"] = round(latency_ms, 1)
+            message["dropped"] = self.dropped
+            await websocket.send_json(message)
+
+    def _track(self, frame_id: int, data: bytes) -> dict:
+        frame = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if frame is None:
+            return {"type": "error", "frame_id": frame_id, "error": "Frame JPEG invalide"}
+
+        detections = self.detect_fn(frame)
+        detections = self.byte_track.update_with_detections(detections)
+        self.processed += 1
+
+        # [x1, y1, x2, y2, confiance, classe, tracker_id] par boîte
+        boxes = np.zeros((len(detections), 7), dtype=np.float32)
+        if len(detections) > 0:
+            boxes[:, :4] = detections.xyxy
+            if detections.confidence is not None:
+                boxes[:, 4] = detections.confidence
+            if detections.class_id is not None:
+                boxes[:, 5] = detections.class_id
+            boxes[:, 6] = detections.tracker_id if detections.tracker_id is not None else -1
+
+        return {
+            "type": "detections",
+            "frame_id": frame_id,
+            "width": frame.shape[1],
+            "height": frame.shape[0],
+            "boxes": [
+                [round(v, 1) for v in row[:4]] + [round(row[4], 3), int(row[5]), int(row[6])]
+                for row in boxes.tolist()
+            ],
+        }
+
+    def _record_latency(self, latency_ms: float):
+        self.last_latency_ms = latency_ms
+        self.max_latency_ms = max(self.max_latency_ms, latency_ms)
+        if self.processed <= 1:
+            self.avg_latency_ms = latency_ms
+        else:
+            self.avg_latency_ms = 0.9 * self.avg_latency_ms + 0.1 * latency_ms
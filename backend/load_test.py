@@ -0,0 +1,74 @@
+"""Test de charge de /api/process-image avec des uploads concurrents.
+
+Usage (API lancée sur le port 8001):
+    python load_test.py --concurrency 16 --requests 200
+
+Comparer avec IMAGE_BATCHING=0 côté serveur pour mesurer le gain du
+regroupement en lots (requêtes/s et latences p50/p95/p99).
+
+Chaque requête envoie des octets uniques (suffixe après la fin du JPEG,
+ignoré au décodage) : le cache de résultats du serveur ne répond jamais à
+la place du modèle. ``--same-payload`` renvoie les images telles quelles
+pour mesurer les succès de cache; IMAGE_CACHE_MB=0 côté serveur désactive
+le cache.
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+from benchmark import SAMPLE_IMAGES
+
+
+def unique_payload(data: bytes, index: int) -> bytes:
+    """Octets différents à chaque requête, même image décodée (données après le marqueur de fin)"""
+    return data + b"load-test-%d" % index
+
+
+def send(url: str, name: str, data: bytes) -> tuple:
+    start = time.perf_counter()
+    response = requests.post(url, files={"file": (name, data, "image/jpeg")}, timeout=120)
+    ok = response.status_code == 200 and response.json().get("success", False)
+    return time.perf_counter() - start, ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Test de charge de /api/process-image")
+    parser.add_argument("--url", default="http://localhost:8001/api/process-image")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--same-payload", action="store_true",
+                        help="images identiques d'une requête à l'autre (servies par le cache)")
+    args = parser.parse_args()
+
+    images = []
+    for name in SAMPLE_IMAGES:
+        if os.path.exists(name):
+            with open(name, "rb") as f:
+                images.append((name, f.read()))
+
+    print(f"{args.requests} requêtes, {args.concurrency} en parallèle -> {args.url}")
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        futures = []
+        for i in range(args.requests):
+            name, data = images[i % len(images)]
+            if not args.same_payload:
+                data = unique_payload(data, i)
+            futures.append(pool.submit(send, args.url, name, data))
+        outcomes = [f.result() for f in futures]
+    elapsed = time.perf_counter() - start
+
+    latencies = np.array([latency for latency, _ in outcomes]) * 1000
+    errors = sum(not ok for _, ok in outcomes)
+    print(f"Requêtes/s : {len(outcomes) / elapsed:.1f}")
+    print(f"Erreurs    : {errors}")
+    print(f"Latence    : p50 {np.percentile(latencies, 50):.0f} ms, "
+          f"p95 {np.percentile(latencies, 95):.0f} ms, p99 {np.percentile(latencies, 99):.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Bornes des histogrammes de latence (secondes)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+FPS_BUCKETS = (1, 2, 5, 10, 15, 20, 30, 45, 60, 90, 120, 240)
+
+
+def _format_labels(names, values) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{str(v)}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(name, "") for name in self.labels)
+
+    def render(self) -> list:
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+    def _samples(self) -> list:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, help_text, labels=()):
+        super().__init__(name, help_text, labels)
+        self._values = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self):
+        with self._lock:
+            return [f"{self.name}{_format_labels(self.labels, k)} {v}" for k, v in self._values.items()]
+
+
+class Gauge(_Metric):
+    """Valeur instantanée; ``set_function`` l'évalue au moment de la collecte"""
+
+    kind = "gauge"
+
+    def __init__(self, name, help_text, labels=()):
+        super().__init__(name, help_text, labels)
+        self._values = {}
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def set_function(self, fn, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = fn
+
+    def _samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        samples = []
+        for key, value in items:
+            try:
+                value = value() if callable(value) else value
+            except Exception:
+                continue
+            samples.append(f"{self.name}{_format_labels(self.labels, key)} {value}")
+        return samples
+
+
+class Histogram(_Metric):
+    """Histogramme cumulatif : une recherche binaire et un verrou par observation"""
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        # Listes recevant les valeurs brutes d'un jeu de libellés (voir recording)
+        self._recorders = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+            for values in self._recorders.get(key, ()):
+                values.append(value)
+
+    @contextmanager
+    def recording(self, **labels):
+        """Valeurs brutes observées pendant le bloc (percentiles exacts du benchmark)"""
+        key = self._key(labels)
+        values = []
+        with self._lock:
+            self._recorders.setdefault(key, []).append(values)
+        try:
+            yield values
+        finally:
+            with self._lock:
+                recorders = self._recorders[key]
+                recorders.remove(values)
+                if not recorders:
+                    del self._recorders[key]
+
+    def snapshot(self) -> dict:
+        """Somme et nombre d'observations par jeu de libellés"""
+        with self._lock:
+            return {key: (series[1], series[2]) for key, series in self._series.items()}
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self):
+        with self._lock:
+            items = [(k, list(s[0]), s[1], s[2]) for k, s in self._series.items()]
+        samples = []
+        for key, counts, total, count in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labels + ("le",), key + (bound,))
+                samples.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labels, key)
+            samples.append(f"{self.name}_sum{labels} {total}")
+            samples.append(f"{self.name}_count{labels} {count}")
+        return samples
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name, help_text, labels=()) -> Counter:
+        return self._register(Counter(name, help_text, labels))
+
+    def gauge(self, name, help_text, labels=()) -> Gauge:
+        return self._register(Gauge(name, help_text, labels))
+
+    def histogram(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, labels, buckets))
+
+    def render(self) -> str:
+        """Exposition au format texte Prometheus"""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+
+metrics = MetricsRegistry()
+
+STAGE_LATENCY = metrics.histogram(
+    "inference_stage_seconds", "Durée de chaque étape des pipelines image et vidéo", ("pipeline", "stage")
+)
+MODEL_INFERENCE = metrics.histogram(
+    "model_inference_seconds", "Durée d'un appel au modèle (lot complet)", ("model",)
+)
+VIDEO_FPS = metrics.histogram(
+    "video_frames_per_second", "Débit moyen par traitement vidéo", ("pipeline",), buckets=FPS_BUCKETS
+)
+FRAMES_PROCESSED = metrics.counter(
+    "video_frames_processed_total", "Frames vidéo traitées", ("pipeline",)
+)
+QUEUE_DEPTH = metrics.gauge(
+    "queue_depth", "Éléments en attente dans les files internes", ("queue",)
+)
+
+
+@contextmanager
+def stage_timer(pipeline: str, stage: str):
+    """Mesure une étape d'un pipeline (coût : deux perf_counter et une observation)"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_LATENCY.observe(time.perf_counter() - start, pipeline=pipeline, stage=stage)
@@ -0,0 +1,99 @@
+import os
+import queue
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import Future
+
+from metrics import MODEL_INFERENCE
+from model_registry import MODEL_INSTANCES, registry
+
+# Taille maximale d'un lot et attente maximale avant de lancer l'inférence
+IMAGE_BATCH_MAX_SIZE = int(os.environ.get("IMAGE_BATCH_MAX_SIZE", "8"))
+IMAGE_BATCH_MAX_WAIT_MS = float(os.environ.get("IMAGE_BATCH_MAX_WAIT_MS", "5"))
+
+
+class MicroBatcher:
+    """Regroupe les images arrivées dans une courte fenêtre en une seule inférence.
+
+    ``infer`` est bloquant : il est appelé depuis le pool de threads de la
+    requête et retourne le résultat ultralytics de cette image seulement.
+    Un lot part dès qu'il est plein ou que la première image a attendu
+    ``max_wait_ms``; plusieurs workers permettent d'utiliser toutes les
+    instances du modèle.
+    """
+
+    def __init__(self, max_batch_size: int = IMAGE_BATCH_MAX_SIZE, max_wait_ms: float = IMAGE_BATCH_MAX_WAIT_MS,
+                 workers: int = MODEL_INSTANCES):
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait_s = max_wait_ms / 1000.0
+        self.workers = max(1, workers)
+        self.batches = 0
+        self.items = 0
+        self.batch_sizes = defaultdict(int)
+        self._queue = queue.Queue()
+        self._started = False
+        self._lock = threading.Lock()
+
+    def infer(self, image, model_name=None):
+        self._ensure_started()
+        future = Future()
+        self._queue.put((registry.resolve(model_name), image, future))
+        return future.result()
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "images": self.items,
+            "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "batch_sizes": dict(sorted(self.batch_sizes.items())),
+            "queued": self._queue.qsize(),
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_s * 1000,
+        }
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._started:
+                return
+            for i in range(self.workers):
+                threading.Thread(target=self._worker, name=f"image-batcher-{i}", daemon=True).start()
+            self._started = True
+
+    def _collect(self) -> list:
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait_s
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def _worker(self):
+        while True:
+            batch = self._collect()
+
+            by_model = defaultdict(list)
+            for model_name, image, future in batch:
+                by_model[model_name].append((image, future))
+
+            for model_name, items in by_model.items():
+                try:
+                    with registry.acquire(model_name) as model:
+                        with MODEL_INFERENCE.time(model=model_name):
+                            results = model([image for image, _ in items])
+                except Exception as e:
+                    for _, future in items:
+                        future.set_exception(e)
+                    continue
+
+                with self._lock:
+                    self.batches += 1
+                    self.items += len(items)
+                    self.batch_sizes[len(items)] += 1
+                for (_, future), result in zip(items, results):
+                    future.set_result(result)
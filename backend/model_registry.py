@@ -0,0 +1,298 @@
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import numpy as np
+
+# Modèles sélectionnables par nom dans les requêtes
+MODEL_WEIGHTS = {
+    "n": "yolov8n.pt",
+    "s": "yolov8s.pt",
+    "m": "yolov8m.pt",
+}
+
+DEFAULT_MODEL = os.environ.get("YOLO_MODEL", "n")
+
+# Moteur d'inférence : "torch" (PyTorch), "onnx" (onnxruntime), "openvino",
+# ou "int8" / "int8-dynamic" (onnxruntime quantifié, expérimental, voir quantization.py)
+MODEL_BACKENDS = ("torch", "onnx", "openvino", "int8", "int8-dynamic")
+DEFAULT_BACKEND = os.environ.get("MODEL_BACKEND", "torch")
+
+# Dossier où les modèles exportés sont mis en cache
+MODEL_CACHE_DIR = os.environ.get("MODEL_CACHE_DIR", "models")
+
+# Instances par modèle : autant d'inférences en parallèle
+MODEL_INSTANCES = int(os.environ.get("MODEL_INSTANCES", "1"))
+
+# Nombre de modèles différents gardés en mémoire (éviction LRU au-delà)
+MAX_LOADED_MODELS = int(os.environ.get("MAX_LOADED_MODELS", "2"))
+
+# Modèles chargés et échauffés au démarrage de l'API
+MODEL_WARMUP = [name for name in os.environ.get("MODEL_WARMUP", DEFAULT_MODEL).split(",") if name]
+
+
+# Un seul export à la fois dans ce processus (remplissage paresseux des pools)
+_export_lock = threading.Lock()
+
+
+def export_model(weights: str, backend: str) -> str:
+    """Exporte les poids PyTorch vers le backend demandé, une seule fois (cache disque)"""
+    from ultralytics import YOLO
+
+    stem = os.path.splitext(os.path.basename(weights))[0]
+    target = os.path.join(MODEL_CACHE_DIR, f"{stem}.onnx" if backend == "onnx" else f"{stem}_{backend}_model")
+    if os.path.exists(target):
+        return target
+
+    with _export_lock:
+        if os.path.exists(target):
+            return target
+        os.makedirs(MODEL_CACHE_DIR, exist_ok=True)
+        # Export dans un dossier privé puis renommage atomique : les processus de
+        # segments vidéo peuvent exporter le même modèle en même temps
+        work_dir = tempfile.mkdtemp(prefix=f".{stem}_{backend}_", dir=MODEL_CACHE_DIR)
+        try:
+            source = shutil.copy(weights, work_dir) if os.path.exists(weights) else weights
+            print(f"Export {weights} -> {backend}...")
+            # Axes dynamiques : les pipelines vidéo envoient des lots de frames
+            exported = YOLO(source).export(format=backend, imgsz=640, dynamic=True)
+            try:
+                os.replace(str(exported), target)
+            except OSError:
+                # Dossier (openvino) déjà publié par un autre processus : le sien est gardé
+                if not os.path.exists(target):
+                    raise
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    print(f"✓ Modèle exporté: {target}")
+    return target
+
+
+def load_model(weights: str, backend: str = "torch"):
+    from ultralytics import YOLO
+
+    try:
+        if backend == "torch":
+            model = YOLO(weights)
+        elif backend in ("int8", "int8-dynamic"):
+            from quantization import quantize_model
+            model = YOLO(quantize_model(weights, backend), task="detect")
+        else:
+            model = YOLO(export_model(weights, backend), task="detect")
+        print(f"✓ Modèle {weights} ({backend}) chargé")
+        return model
+    except Exception as e:
+        print(f"✗ Erreur chargement modèle: {e}")
+        raise
+
+
+class ModelPool:
+    """Instances d'un même modèle; chacune n'est utilisée que par un thread à la fois"""
+
+    def __init__(self, name: str, weights: str, backend: str, size: int, loader):
+        self.name = name
+        self.weights = weights
+        self.backend = backend
+        self.size = max(1, size)
+        self.loader = loader
+        self.names = None
+        self.loaded = 0
+        self.in_use = 0
+        self.warmed_up = False
+        self.load_time_s = 0.0
+        self.warmup_time_s = 0.0
+        self.last_used = time.time()
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._reserved = 0
+        # Levé dès que la première instance a fourni ses noms de classes
+        self._names_ready = threading.Event()
+
+    def _reserve_load(self) -> bool:
+        """Réserve le chargement d'une nouvelle instance si le pool n'est pas plein"""
+        with self._lock:
+            if self._reserved >= self.size:
+                return False
+            self._reserved += 1
+            return True
+
+    def _load_one(self):
+        start = time.perf_counter()
+        try:
+            model = self.loader(self.weights, self.backend)
+        except BaseException:
+            with self._lock:
+                self._reserved -= 1
+            raise
+        with self._lock:
+            self.loaded += 1
+            self.load_time_s += time.perf_counter() - start
+            if self.names is None:
+                self.names = model.names
+        self._names_ready.set()
+        return model
+
+    def ensure_loaded(self):
+        """Charge au moins une instance (pour les noms de classes)
+
+        Si un autre thread (échauffement, acquire) charge déjà une instance,
+        attend la fin de ce chargement; s'il échoue, le chargement est repris ici.
+        """
+        while not self._names_ready.is_set():
+            with self._lock:
+                reserve = self._reserved == 0
+                if reserve:
+                    self._reserved += 1
+            if reserve:
+                self._idle.put(self._load_one())
+            else:
+                self._names_ready.wait(0.1)
+
+    @contextmanager
+    def acquire(self):
+        with self._lock:
+            self.in_use += 1
+            self.last_used = time.time()
+        model = None
+        try:
+            try:
+                model = self._idle.get_nowait()
+            except queue.Empty:
+                # Chargement paresseux jusqu'à la taille du pool, sinon attendre une instance libre
+                model = self._load_one() if self._reserve_load() else self._idle.get()
+            yield model
+        finally:
+            with self._lock:
+                self.in_use -= 1
+            if model is not None:
+                self._idle.put(model)
+
+    def warmup(self):
+        """Charge toutes les instances et lance une inférence à vide sur chacune"""
+        start = time.perf_counter()
+        while self._reserve_load():
+            self._idle.put(self._load_one())
+
+        dummy = np.zeros((640, 640, 3), dtype=np.uint8)
+        instances = []
+        while len(instances) < self.size:
+            instances.append(self._idle.get())
+        try:
+            for model in instances:
+                model(dummy, verbose=False)
+        finally:
+            for model in instances:
+                self._idle.put(model)
+
+        self.warmup_time_s = time.perf_counter() - start
+        self.warmed_up = True
+        print(f"✓ Modèle {self.name} échauffé ({self.size} instance(s), {self.warmup_time_s:.2f}s)")
+
+    def status(self) -> dict:
+        return {
+            "weights": self.weights,
+            "backend": self.backend,
+            "instances": self.loaded,
+            "max_instances": self.size,
+            "in_use": self.in_use,
+            "warmed_up": self.warmed_up,
+            "load_time_s": round(self.load_time_s, 3),
+            "warmup_time_s": round(self.warmup_time_s, 3),
+        }
+
+
+class ModelRegistry:
+    """Registre des modèles : chargement paresseux, échauffement explicite, éviction LRU"""
+
+    def __init__(self, instances: int = MODEL_INSTANCES, max_loaded: int = MAX_LOADED_MODELS, loader=load_model):
+        self.instances = instances
+        self.max_loaded = max(1, max_loaded)
+        self.loader = loader
+        self.warmup_state = "pending"
+        self.warmup_error = None
+        self._pools = OrderedDict()
+        self._lock = threading.Lock()
+
+    def resolve(self, name=None) -> str:
+        """Nom canonique "modèle:backend" (ex: "n" -> "n:torch", "s:onnx")"""
+        name, _, backend = (name or DEFAULT_MODEL).partition(":")
+        backend = backend or DEFAULT_BACKEND
+        if name not in MODEL_WEIGHTS:
+            raise ValueError(f"Modèle inconnu: {name} (disponibles: {', '.join(MODEL_WEIGHTS)})")
+        if backend not in MODEL_BACKENDS:
+            raise ValueError(f"Backend inconnu: {backend} (disponibles: {', '.join(MODEL_BACKENDS)})")
+        return f"{name}:{backend}"
+
+    def pool(self, name=None) -> ModelPool:
+        name = self.resolve(name)
+        with self._lock:
+            pool = self._pools.get(name)
+            if pool is None:
+                model_name, backend = name.split(":")
+                pool = ModelPool(name, MODEL_WEIGHTS[model_name], backend, self.instances, self.loader)
+                self._pools[name] = pool
+            self._pools.move_to_end(name)
+            self._evict()
+        return pool
+
+    @contextmanager
+    def acquire(self, name=None):
+        """Réserve une instance du modèle le temps d'une inférence"""
+        with self.pool(name).acquire() as model:
+            yield model
+
+    def class_names(self, name=None) -> dict:
+        pool = self.pool(name)
+        pool.ensure_loaded()
+        return pool.names
+
+    def warmup(self, names=None, instances=None):
+        """Charge et échauffe les modèles ``names`` (défaut MODEL_WARMUP)
+
+        ``instances`` remplace la taille des pools fixée à la construction
+        (processus de traitement vidéo : une seule instance par modèle).
+        """
+        if instances is not None:
+            with self._lock:
+                self.instances = instances
+                for pool in self._pools.values():
+                    pool.size = max(1, instances, pool.loaded)
+        self.warmup_state = "running"
+        try:
+            for name in names or MODEL_WARMUP:
+                self.pool(name).warmup()
+            self.warmup_state = "done"
+        except Exception as e:
+            self.warmup_state = "failed"
+            self.warmup_error = str(e)
+            print(f"✗ Erreur échauffement modèle: {e}")
+
+    def status(self) -> dict:
+        with self._lock:
+            pools = {name: pool.status() for name, pool in self._pools.items()}
+        return {
+            "model_loaded": any(p["instances"] > 0 for p in pools.values()),
+            "warmup": self.warmup_state,
+            "warmup_error": self.warmup_error,
+            "default_model": self.resolve(),
+            "models": pools,
+        }
+
+    def _evict(self):
+        # Les pools les moins récemment utilisés partent en premier, sauf s'ils servent encore
+        while len(self._pools) > self.max_loaded:
+            for name, pool in list(self._pools.items())[:-1]:
+                if pool.in_use == 0:
+                    del self._pools[name]
+                    print(f"Modèle {name} déchargé (LRU)")
+                    break
+            else:
+                break
+
+
+registry = ModelRegistry()
@@ -0,0 +1,119 @@
+import glob
+import os
+import threading
+
+import cv2
+import numpy as np
+
+# Backends INT8 (onnxruntime) : "int8" calibré sur des images locales, "int8-dynamic" sans calibration.
+# Expérimentaux : l'accord avec FP32 (compare_backends.py) n'a pas encore été mesuré sur les vrais
+# poids, ils restent hors de MODEL_WARMUP par défaut et ne servent que sur demande explicite.
+QUANTIZED_BACKENDS = ("int8", "int8-dynamic")
+
+# Images de calibration de la quantification statique (motifs glob séparés par des virgules)
+QUANT_CALIBRATION_IMAGES = os.environ.get("QUANT_CALIBRATION_IMAGES", "real_vehicle_*.jpg")
+QUANT_IMAGE_SIZE = 640
+
+# Une seule conversion à la fois : plusieurs instances peuvent se charger en parallèle
+_quantize_lock = threading.Lock()
+
+
+def letterbox(image: np.ndarray, size: int = QUANT_IMAGE_SIZE) -> np.ndarray:
+    """BGR -> entrée du modèle ONNX (1, 3, size, size) float32, comme le prétraitement ultralytics"""
+    height, width = image.shape[:2]
+    ratio = size / max(height, width)
+    resized = cv2.resize(image, (round(width * ratio), round(height * ratio)), interpolation=cv2.INTER_LINEAR)
+    canvas = np.full((size, size, 3), 114, dtype=np.uint8)
+    top = (size - resized.shape[0]) // 2
+    left = (size - resized.shape[1]) // 2
+    canvas[top:top + resized.shape[0], left:left + resized.shape[1]] = resized
+    blob = cv2.cvtColor(canvas, cv2.COLOR_BGR2RGB).transpose(2, 0, 1)[None]
+    return np.ascontiguousarray(blob, dtype=np.float32) / 255.0
+
+
+def calibration_images(patterns: str = QUANT_CALIBRATION_IMAGES) -> list:
+    paths = sorted({path for pattern in patterns.split(",") if pattern for path in glob.glob(pattern.strip())})
+    if not paths:
+        raise RuntimeError(f"Aucune image de calibration ({patterns})")
+    return paths
+
+
+class CalibrationReader:
+    """Fournit les images de calibration à onnxruntime.quantization.quantize_static"""
+
+    def __init__(self, input_name: str, paths: list):
+        self.input_name = input_name
+        self._paths = iter(paths)
+
+    def get_next(self):
+        for path in self._paths:
+            image = cv2.imread(path, cv2.IMREAD_COLOR)
+            if image is not None:
+                return {self.input_name: letterbox(image)}
+        return None
+
+
+def _head_nodes(model) -> list:
+    """Nœuds non convolutifs de la tête de détection (dernier bloc "/model.N/")
+
+    La tête concatène boîtes (en pixels) et scores (0..1) : quantifiés
+    ensemble, les scores perdent toute précision. Ils restent en FP32.
+    """
+    prefixes = [node.name.split("/")[1] for node in model.graph.node if node.name.startswith("/model.")]
+    if not prefixes:
+        return []
+    head = max(prefixes, key=lambda p: int(p.split(".")[1]) if p.split(".")[1].isdigit() else -1)
+    return [node.name for node in model.graph.node
+            if node.name.startswith(f"/{head}/") and node.op_type != "Conv"]
+
+
+def quantize_model(weights: str, backend: str) -> str:
+    """Convertit le modèle ONNX exporté en INT8, une seule fois (cache disque)"""
+    from model_registry import MODEL_CACHE_DIR, export_model
+
+    stem = os.path.splitext(os.path.basename(weights))[0]
+    target = os.path.join(MODEL_CACHE_DIR, f"{stem}_{backend.replace('-', '_')}.onnx")
+    if os.path.exists(target):
+        return target
+
+    try:
+        import onnx
+        from onnxruntime.quantization import (CalibrationMethod, QuantFormat, QuantType, quantize_dynamic,
+                                              quantize_static)
+    except ImportError:
+        raise RuntimeError("La quantification INT8 nécessite onnx et onnxruntime (pip install onnx onnxruntime)")
+
+    with _quantize_lock:
+        if os.path.exists(target):
+            return target
+        source = export_model(weights, "onnx")
+        model = onnx.load(source)
+        temp_target = target + ".tmp"
+
+        print(f"Quantification {source} -> {backend}...")
+        if backend == "int8-dynamic":
+            # Poids INT8, activations quantifiées à la volée
+            quantize_dynamic(source, temp_target, weight_type=QuantType.QInt8,
+                             nodes_to_exclude=_head_nodes(model))
+        else:
+            paths = calibration_images()
+            print(f"Calibration sur {len(paths)} image(s)")
+            quantize_static(
+                source, temp_target,
+                CalibrationReader(model.graph.input[0].name, paths),
+                quant_format=QuantFormat.QDQ,
+                activation_type=QuantType.QUInt8,
+                weight_type=QuantType.QInt8,
+                per_channel=True,
+                calibrate_method=CalibrationMethod.MinMax,
+                nodes_to_exclude=_head_nodes(model),
+            )
+
+        # Métadonnées ultralytics (noms de classes, stride, imgsz) reprises du modèle FP32
+        quantized = onnx.load(temp_target)
+        del quantized.metadata_props[:]
+        quantized.metadata_props.extend(model.metadata_props)
+        onnx.save(quantized, target)
+        os.remove(temp_target)
+        print(f"✓ Modèle quantifié: {target}")
+    return target
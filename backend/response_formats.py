@@ -0,0 +1,47 @@
+import io
+
+import numpy as np
+
+# Formats de réponse de /api/process-image
+#   json    : réponse historique (détections + image annotée en base64)
+#   compact : détections seules, une ligne [x1, y1, x2, y2, conf, classe] par boîte
+#   npy     : tableau NumPy structuré (application/octet-stream), sans image
+#   jpeg    : image annotée brute (image/jpeg), sans JSON
+RESPONSE_FORMATS = ("json", "compact", "npy", "jpeg")
+
+DETECTION_DTYPE = np.dtype([
+    ("xyxy", "<f4", (4,)),
+    ("confidence", "<f4"),
+    ("class_id", "<i2"),
+])
+
+
+def detections_array(detections: list) -> np.ndarray:
+    """Convertit les détections de process_image en tableau structuré"""
+    packed = np.zeros(len(detections), dtype=DETECTION_DTYPE)
+    for i, detection in enumerate(detections):
+        packed[i] = (detection["bbox"], detection["confidence"], detection["class_id"])
+    return packed
+
+
+def to_npy_array_bytes(array: np.ndarray) -> bytes:
+    """Sérialise un tableau structuré au format .npy"""
+    buffer = io.BytesIO()
+    np.save(buffer, array, allow_pickle=False)
+    return buffer.getvalue()
+
+
+def to_npy_bytes(detections: list) -> bytes:
+    """Sérialise les détections au format .npy (lisible avec np.load)"""
+    return to_npy_array_bytes(detections_array(detections))
+
+
+def to_compact(detections: list) -> dict:
+    """Détections en lignes numériques + table des noms de classes présentes"""
+    return {
+        "boxes": [
+            [round(v, 1) for v in d["bbox"]] + [round(d["confidence"], 3), d["class_id"]]
+            for d in detections
+        ],
+        "class_names": {d["class_id"]: d["class_name"] for d in detections},
+    }
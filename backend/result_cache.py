@@ -0,0 +1,145 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Budget mémoire des résultats image et disque des vidéos rendues
+IMAGE_CACHE_BYTES = int(os.environ.get("IMAGE_CACHE_MB", "64")) * 1024 * 1024
+VIDEO_CACHE_BYTES = int(os.environ.get("VIDEO_CACHE_MB", "2048")) * 1024 * 1024
+CACHE_DIR = os.environ.get("RESULT_CACHE_DIR", "cache")
+
+
+def cache_key(content_hash: str, model_name: str, params: dict = None) -> str:
+    """Clé de cache : contenu uploadé + modèle + paramètres du traitement"""
+    payload = json.dumps({"content": content_hash, "model": model_name, "params": params or {}}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _result_size(result: dict) -> int:
+    # Les images JPEG brutes (octets) sont comptées à leur taille réelle
+    raw = sum(len(v) for v in result.values() if isinstance(v, bytes))
+    return raw + len(json.dumps({k: v for k, v in result.items() if not isinstance(v, bytes)}, default=str))
+
+
+class ImageResultCache:
+    """LRU en mémoire des résultats de process_image, borné en octets"""
+
+    def __init__(self, max_bytes: int = IMAGE_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: str, result: dict):
+        size = _result_size(result)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self.size -= self._entries.pop(key)[1]
+            self._entries[key] = (result, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.size -= evicted_size
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries),
+                    "bytes": self.size, "max_bytes": self.max_bytes}
+
+
+class VideoResultCache:
+    """Index sur disque des vidéos rendues dans static/, évincé par taille totale.
+
+    L'index (clé -> résultat + fichier vidéo) est persistant : un upload
+    identique après redémarrage est servi sans recalcul. L'éviction supprime
+    la vidéo la moins récemment utilisée.
+    """
+
+    def __init__(self, static_dir: str = "static", max_bytes: int = VIDEO_CACHE_BYTES, cache_dir: str = CACHE_DIR):
+        self.static_dir = static_dir
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(cache_dir, "video_index.json")
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = self._load()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or not os.path.exists(self._video_path(entry)):
+                if entry is not None:
+                    # Vidéo supprimée hors du cache : oublier l'entrée
+                    del self._entries[key]
+                    self._save()
+                self.misses += 1
+                return None
+            # last_access n'est persisté qu'à la prochaine écriture de l'index
+            entry["last_access"] = time.time()
+            self.hits += 1
+            return entry["result"]
+
+    def put(self, key: str, result: dict):
+        video_path = os.path.join(self.static_dir, result.get("processed_video") or "")
+        if not os.path.isfile(video_path):
+            return
+        with self._lock:
+            self._entries[key] = {
+                "result": result,
+                "size": os.path.getsize(video_path),
+                "last_access": time.time(),
+            }
+            self._evict()
+            self._save()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries),
+                    "bytes": sum(e["size"] for e in self._entries.values()), "max_bytes": self.max_bytes}
+
+    def _video_path(self, entry: dict) -> str:
+        return os.path.join(self.static_dir, entry["result"]["processed_video"])
+
+    def _evict(self):
+        total = sum(e["size"] for e in self._entries.values())
+        for key in sorted(self._entries, key=lambda k: self._entries[k]["last_access"]):
+            if total <= self.max_bytes:
+                break
+            entry = self._entries.pop(key)
+            total -= entry["size"]
+            video_path = self._video_path(entry)
+            stem = os.path.splitext(video_path)[0]
+            for path in (video_path, stem + "_preview.jpg", stem + "_tracks.npy", stem + "_tracks.json"):
+                if os.path.exists(path):
+                    os.remove(path)
+            print(f"Cache vidéo: {entry['result']['processed_video']} évincée")
+
+    def _load(self) -> dict:
+        try:
+            with open(self.index_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+        temp_path = self.index_path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump(self._entries, f)
+        os.replace(temp_path, self.index_path)
@@ -0,0 +1,157 @@
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from video_encoding import is_being_written
+
+# Durée de conservation et quota disque des sorties dans static/ (0 = sans limite)
+OUTPUT_MAX_AGE_S = float(os.environ.get("OUTPUT_MAX_AGE_HOURS", "24")) * 3600
+OUTPUT_MAX_BYTES = int(os.environ.get("OUTPUT_MAX_DISK_MB", "10240")) * 1024 * 1024
+OUTPUT_RETENTION_INTERVAL_S = float(os.environ.get("OUTPUT_RETENTION_INTERVAL_S", "300"))
+
+# Fichiers associés à une même sortie (vidéo, aperçu, journal des tracks)
+_SUFFIXES = ("_tracks.json", "_tracks.npy", "_tracks.npy.raw", "_preview.jpg", ".mp4")
+
+# Sorties des jobs en cours (run_id, ou préfixe des segments d'un job découpé)
+_active_runs = set()
+_active_lock = threading.Lock()
+
+
+@contextmanager
+def active_output(run_id: str):
+    """Protège de la rétention toutes les sorties de ``run_id`` (et ``run_id_*``) jusqu'à la sortie du bloc"""
+    with _active_lock:
+        _active_runs.add(run_id)
+    try:
+        yield
+    finally:
+        with _active_lock:
+            _active_runs.discard(run_id)
+
+
+def is_active(stem: str) -> bool:
+    with _active_lock:
+        return any(stem == run_id or stem.startswith(run_id + "_") for run_id in _active_runs)
+
+
+def output_stem(filename: str) -> str:
+    for suffix in _SUFFIXES:
+        if filename.endswith(suffix):
+            return filename[:-len(suffix)]
+    return filename
+
+
+class OutputRetention:
+    """Supprime les sorties de static/ trop anciennes, puis les moins récemment
+    utilisées tant que le quota disque est dépassé.
+
+    Une sortie (vidéo + aperçu + journal) est supprimée d'un bloc. Les
+    sorties d'un job en cours (``active_output``), les fichiers en cours
+    d'écriture ou modifiés depuis moins de ``min_idle_s`` ne sont jamais
+    touchés.
+    """
+
+    def __init__(self, static_dir: str = "static", max_age_s: float = OUTPUT_MAX_AGE_S,
+                 max_bytes: int = OUTPUT_MAX_BYTES, min_idle_s: float = 60.0):
+        self.static_dir = static_dir
+        self.max_age_s = max_age_s
+        self.max_bytes = max_bytes
+        self.min_idle_s = min_idle_s
+        self.removed = 0
+        self.freed_bytes = 0
+        self.last_sweep = None
+        self._accessed = {}
+        self._lock = threading.Lock()
+
+    def touch(self, filename: str):
+        """Note un accès (téléchargement, requête sur le journal)"""
+        with self._lock:
+            self._accessed[output_stem(os.path.basename(filename))] = time.time()
+
+    def sweep(self) -> dict:
+        now = time.time()
+        groups = self._scan()
+        total = sum(g["bytes"] for g in groups.values())
+
+        removable = {
+            stem: group for stem, group in groups.items()
+            if now - group["modified"] >= self.min_idle_s
+            and not is_active(stem)
+            and not is_being_written(os.path.join(self.static_dir, stem + ".mp4"))
+        }
+        with self._lock:
+            last_used = {stem: max(group["modified"], self._accessed.get(stem, 0.0))
+                         for stem, group in removable.items()}
+
+        expired = [stem for stem in removable if self.max_age_s and now - last_used[stem] > self.max_age_s]
+        removed, freed = 0, 0
+        for stem in expired:
+            freed += self._remove(removable.pop(stem))
+            removed += 1
+        total -= freed
+
+        if self.max_bytes:
+            for stem in sorted(removable, key=last_used.get):
+                if total <= self.max_bytes:
+                    break
+                size = self._remove(removable[stem])
+                total -= size
+                freed += size
+                removed += 1
+
+        with self._lock:
+            for stem in list(self._accessed):
+                if stem not in groups:
+                    del self._accessed[stem]
+            self.removed += removed
+            self.freed_bytes += freed
+            self.last_sweep = {"at": now, "removed": removed, "freed_bytes": freed, "bytes": total}
+        if removed:
+            print(f"Rétention: {removed} sortie(s) supprimée(s), {freed // (1024 * 1024)} Mo libérés")
+        return self.last_sweep
+
+    def stats(self) -> dict:
+        groups = self._scan()
+        with self._lock:
+            return {
+                "outputs": len(groups),
+                "bytes": sum(g["bytes"] for g in groups.values()),
+                "max_bytes": self.max_bytes,
+                "max_age_s": self.max_age_s,
+                "removed": self.removed,
+                "freed_bytes": self.freed_bytes,
+                "last_sweep": self.last_sweep,
+            }
+
+    def _scan(self) -> dict:
+        groups = defaultdict(lambda: {"paths": [], "bytes": 0, "modified": 0.0})
+        try:
+            entries = list(os.scandir(self.static_dir))
+        except FileNotFoundError:
+            return {}
+        for entry in entries:
+            if not entry.is_file():
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            group = groups[output_stem(entry.name)]
+            group["paths"].append(entry.path)
+            group["bytes"] += stat.st_size
+            group["modified"] = max(group["modified"], stat.st_mtime)
+        return dict(groups)
+
+    @staticmethod
+    def _remove(group: dict) -> int:
+        freed = 0
+        for path in group["paths"]:
+            try:
+                size = os.path.getsize(path)
+                os.remove(path)
+                freed += size
+            except FileNotFoundError:
+                pass
+        return freed
@@ -0,0 +1,82 @@
+import os
+
+import numpy as np
+import supervision as sv
+
+from counting import _anchors, points_in_polygon
+
+# Classes COCO des véhicules (raccourci "vehicles" dans l'allowlist)
+VEHICLE_CLASSES = ("car", "motorcycle", "bus", "truck")
+
+# Allowlist par défaut des traitements vidéo (vide = toutes les classes)
+VIDEO_CLASSES = os.environ.get("VIDEO_CLASSES", "")
+
+
+def parse_classes(value) -> list:
+    """"car,truck" / "2,7" / ["car", 7] -> liste de noms ou d'identifiants"""
+    if value is None:
+        value = VIDEO_CLASSES
+    if isinstance(value, str):
+        value = [v.strip() for v in value.split(",") if v.strip()]
+    return [int(v) if isinstance(v, str) and v.isdigit() else v for v in value]
+
+
+def resolve_class_ids(classes, class_names: dict):
+    """Identifiants de classes du modèle pour ``classes`` (None = pas de filtre)"""
+    classes = parse_classes(classes)
+    if not classes:
+        return None
+
+    ids_by_name = {name: class_id for class_id, name in class_names.items()}
+    class_ids = set()
+    for value in classes:
+        if value == "vehicles":
+            class_ids.update(ids_by_name[name] for name in VEHICLE_CLASSES if name in ids_by_name)
+        elif isinstance(value, int):
+            if value not in class_names:
+                raise ValueError(f"Classe inconnue: {value}")
+            class_ids.add(value)
+        elif value in ids_by_name:
+            class_ids.add(ids_by_name[value])
+        else:
+            raise ValueError(f"Classe inconnue: {value}")
+    return sorted(class_ids)
+
+
+class RegionOfInterest:
+    """Polygone de la zone utile : l'inférence ne voit que son rectangle englobant.
+
+    ``crop`` retourne la vue du rectangle dans la frame, ``to_frame`` ramène
+    les boîtes en coordonnées frame et ne garde que celles dont le point
+    bas-centre est dans le polygone.
+    """
+
+    def __init__(self, polygon, frame_size: tuple):
+        self.polygon = np.asarray(polygon, dtype=np.float32).reshape(-1, 2)
+        if len(self.polygon) < 3:
+            raise ValueError("La ROI doit avoir au moins 3 points")
+
+        width, height = frame_size
+        x0, y0 = (int(v) for v in np.floor(self.polygon.min(axis=0)))
+        x1, y1 = (int(v) for v in np.ceil(self.polygon.max(axis=0)))
+        self.x0, self.y0 = max(0, x0), max(0, y0)
+        self.x1, self.y1 = min(width, x1), min(height, y1)
+        if self.x1 - self.x0 < 2 or self.y1 - self.y0 < 2:
+            raise ValueError("La ROI est en dehors de l'image")
+
+    @property
+    def offset(self) -> np.ndarray:
+        return np.array([self.x0, self.y0, self.x0, self.y0], dtype=np.float32)
+
+    def crop(self, frame: np.ndarray) -> np.ndarray:
+        # Vue sans copie : l'inférence redimensionne de toute façon
+        return frame[self.y0:self.y1, self.x0:self.x1]
+
+    def to_frame(self, detections: sv.Detections) -> sv.Detections:
+        if len(detections) == 0:
+            return detections
+        detections.xyxy = detections.xyxy + self.offset
+        return detections[points_in_polygon(_anchors(detections), self.polygon)]
+
+    def as_dict(self) -> dict:
+        return {"polygon": self.polygon.tolist(), "crop": [self.x0, self.y0, self.x1, self.y1]}
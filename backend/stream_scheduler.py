@@ -0,0 +1,417 @@
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from urllib.parse import urlparse
+
+import cv2
+import numpy as np
+import supervision as sv
+
+from counting import LineCounter, UniqueVehicleCounter, ZoneCounter
+from frame_pool import FramePool
+from metrics import FRAMES_PROCESSED, MODEL_INFERENCE, STAGE_LATENCY, stage_timer
+from model_registry import MODEL_INSTANCES, registry
+from roi import resolve_class_ids
+
+# Nombre maximal de frames (toutes sources confondues) par inférence
+STREAM_BATCH_MAX_SIZE = int(os.environ.get("STREAM_BATCH_MAX_SIZE", "8"))
+STREAM_MAX_SOURCES = int(os.environ.get("STREAM_MAX_SOURCES", "16"))
+# Fichiers locaux acceptés comme source (sous ce dossier uniquement)
+STREAM_FILE_ROOT = os.environ.get("STREAM_FILE_ROOT", ".")
+STREAM_RECONNECT_ATTEMPTS = int(os.environ.get("STREAM_RECONNECT_ATTEMPTS", "5"))
+
+LIVE_SCHEMES = ("rtsp", "rtsps", "rtmp", "http", "https", "udp", "tcp")
+
+_stream_ids = itertools.count(1)
+
+
+def resolve_source(source: str, file_root: str = STREAM_FILE_ROOT) -> tuple:
+    """URL de flux ou fichier local sous ``file_root`` -> (chemin, est_direct)"""
+    if urlparse(source).scheme in LIVE_SCHEMES:
+        return source, True
+    root = os.path.realpath(file_root)
+    path = os.path.realpath(os.path.join(root, source))
+    if os.path.commonpath([root, path]) != root or not os.path.isfile(path):
+        raise ValueError(f"Source introuvable: {source}")
+    return path, False
+
+
+def jain_index(values: list) -> float:
+    """Indice d'équité de Jain : 1.0 = partage parfait, 1/n = une seule source servie"""
+    values = [v for v in values if v is not None]
+    if not values or not any(values):
+        return 1.0
+    return round(sum(values) ** 2 / (len(values) * sum(v * v for v in values)), 4)
+
+
+class StreamSource:
+    """Une caméra (ou un fichier rejoué) suivie par le planificateur.
+
+    Un thread lit les frames et n'en garde qu'une en attente : une source
+    en direct (ou rejouée en ``realtime``) remplace la frame non servie et
+    la compte comme perdue; un fichier lu au plus vite attend qu'elle soit
+    prise. Le tracker et les compteurs sont propres à la source.
+    """
+
+    def __init__(self, source: str, class_names: dict, name: str = None, line=None, zone=None,
+                 class_ids=None, realtime: bool = True, loop: bool = False, file_root: str = STREAM_FILE_ROOT):
+        self.path, self.live = resolve_source(source, file_root)
+        self.stream_id = next(_stream_ids)
+        self.name = name or os.path.basename(source) or source
+        self.class_names = class_names
+        self.class_ids = class_ids
+        self.realtime = realtime or self.live
+        self.loop = loop and not self.live
+
+        self.byte_track = sv.ByteTrack()
+        self.unique_counter = UniqueVehicleCounter(class_names)
+        self.line_counter = LineCounter(line, class_names) if line else None
+        self.zone_counter = ZoneCounter(zone, class_names) if zone else None
+
+        self.state = "starting"
+        self.error = None
+        self.in_flight = False
+        self.started_at = time.time()
+        self.received = 0
+        self.processed = 0
+        self.dropped = 0
+        self.last_boxes = 0
+        self.avg_latency_ms = 0.0
+        self.max_latency_ms = 0.0
+        self._pending = None
+        # Au plus trois frames vivantes : en lecture, en attente, en inférence
+        self.pool = FramePool(max_free=3)
+        self._cond = threading.Condition()
+        self._stopped = threading.Event()
+        self._on_frame = None
+        self._thread = None
+
+    def start(self, on_frame):
+        self._on_frame = on_frame
+        self._thread = threading.Thread(target=self._read_loop, name=f"stream-{self.stream_id}", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = None):
+        self._stopped.set()
+        if self.state in ("starting", "running"):
+            self.state = "stopped"
+        with self._cond:
+            self._cond.notify_all()
+        if timeout is not None and self._thread is not None:
+            # Libère la capture avant de rendre la main (arrêt du serveur)
+            self._thread.join(timeout)
+
+    def take(self):
+        """Frame en attente (index, frame, horodatage) ou None"""
+        with self._cond:
+            item, self._pending = self._pending, None
+            if item is not None:
+                self._cond.notify_all()
+            return item
+
+    def has_pending(self) -> bool:
+        return self._pending is not None
+
+    def consume(self, detections: sv.Detections, captured_at: float):
+        """Tracking et comptage d'une frame, dans l'ordre de lecture
+
+        Les compteurs avancent au rythme du tracker (frames servies) : les
+        frames perdues ne raccourcissent pas leur expiration par rapport à
+        celle des tracks perdus de ByteTrack.
+        """
+        if self.class_ids is not None and len(detections) > 0:
+            # Allowlist par source : le lot partagé est inféré sans filtre
+            detections = detections[np.isin(detections.class_id, self.class_ids)]
+        detections = self.byte_track.update_with_detections(detections)
+        for counter in (self.unique_counter, self.line_counter, self.zone_counter):
+            if counter is not None:
+                counter.update(self.processed + 1, detections)
+
+        latency_ms = (time.perf_counter() - captured_at) * 1000
+        self.max_latency_ms = max(self.max_latency_ms, latency_ms)
+        self.avg_latency_ms = latency_ms if self.processed == 0 else 0.9 * self.avg_latency_ms + 0.1 * latency_ms
+        self.processed += 1
+        self.last_boxes = len(detections)
+
+    def stats(self) -> dict:
+        elapsed = max(time.time() - self.started_at, 1e-9)
+        return {
+            "stream_id": self.stream_id,
+            "name": self.name,
+            "live": self.live,
+            "state": self.state,
+            "error": self.error,
+            "received": self.received,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "fps": round(self.processed / elapsed, 2),
+            "served_ratio": round(self.processed / self.received, 4) if self.received else None,
+            "avg_latency_ms": round(self.avg_latency_ms, 1),
+            "max_latency_ms": round(self.max_latency_ms, 1),
+            "last_boxes": self.last_boxes,
+            "frame_pool": self.pool.stats(),
+            "final_counts": dict(self.unique_counter.counts),
+            "total_vehicles": self.unique_counter.total,
+            **({"line_counts": self.line_counter.as_dict()} if self.line_counter is not None else {}),
+            **({"zone_counts": self.zone_counter.as_dict()} if self.zone_counter is not None else {}),
+        }
+
+    def _open(self):
+        cap = cv2.VideoCapture(self.path)
+        if not cap.isOpened():
+            raise RuntimeError(f"Impossible d'ouvrir la source {self.name}")
+        return cap
+
+    def _read_loop(self):
+        attempts = 0
+        cap = None
+        try:
+            cap = self._open()
+            fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+            interval = 1.0 / fps
+            next_at = time.perf_counter()
+            self.state = "running"
+            while not self._stopped.is_set():
+                ret, frame = self.pool.read(cap)
+                if not ret:
+                    if self.loop:
+                        cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                        continue
+                    if self.live and attempts < STREAM_RECONNECT_ATTEMPTS:
+                        # Coupure réseau : reconnexion avec attente croissante
+                        attempts += 1
+                        cap.release()
+                        time.sleep(min(2 ** attempts, 30))
+                        cap = self._open()
+                        continue
+                    break
+                attempts = 0
+
+                if self.realtime and not self.live:
+                    # Fichier rejoué au rythme d'une caméra
+                    next_at += interval
+                    delay = next_at - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                    else:
+                        next_at = time.perf_counter()
+
+                self.received += 1
+                item = (self.received, frame, time.perf_counter())
+                with self._cond:
+                    if not self.realtime:
+                        while self._pending is not None and not self._stopped.is_set():
+                            self._cond.wait(0.1)
+                    elif self._pending is not None:
+                        # Frame jamais servie : seule la plus récente compte
+                        self.dropped += 1
+                        self.pool.release(self._pending[1])
+                    self._pending = item
+                self._on_frame()
+            if not self._stopped.is_set():
+                self.state = "ended"
+        except Exception as e:
+            self.state = "failed"
+            self.error = str(e)
+            print(f"Erreur source {self.name}: {e}")
+        finally:
+            if cap is not None:
+                cap.release()
+
+
+class StreamScheduler:
+    """Partage un modèle entre plusieurs flux vidéo et les requêtes image.
+
+    Chaque lot commence par les images de la voie prioritaire (``infer``,
+    même interface que MicroBatcher), puis est complété en tourniquet par la
+    frame la plus récente de chaque source. Une source n'a jamais deux frames
+    en vol, ce qui garde son tracker dans l'ordre; une place reste réservée
+    aux flux pour que les images ne les affament pas.
+    """
+
+    def __init__(self, model_name=None, max_batch_size: int = STREAM_BATCH_MAX_SIZE,
+                 max_sources: int = STREAM_MAX_SOURCES, workers: int = MODEL_INSTANCES,
+                 file_root: str = STREAM_FILE_ROOT):
+        self.model_name = registry.resolve(model_name)
+        self.file_root = file_root
+        self.max_batch_size = max(2, max_batch_size)
+        self.max_sources = max_sources
+        self.workers = max(1, workers)
+        self.sources = {}
+        self.batches = 0
+        self.stream_frames = 0
+        self.images = 0
+        self.image_wait_ms = 0.0
+        self.started_at = None
+        self._priority = deque()
+        self._cursor = 0
+        self._cond = threading.Condition()
+        self._started = False
+        self._closed = False
+
+    @property
+    def active(self) -> bool:
+        return any(s.state in ("starting", "running") for s in self.sources.values())
+
+    def serves(self, model_name) -> bool:
+        return self.active and registry.resolve(model_name) == self.model_name
+
+    def add_source(self, source: str, **options) -> StreamSource:
+        with self._cond:
+            if sum(s.state in ("starting", "running") for s in self.sources.values()) >= self.max_sources:
+                raise RuntimeError(f"Nombre maximal de flux atteint ({self.max_sources})")
+        class_names = registry.class_names(self.model_name)
+        class_ids = resolve_class_ids(options.pop("classes", None), class_names)
+        stream = StreamSource(source, class_names, class_ids=class_ids, file_root=self.file_root, **options)
+        with self._cond:
+            self.sources[stream.stream_id] = stream
+        self._ensure_started()
+        stream.start(self._wake)
+        return stream
+
+    def remove_source(self, stream_id: int):
+        with self._cond:
+            stream = self.sources.pop(stream_id, None)
+        if stream is not None:
+            stream.stop()
+        return stream
+
+    def close(self, timeout: float = 5.0):
+        """Arrête toutes les sources et les workers"""
+        with self._cond:
+            self._closed = True
+            sources, self.sources = list(self.sources.values()), {}
+            self._cond.notify_all()
+        for stream in sources:
+            stream.stop(timeout)
+
+    def infer(self, image, model_name=None):
+        """Voie prioritaire : résultat ultralytics de cette image seule"""
+        self._ensure_started()
+        future = Future()
+        with self._cond:
+            self._priority.append((image, future, time.perf_counter()))
+            self._cond.notify()
+        return future.result()
+
+    def stats(self) -> dict:
+        streams = [s.stats() for s in list(self.sources.values())]
+        running = [s for s in streams if s["state"] == "running"]
+        elapsed = time.time() - self.started_at if self.started_at else 0.0
+        return {
+            "model": self.model_name,
+            "streams": streams,
+            "aggregate": {
+                "active_streams": len(running),
+                "fps": round(sum(s["fps"] for s in running), 2),
+                "received": sum(s["received"] for s in streams),
+                "processed": sum(s["processed"] for s in streams),
+                "dropped": sum(s["dropped"] for s in streams),
+                "batches": self.batches,
+                "avg_batch_size": round((self.stream_frames + self.images) / self.batches, 2) if self.batches else 0.0,
+                # Part des frames reçues effectivement servie, comparée entre flux
+                "fairness": jain_index([s["served_ratio"] for s in running]),
+                "uptime_s": round(elapsed, 1),
+            },
+            "image_lane": {
+                "images": self.images,
+                "avg_wait_ms": round(self.image_wait_ms / self.images, 2) if self.images else 0.0,
+                "queued": len(self._priority),
+            },
+        }
+
+    def _wake(self):
+        with self._cond:
+            self._cond.notify()
+
+    def _ensure_started(self):
+        with self._cond:
+            if self._started:
+                return
+            self.started_at = time.time()
+            for i in range(self.workers):
+                threading.Thread(target=self._worker, name=f"stream-scheduler-{i}", daemon=True).start()
+            self._started = True
+
+    def _collect(self):
+        with self._cond:
+            while True:
+                if self._closed and not self._priority:
+                    return None
+                ready = [s for s in self.sources.values() if not s.in_flight and s.has_pending()]
+                if self._priority or ready:
+                    break
+                self._cond.wait(0.1)
+
+            # Voie prioritaire d'abord, une place gardée pour les flux en attente
+            room = self.max_batch_size - (1 if ready else 0)
+            images = [self._priority.popleft() for _ in range(min(room, len(self._priority)))]
+
+            frames = []
+            sources = list(self.sources.values())
+            served = 0
+            for k in range(len(sources)):
+                if len(images) + len(frames) >= self.max_batch_size:
+                    break
+                stream = sources[(self._cursor + k) % len(sources)]
+                served = k + 1
+                if stream.in_flight:
+                    continue
+                item = stream.take()
+                if item is not None:
+                    stream.in_flight = True
+                    frames.append((stream, item))
+            if sources:
+                # Le tour suivant reprend après la dernière source servie
+                self._cursor = (self._cursor + served) % len(sources)
+            return images, frames
+
+    def _worker(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            images, frames = batch
+            inputs = [image for image, _, _ in images] + [item[1] for _, item in frames]
+            try:
+                with stage_timer("streams", "inference"), registry.acquire(self.model_name) as model:
+                    with MODEL_INFERENCE.time(model=self.model_name):
+                        results = model(inputs, verbose=False)
+            except Exception as e:
+                for _, future, _ in images:
+                    future.set_exception(e)
+                for stream, (_, frame, _) in frames:
+                    stream.pool.release(frame)
+                    stream.in_flight = False
+                print(f"Erreur inférence multi-flux: {e}")
+                continue
+
+            now = time.perf_counter()
+            image_wait_ms = sum((now - queued_at) * 1000 for _, _, queued_at in images)
+            for (_, future, _), result in zip(images, results):
+                future.set_result(result)
+
+            t0 = time.perf_counter()
+            for (stream, (_, frame, captured_at)), result in zip(frames, results[len(images):]):
+                try:
+                    stream.consume(sv.Detections.from_ultralytics(result), captured_at)
+                except Exception as e:
+                    print(f"Erreur suivi source {stream.name}: {e}")
+                finally:
+                    # Tracking terminé : le buffer peut recevoir la frame suivante
+                    stream.pool.release(frame)
+                    stream.in_flight = False
+            if frames:
+                STAGE_LATENCY.observe(time.perf_counter() - t0, pipeline="streams", stage="track")
+                FRAMES_PROCESSED.inc(len(frames), pipeline="streams")
+
+            with self._cond:
+                self.batches += 1
+                self.images += len(images)
+                self.image_wait_ms += image_wait_ms
+                self.stream_frames += len(frames)
+                # Les sources libérées peuvent fournir la frame suivante
+                self._cond.notify_all()
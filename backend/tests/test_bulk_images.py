@@ -0,0 +1,23 @@
+import io
+import tarfile
+
+from bulk_images import iter_upload
+
+
+def _add(archive, name: str, data: bytes):
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    archive.addfile(info, io.BytesIO(data))
+
+
+def test_tar_members_are_read_in_order(tmp_path):
+    path = tmp_path / "images.tar.gz"
+    with tarfile.open(path, "w:gz") as archive:
+        for i in range(3):
+            _add(archive, f"lot/{i}.jpg", b"image %d" % i)
+        _add(archive, "lot/notes.txt", b"pas une image")
+        _add(archive, "lot/._3.jpg", b"ressource macOS")
+
+    assert list(iter_upload(str(path), "images.tar.gz")) == [
+        ("lot/0.jpg", b"image 0"), ("lot/1.jpg", b"image 1"), ("lot/2.jpg", b"image 2"),
+    ]
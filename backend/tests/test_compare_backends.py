@@ -0,0 +1,121 @@
+import sys
+
+import cv2
+import numpy as np
+import pytest
+
+import compare_backends
+import inference_tracking
+from model_registry import ModelRegistry
+
+
+class Array:
+    """Tenseur minimal lu par sv.Detections.from_ultralytics"""
+
+    def __init__(self, values):
+        self.values = np.asarray(values)
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self.values
+
+
+class Boxes:
+    def __init__(self, xyxy, conf, cls):
+        self.xyxy, self.conf, self.cls, self.id = Array(xyxy), Array(conf), Array(cls), None
+
+
+class Result:
+    names = {2: "car", 7: "truck"}
+    masks = None
+
+    def __init__(self, boxes):
+        self.boxes = boxes
+
+
+class StubModel:
+    """Deux véhicules fixes, décalés de ``shift`` pixels selon le backend"""
+
+    names = Result.names
+
+    def __init__(self, shift: float = 0.0):
+        self.shift = shift
+
+    def __call__(self, image, **kwargs):
+        xyxy = np.array([[100, 100, 300, 250], [400, 120, 600, 300]], dtype=np.float32) + self.shift
+        boxes = Boxes(xyxy, np.array([0.9, 0.8], dtype=np.float32), np.array([2, 7], dtype=np.float32))
+        return [Result(boxes)]
+
+
+def stub_loader(shifts: dict):
+    def load(weights, backend):
+        if backend not in shifts:
+            raise RuntimeError(f"backend {backend} indisponible")
+        return StubModel(shifts[backend])
+    return load
+
+
+@pytest.fixture
+def sample_image(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    cv2.imwrite("sample.jpg", np.full((360, 640, 3), 80, dtype=np.uint8))
+    monkeypatch.setattr(compare_backends, "SAMPLE_IMAGES", ["sample.jpg"])
+    with open("sample.jpg", "rb") as f:
+        return f.read()
+
+
+def use_loader(monkeypatch, shifts: dict):
+    monkeypatch.setattr(inference_tracking, "registry", ModelRegistry(instances=1, loader=stub_loader(shifts)))
+
+
+def run_main(monkeypatch, *args) -> int:
+    monkeypatch.setattr(sys, "argv", ["compare_backends.py", *args])
+    with pytest.raises(SystemExit) as exit_info:
+        compare_backends.main()
+    return exit_info.value.code
+
+
+def test_timed_detections_returns_detections(sample_image, monkeypatch):
+    use_loader(monkeypatch, {"torch": 0.0})
+    detections, timings = compare_backends.timed_detections(
+        inference_tracking.process_image, sample_image, "n:torch", repeats=3
+    )
+    assert [d["class_id"] for d in detections] == [2, 7]
+    assert len(timings) == 3
+
+
+def test_timed_detections_raises_when_model_fails(sample_image, monkeypatch):
+    use_loader(monkeypatch, {"torch": 0.0})
+    with pytest.raises(RuntimeError, match="n:int8"):
+        compare_backends.timed_detections(inference_tracking.process_image, sample_image, "n:int8", repeats=1)
+
+
+def test_report_covers_quantized_backends(sample_image, monkeypatch, tmp_path):
+    use_loader(monkeypatch, {"torch": 0.0, "int8": 1.0, "int8-dynamic": 2.0})
+    report_path = tmp_path / "int8.json"
+    code = run_main(monkeypatch, "--backend", "int8,int8-dynamic", "--iou", "0.5", "--repeats", "1",
+                    "--json", str(report_path))
+    assert code == 0
+    assert report_path.exists()
+
+
+def test_exported_backends_match_torch(sample_image, monkeypatch):
+    use_loader(monkeypatch, {"torch": 0.0, "onnx": 0.0, "openvino": 0.5})
+    assert run_main(monkeypatch, "--backend", "onnx,openvino", "--repeats", "1") == 0
+
+
+def test_drifting_backend_fails_parity(sample_image, monkeypatch):
+    # Décalage de 40 px : IoU bien en dessous du seuil par défaut (0.9)
+    use_loader(monkeypatch, {"torch": 0.0, "onnx": 40.0})
+    assert run_main(monkeypatch, "--backend", "onnx", "--repeats", "1") == 1
+
+
+def test_compare_detections_flags_class_mismatch():
+    reference = [{"bbox": [0, 0, 10, 10], "class_id": 2, "confidence": 0.9}]
+    candidate = [{"bbox": [0, 0, 10, 10], "class_id": 7, "confidence": 0.9}]
+    report = compare_backends.compare_detections(reference, candidate, 0.9, 0.05)
+    assert report["matched"] == 1
+    assert report["class_mismatch"] == 1
+    assert not report["passed"]
@@ -0,0 +1,29 @@
+import numpy as np
+import supervision as sv
+
+from counting import COUNTER_TTL_FRAMES, TRACK_LOST_BUFFER, UniqueVehicleCounter, counter_ttl
+
+
+def _track(tracker_id: int) -> sv.Detections:
+    return sv.Detections(
+        xyxy=np.array([[10, 10, 50, 50]], dtype=np.float32),
+        class_id=np.array([0]),
+        tracker_id=np.array([tracker_id]),
+    )
+
+
+def test_counter_ttl_covers_tracker_buffer_at_stride():
+    assert counter_ttl(1) == COUNTER_TTL_FRAMES
+    assert counter_ttl(4) > TRACK_LOST_BUFFER * 4
+    assert counter_ttl(8) > TRACK_LOST_BUFFER * 8
+
+
+def test_track_lost_within_tracker_buffer_is_counted_once():
+    stride = 4
+    counter = UniqueVehicleCounter({0: "car"}, counter_ttl(stride))
+    counter.update(1, _track(7))
+    # Perdu pendant 29 mises à jour du tracker : ByteTrack lui rend le même identifiant
+    for frame_index in range(2, 2 + 29 * stride):
+        counter.update(frame_index, sv.Detections.empty())
+    counter.update(2 + 29 * stride, _track(7))
+    assert counter.total == 1
@@ -0,0 +1,44 @@
+import os
+import sys
+import threading
+import time
+import types
+
+import model_registry
+
+
+class FakeYOLO:
+    exports = []
+
+    def __init__(self, weights, task=None):
+        self.weights = weights
+
+    def export(self, format, **kwargs):
+        FakeYOLO.exports.append(self.weights)
+        time.sleep(0.2)
+        path = os.path.splitext(self.weights)[0] + ".onnx"
+        with open(path, "w") as f:
+            f.write("onnx")
+        return path
+
+
+def test_concurrent_exports_publish_one_model(tmp_path, monkeypatch):
+    weights = tmp_path / "yolov8n.pt"
+    weights.write_text("pt")
+    monkeypatch.setitem(sys.modules, "ultralytics", types.SimpleNamespace(YOLO=FakeYOLO))
+    monkeypatch.setattr(model_registry, "MODEL_CACHE_DIR", str(tmp_path / "models"))
+    FakeYOLO.exports = []
+
+    paths = []
+    threads = [threading.Thread(target=lambda: paths.append(model_registry.export_model(str(weights), "onnx")))
+               for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(FakeYOLO.exports) == 1
+    assert set(paths) == {str(tmp_path / "models" / "yolov8n.onnx")}
+    # Ni dossier de travail ni export à côté des poids d'origine
+    assert os.listdir(tmp_path / "models") == ["yolov8n.onnx"]
+    assert not (tmp_path / "yolov8n.onnx").exists()
@@ -0,0 +1,16 @@
+from metrics import Histogram
+
+
+def test_recording_collects_raw_values_for_its_labels():
+    histogram = Histogram("test_seconds", "test", ("pipeline", "stage"))
+    histogram.observe(0.5, pipeline="video", stage="inference")
+    with histogram.recording(pipeline="video", stage="inference") as values:
+        histogram.observe(0.1, pipeline="video", stage="inference")
+        histogram.observe(0.2, pipeline="video", stage="decode")
+        histogram.observe(0.3, pipeline="video", stage="inference")
+    histogram.observe(0.4, pipeline="video", stage="inference")
+
+    assert values == [0.1, 0.3]
+    total, count = histogram.snapshot()[("video", "inference")]
+    assert (round(total, 6), count) == (1.3, 4)
+    assert not histogram._recorders
@@ -0,0 +1,59 @@
+import threading
+import time
+
+from model_registry import ModelRegistry
+
+
+class SlowModel:
+    names = {0: "car", 1: "truck"}
+
+    def __call__(self, *args, **kwargs):
+        return []
+
+
+def slow_loader(delay: float):
+    def load(weights, backend):
+        time.sleep(delay)
+        return SlowModel()
+    return load
+
+
+def test_class_names_waits_for_concurrent_load():
+    registry = ModelRegistry(instances=1, loader=slow_loader(1.0))
+    warmup = threading.Thread(target=registry.warmup, args=(["n"],))
+    warmup.start()
+    time.sleep(0.1)
+    try:
+        # L'échauffement a réservé l'unique instance : class_names doit attendre ses noms
+        assert registry.class_names("n") == SlowModel.names
+    finally:
+        warmup.join()
+    assert registry.pool("n").loaded == 1
+
+
+def test_class_names_retries_after_failed_load():
+    calls = []
+
+    def flaky(weights, backend):
+        calls.append(weights)
+        time.sleep(0.2)
+        if len(calls) == 1:
+            raise RuntimeError("chargement interrompu")
+        return SlowModel()
+
+    registry = ModelRegistry(instances=1, loader=flaky)
+    pool = registry.pool("n")
+    failed = threading.Thread(target=lambda: registry.warmup(["n"]))
+    failed.start()
+    time.sleep(0.05)
+    assert registry.class_names("n") == SlowModel.names
+    failed.join()
+    assert pool.loaded == 1
+
+
+def test_warmup_instances_overrides_constructor_size():
+    # Processus de segment : registre créé avec la taille du parent avant l'initialisation
+    registry = ModelRegistry(instances=3, loader=slow_loader(0.0))
+    registry.pool("n")
+    registry.warmup(["n"], instances=1)
+    assert registry.pool("n").status()["instances"] == 1
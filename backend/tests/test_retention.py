@@ -0,0 +1,33 @@
+import os
+import time
+
+from retention import OutputRetention, active_output
+
+
+def _old_file(path, age_s: float = 3600):
+    with open(path, "wb") as f:
+        f.write(b"x" * 10)
+    past = time.time() - age_s
+    os.utime(path, (past, past))
+
+
+def test_active_run_outputs_survive_sweep(tmp_path):
+    for name in ("output_1_aa.mp4", "output_1_aa_tracks.npy.raw", "output_2_bb.mp4", "output_2_bb_preview.jpg"):
+        _old_file(tmp_path / name)
+    retention = OutputRetention(str(tmp_path), max_age_s=60, max_bytes=0, min_idle_s=60)
+
+    with active_output("output_1_aa"):
+        assert retention.sweep()["removed"] == 1
+        assert sorted(os.listdir(tmp_path)) == ["output_1_aa.mp4", "output_1_aa_tracks.npy.raw"]
+
+    assert retention.sweep()["removed"] == 1
+    assert os.listdir(tmp_path) == []
+
+
+def test_job_prefix_protects_segment_outputs(tmp_path):
+    _old_file(tmp_path / "segment_ab12_1700000000_cd34.mp4")
+    _old_file(tmp_path / "segment_ab123_1700000000_cd34.mp4")
+    retention = OutputRetention(str(tmp_path), max_age_s=60, max_bytes=0, min_idle_s=60)
+    with active_output("segment_ab12"):
+        retention.sweep()
+    assert os.listdir(tmp_path) == ["segment_ab12_1700000000_cd34.mp4"]
@@ -0,0 +1,9 @@
+from video_encoding import encoding_options
+
+
+def test_fragmented_only_for_h264():
+    assert encoding_options(codec="h264", fragmented=True)["fragmented"] is True
+    assert encoding_options(codec="h264", fragmented=False)["fragmented"] is False
+    # mp4v (OpenCV) et none n'écrivent jamais de MP4 fragmenté
+    assert encoding_options(codec="mp4v", fragmented=True)["fragmented"] is False
+    assert encoding_options(codec="none", fragmented=True)["fragmented"] is False
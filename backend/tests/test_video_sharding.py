@@ -0,0 +1,72 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+import pytest
+
+import video_sharding
+from track_log import TRACK_LOG_DTYPE, track_log_paths
+from video_sharding import replay_counts
+
+LINE = [[0, 100], [200, 100]]
+
+
+def _log(positions: dict) -> np.ndarray:
+    """Un seul track (id 1), une boîte de 10 px centrée sur (50, y) par frame"""
+    log = np.zeros(len(positions), dtype=TRACK_LOG_DTYPE)
+    for row, (frame, y) in zip(log, sorted(positions.items())):
+        row["frame"], row["tracker_id"], row["class_id"], row["confidence"] = frame, 1, 2, 0.9
+        row["xyxy"] = (45, y - 5, 55, y + 5)
+    return log
+
+
+def test_predicted_frames_do_not_cross_the_line():
+    # Frame 2 extrapolée au-delà de la ligne, la détection suivante montre un demi-tour
+    log = _log({1: 60, 2: 130, 3: 80})
+    counts = replay_counts(log, 3, {2: "car"}, True, line=LINE, predicted_frames=[2])
+    assert counts["line_counts"]["total_in"] + counts["line_counts"]["total_out"] == 0
+    assert counts["total_vehicles"] == 1
+
+
+def test_detected_crossing_is_counted():
+    log = _log({1: 60, 2: 130, 3: 150})
+    counts = replay_counts(log, 3, {2: "car"}, True, line=LINE)
+    assert counts["line_counts"]["total_in"] + counts["line_counts"]["total_out"] == 1
+
+
+def test_failed_segment_waits_for_running_segments_and_removes_outputs(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("static")
+    video_path = str(tmp_path / "video.mp4")
+    writer = cv2.VideoWriter(video_path, cv2.VideoWriter_fourcc(*"mp4v"), 30, (64, 48))
+    for _ in range(40):
+        writer.write(np.zeros((48, 64, 3), dtype=np.uint8))
+    writer.release()
+    finished = []
+
+    def run_segment(video_path, output_prefix, track, start_frame, end_frame, warmup_frames, options):
+        if start_frame == 0:
+            # Échec une fois l'autre segment lancé (il ne peut plus être annulé)
+            time.sleep(0.05)
+            return {"success": False, "error": "segment en échec"}
+        # Segment encore en cours d'écriture quand l'autre échoue
+        time.sleep(0.3)
+        run_id = f"{output_prefix}_{start_frame}"
+        for path in (f"static/{run_id}.mp4", *track_log_paths(f"static/{run_id}.mp4")):
+            open(path, "w").close()
+        finished.append(run_id)
+        return {"success": True, "run_id": run_id}
+
+    monkeypatch.setattr(video_sharding, "_run_segment", run_segment)
+    processor = video_sharding.ShardedVideoProcessor(workers=2, min_segment_frames=10, overlap=2)
+    processor._executor = ThreadPoolExecutor(max_workers=2)
+    try:
+        with pytest.raises(RuntimeError, match="segment en échec"):
+            processor.process(video_path, "output", True)
+    finally:
+        processor.shutdown()
+
+    assert finished
+    assert os.listdir("static") == []
@@ -0,0 +1,101 @@
+import math
+import os
+
+import numpy as np
+import supervision as sv
+
+from box_ops import nms
+
+# Inférence par tuiles (type SAHI) pour les frames haute résolution
+TILED_INFERENCE = os.environ.get("TILED_INFERENCE", "0") != "0"
+TILE_SIZE = int(os.environ.get("TILE_SIZE", "640"))
+# Recouvrement entre tuiles voisines (fraction de la taille de tuile)
+TILE_OVERLAP = float(os.environ.get("TILE_OVERLAP", "0.2"))
+# Vidéo : une inférence sur TILE_EVERY passe par les tuiles, les autres sur l'image entière
+TILE_EVERY = int(os.environ.get("TILE_EVERY", "1"))
+# Fusion des détections : recouvrement rapporté à la plus petite boîte
+TILE_MATCH_THRESHOLD = float(os.environ.get("TILE_MATCH_THRESHOLD", "0.5"))
+
+
+def tiling_options(tiled=None, tile_size=None, every=None, overlap=None):
+    """Options de découpage (None = inférence sur l'image entière)"""
+    if tiled is None:
+        tiled = TILED_INFERENCE
+    if not tiled:
+        return None
+    tile_size = int(tile_size or TILE_SIZE)
+    overlap = float(TILE_OVERLAP if overlap is None else overlap)
+    every = int(every or TILE_EVERY)
+    if tile_size < 64:
+        raise ValueError("tile_size doit être >= 64")
+    if not 0 <= overlap < 1:
+        raise ValueError("overlap doit être dans [0, 1[")
+    if every < 1:
+        raise ValueError("tile_every doit être >= 1")
+    return {"tile_size": tile_size, "overlap": overlap, "every": every}
+
+
+def _starts(length: int, tile_size: int, overlap: float) -> np.ndarray:
+    if length <= tile_size:
+        return np.zeros(1, dtype=np.int64)
+    step = tile_size * (1 - overlap)
+    count = math.ceil((length - tile_size) / step) + 1
+    # Tuiles de taille égale, la dernière alignée sur le bord
+    return np.round(np.linspace(0, length - tile_size, count)).astype(np.int64)
+
+
+def tile_grid(width: int, height: int, tile_size: int = TILE_SIZE, overlap: float = TILE_OVERLAP) -> np.ndarray:
+    """Tuiles [x0, y0, x1, y1] qui se recouvrent et couvrent toute l'image"""
+    xs = _starts(width, tile_size, overlap)
+    ys = _starts(height, tile_size, overlap)
+    x0, y0 = (v.ravel() for v in np.meshgrid(xs, ys))
+    return np.stack([x0, y0, np.minimum(x0 + tile_size, width), np.minimum(y0 + tile_size, height)], axis=1)
+
+
+class TiledBatch:
+    """Entrées d'un appel modèle unique où certaines images sont découpées en tuiles
+
+    Une image découpée contribue toutes ses tuiles plus l'image entière
+    (qui garde les grands véhicules coupés par les tuiles); ``merge``
+    ramène les boîtes en coordonnées image et fusionne les doublons par NMS.
+    """
+
+    def __init__(self, images: list, tiled: list, options: dict):
+        self.options = options
+        self.inputs = []
+        self.tile_count = 0
+        self._plan = []
+        for image, split in zip(images, tiled):
+            start = len(self.inputs)
+            height, width = image.shape[:2]
+            tiles = tile_grid(width, height, options["tile_size"], options["overlap"]) if split else None
+            if tiles is not None and len(tiles) > 1:
+                # Vues sans copie : le modèle redimensionne chaque tuile
+                self.inputs.extend(image[y0:y1, x0:x1] for x0, y0, x1, y1 in tiles)
+                offsets = np.vstack([tiles[:, [0, 1, 0, 1]], np.zeros((1, 4))]).astype(np.float32)
+                self.tile_count += len(tiles)
+            else:
+                offsets = np.zeros((1, 4), dtype=np.float32)
+            self.inputs.append(image)
+            self._plan.append((start, offsets))
+
+    def merge(self, results: list) -> list:
+        """Résultats du modèle (dans l'ordre de ``inputs``) -> sv.Detections par image"""
+        merged = []
+        for start, offsets in self._plan:
+            parts = []
+            for k, offset in enumerate(offsets):
+                detections = sv.Detections.from_ultralytics(results[start + k])
+                if len(detections) > 0:
+                    detections.xyxy = detections.xyxy + offset
+                    parts.append(detections)
+            if not parts:
+                merged.append(sv.Detections.empty())
+                continue
+            detections = sv.Detections.merge(parts) if len(parts) > 1 else parts[0]
+            if len(offsets) > 1 and len(detections) > 1:
+                keep = nms(detections.xyxy, detections.confidence, detections.class_id,
+                           threshold=TILE_MATCH_THRESHOLD, metric="ios")
+                detections = detections[keep]
+            merged.append(detections)
+        return merged
@@ -0,0 +1,144 @@
+import bisect
+import json
+import os
+
+import numpy as np
+
+# Une ligne par boîte et par frame, écrite à côté de la vidéo rendue
+# (<video>_tracks.npy) ; tracker_id vaut -1 sans tracking
+TRACK_LOG_DTYPE = np.dtype([
+    ("frame", "<u4"),
+    ("tracker_id", "<i4"),
+    ("class_id", "<i2"),
+    ("confidence", "<f4"),
+    ("xyxy", "<f4", (4,)),
+])
+
+# Nombre maximal de lignes renvoyées en JSON par requête
+TRACK_LOG_MAX_ROWS = int(os.environ.get("TRACK_LOG_MAX_ROWS", "10000"))
+
+_COPY_CHUNK_ROWS = 65536
+
+
+def track_log_paths(video_path: str) -> tuple:
+    """Chemins (.npy, .json) du journal associé à une vidéo rendue"""
+    stem = os.path.splitext(video_path)[0]
+    return stem + "_tracks.npy", stem + "_tracks.json"
+
+
+class TrackLogWriter:
+    """Écrit le journal au fil des frames, sans le garder en mémoire.
+
+    Les lignes sont ajoutées à un fichier brut; ``close`` le convertit en
+    .npy (lisible avec np.load(..., mmap_mode="r")) et écrit les
+    métadonnées (fps, noms de classes) dans un .json voisin.
+    """
+
+    def __init__(self, video_path: str, fps: float, class_names: dict):
+        self.video_path = video_path
+        self.path, self.meta_path = track_log_paths(video_path)
+        self.fps = fps
+        self.class_names = class_names
+        self.rows = 0
+        self._raw_path = self.path + ".raw"
+        self._raw = open(self._raw_path, "wb")
+
+    def append(self, frame_index: int, detections):
+        count = len(detections)
+        if count == 0:
+            return
+        rows = np.empty(count, dtype=TRACK_LOG_DTYPE)
+        rows["frame"] = frame_index
+        rows["tracker_id"] = detections.tracker_id if detections.tracker_id is not None else -1
+        rows["class_id"] = detections.class_id if detections.class_id is not None else -1
+        rows["confidence"] = detections.confidence if detections.confidence is not None else 0.0
+        rows["xyxy"] = detections.xyxy
+        rows.tofile(self._raw)
+        self.rows += count
+
+    def close(self, frames: int) -> str:
+        self._raw.close()
+        try:
+            parts = []
+            if self.rows:
+                parts.append(np.memmap(self._raw_path, dtype=TRACK_LOG_DTYPE, mode="r", shape=(self.rows,)))
+            write_track_log(self.video_path, parts, self.fps, frames, self.class_names)
+            del parts
+        finally:
+            os.remove(self._raw_path)
+        return self.path
+
+    def abort(self):
+        self._raw.close()
+        for path in (self._raw_path, self.path, self.meta_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def write_track_log(video_path: str, parts: list, fps: float, frames: int, class_names: dict) -> str:
+    """Écrit le journal .npy (et son .json) à partir de tableaux déjà triés par frame"""
+    path, meta_path = track_log_paths(video_path)
+    rows = sum(len(part) for part in parts)
+    log = np.lib.format.open_memmap(path, mode="w+", dtype=TRACK_LOG_DTYPE, shape=(rows,))
+    offset = 0
+    for part in parts:
+        for start in range(0, len(part), _COPY_CHUNK_ROWS):
+            chunk = part[start:start + _COPY_CHUNK_ROWS]
+            log[offset:offset + len(chunk)] = chunk
+            offset += len(chunk)
+    log.flush()
+    del log
+
+    with open(meta_path, "w") as f:
+        json.dump({
+            "fps": fps,
+            "frames": frames,
+            "rows": rows,
+            "class_names": {str(k): v for k, v in class_names.items()},
+        }, f)
+    return path
+
+
+def load_track_log(video_path: str) -> tuple:
+    """Journal mappé en mémoire (aucune lecture complète) et ses métadonnées"""
+    path, meta_path = track_log_paths(video_path)
+    with open(meta_path) as f:
+        meta = json.load(f)
+    return np.load(path, mmap_mode="r"), meta
+
+
+def query_track_log(log: np.ndarray, fps: float, start=None, end=None, track_id=None, class_id=None) -> np.ndarray:
+    """Filtre par intervalle de temps (secondes) puis par track / classe.
+
+    Les lignes sont triées par frame : l'intervalle est résolu par
+    recherche dichotomique, seule la tranche concernée est lue.
+    """
+    fps = fps or 30.0
+    lo, hi = 0, len(log)
+    frames = log["frame"]
+    # Frames numérotées à partir de 1 : la frame n est à l'instant (n-1)/fps
+    # bisect lit O(log n) valeurs; np.searchsorted copierait toute la colonne
+    if start is not None:
+        lo = bisect.bisect_left(frames, int(np.ceil(start * fps)) + 1)
+    if end is not None:
+        hi = bisect.bisect_right(frames, int(np.floor(end * fps)) + 1)
+    selected = log[lo:max(lo, hi)]
+
+    mask = None
+    if track_id is not None:
+        mask = selected["tracker_id"] == track_id
+    if class_id is not None:
+        class_mask = selected["class_id"] == class_id
+        mask = class_mask if mask is None else mask & class_mask
+    return np.asarray(selected if mask is None else selected[mask])
+
+
+def rows_to_json(rows: np.ndarray, fps: float) -> list:
+    """[frame, temps (s), tracker_id, classe, conf, x1, y1, x2, y2] par ligne"""
+    fps = fps or 30.0
+    return [
+        [int(frame), round((int(frame) - 1) / fps, 3), int(tid), int(cls), round(float(conf), 3)]
+        + [round(float(v), 1) for v in box]
+        for frame, tid, cls, conf, box in zip(rows["frame"], rows["tracker_id"], rows["class_id"],
+                                              rows["confidence"], rows["xyxy"])
+    ]
@@ -0,0 +1,49 @@
+import os
+import tempfile
+
+# Taille des blocs copiés : la vidéo n'est jamais chargée entière en mémoire
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Taille maximale acceptée pour un upload vidéo
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_MB", "2048")) * 1024 * 1024
+
+
+class UploadTooLargeError(Exception):
+    """Levée quand un upload dépasse MAX_UPLOAD_BYTES"""
+
+
+def copy_upload(src, dest_path: str, max_bytes: int = MAX_UPLOAD_BYTES, chunk_size: int = UPLOAD_CHUNK_SIZE,
+                hasher=None) -> int:
+    """Copie un fichier uploadé par blocs vers dest_path et retourne le nombre d'octets
+
+    ``hasher`` (ex: hashlib.sha256()) est mis à jour avec chaque bloc copié.
+    """
+    written = 0
+    try:
+        with open(dest_path, 'wb') as f:
+            while True:
+                chunk = src.read(chunk_size)
+                if not chunk:
+                    break
+                written += len(chunk)
+                if max_bytes and written > max_bytes:
+                    raise UploadTooLargeError(
+                        f"Fichier trop volumineux (max {max_bytes // (1024 * 1024)} Mo)"
+                    )
+                f.write(chunk)
+                if hasher is not None:
+                    hasher.update(chunk)
+    except BaseException:
+        if os.path.exists(dest_path):
+            os.remove(dest_path)
+        raise
+    return written
+
+
+def save_upload(upload_file, max_bytes: int = MAX_UPLOAD_BYTES, hasher=None) -> str:
+    """Copie un UploadFile dans un fichier temporaire qui survit à la requête"""
+    suffix = os.path.splitext(upload_file.filename or "")[1] or ".mp4"
+    fd, path = tempfile.mkstemp(prefix="upload_", suffix=suffix)
+    os.close(fd)
+    copy_upload(upload_file.file, path, max_bytes=max_bytes, hasher=hasher)
+    return path
@@ -0,0 +1,95 @@
+import os
+import re
+import time
+
+from fastapi.responses import FileResponse, Response, StreamingResponse
+
+from video_encoding import is_being_written
+
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
+# Attente entre deux lectures d'un fichier encore en cours d'encodage
+FOLLOW_POLL_S = 0.25
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def parse_range(header: str, size: int):
+    """Plage "bytes=a-b" -> (début, fin incluse); None si l'en-tête est ignoré.
+
+    Lève ValueError si la plage n'est pas satisfiable (réponse 416). Les
+    requêtes multi-plages sont servies en entier.
+    """
+    match = _RANGE_RE.match(header.strip())
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffixe : les N derniers octets
+        length = int(last)
+        if length == 0:
+            raise ValueError("Plage vide")
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError("Plage hors du fichier")
+    return start, end
+
+
+def _read_chunks(path: str, start: int, end: int):
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(DOWNLOAD_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def _follow_chunks(path: str):
+    """Lit le fichier au fur et à mesure de son écriture, jusqu'à la fin de l'encodage"""
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(DOWNLOAD_CHUNK_SIZE)
+            if chunk:
+                yield chunk
+                continue
+            if not is_being_written(path):
+                # Dernière lecture : l'encodeur a pu écrire entre-temps
+                chunk = f.read()
+                if chunk:
+                    yield chunk
+                return
+            time.sleep(FOLLOW_POLL_S)
+
+
+def video_response(path: str, range_header: str = None, filename: str = None, media_type: str = "video/mp4"):
+    """Réponse vidéo : flux suivi si l'encodage est en cours, sinon plages HTTP"""
+    disposition = {"Content-Disposition": f'attachment; filename="{filename}"'} if filename else {}
+
+    if is_being_written(path):
+        # MP4 fragmenté en cours d'écriture : taille inconnue, pas de plages
+        return StreamingResponse(_follow_chunks(path), media_type=media_type,
+                                 headers={**disposition, "Cache-Control": "no-store"})
+
+    size = os.path.getsize(path)
+    headers = {**disposition, "Accept-Ranges": "bytes"}
+    if range_header:
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            return Response(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+        if byte_range is not None:
+            start, end = byte_range
+            return StreamingResponse(
+                _read_chunks(path, start, end),
+                status_code=206,
+                media_type=media_type,
+                headers={**headers, "Content-Range": f"bytes {start}-{end}/{size}",
+                         "Content-Length": str(end - start + 1)},
+            )
+    return FileResponse(path, media_type=media_type, headers=headers)
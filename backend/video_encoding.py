@@ -0,0 +1,238 @@
+import os
+import queue
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+
+import cv2
+
+from metrics import STAGE_LATENCY
+
+# Encodage de la vidéo rendue
+#   mp4v : cv2.VideoWriter (historique, souvent illisible dans le navigateur)
+#   h264 : ffmpeg/libx264 via un pipe, lisible partout, preset/CRF réglables
+#   none : pas de vidéo rendue, seulement les comptages et l'aperçu
+VIDEO_CODECS = ("mp4v", "h264", "none")
+X264_PRESETS = ("ultrafast", "superfast", "veryfast", "faster", "fast", "medium", "slow", "slower", "veryslow")
+
+VIDEO_CODEC = os.environ.get("VIDEO_CODEC", "mp4v")
+VIDEO_PRESET = os.environ.get("VIDEO_PRESET", "veryfast")
+VIDEO_CRF = int(os.environ.get("VIDEO_CRF", "23"))
+# Largeur maximale de la vidéo rendue (0 = résolution source)
+VIDEO_OUTPUT_WIDTH = int(os.environ.get("VIDEO_OUTPUT_WIDTH", "0"))
+FFMPEG_BINARY = os.environ.get("FFMPEG_BINARY", "ffmpeg")
+# MP4 fragmenté (h264) : la vidéo est lisible pendant l'encodage
+VIDEO_FRAGMENTED = os.environ.get("VIDEO_FRAGMENTED", "1") != "0"
+
+# Frames annotées en attente d'encodage
+VIDEO_ENCODER_QUEUE_SIZE = int(os.environ.get("VIDEO_ENCODER_QUEUE_SIZE", "16"))
+
+# Fichiers en cours d'écriture (diffusés au fil de l'eau par /api/download-video)
+_active_outputs = set()
+_active_lock = threading.Lock()
+
+
+def is_being_written(path: str) -> bool:
+    with _active_lock:
+        return os.path.abspath(path) in _active_outputs
+
+
+def _set_active(path: str, active: bool):
+    with _active_lock:
+        if active:
+            _active_outputs.add(os.path.abspath(path))
+        else:
+            _active_outputs.discard(os.path.abspath(path))
+
+
+def encoding_options(codec=None, preset=None, crf=None, output_width=None, fragmented=None) -> dict:
+    """Valide les options d'encodage et complète avec les valeurs par défaut"""
+    options = {
+        "codec": codec or VIDEO_CODEC,
+        "preset": preset or VIDEO_PRESET,
+        "crf": VIDEO_CRF if crf is None else int(crf),
+        "output_width": VIDEO_OUTPUT_WIDTH if output_width is None else int(output_width),
+    }
+    # Seul ffmpeg fragmente le MP4 : le writer mp4v ignorerait l'option
+    options["fragmented"] = options["codec"] == "h264" and (
+        VIDEO_FRAGMENTED if fragmented is None else bool(fragmented)
+    )
+    if options["codec"] not in VIDEO_CODECS:
+        raise ValueError(f"Codec inconnu: {options['codec']} (disponibles: {', '.join(VIDEO_CODECS)})")
+    if options["preset"] not in X264_PRESETS:
+        raise ValueError(f"Preset inconnu: {options['preset']}")
+    if not 0 <= options["crf"] <= 51:
+        raise ValueError("crf doit être compris entre 0 et 51")
+    if options["output_width"] < 0:
+        raise ValueError("output_width doit être positif")
+    return options
+
+
+def output_size(width: int, height: int, output_width: int) -> tuple:
+    """Taille de sortie : réduite à output_width en gardant le ratio, dimensions paires"""
+    if not output_width or output_width >= width:
+        out_w, out_h = width, height
+    else:
+        out_w, out_h = output_width, round(height * output_width / width)
+    # libx264 / yuv420p exigent des dimensions paires
+    return max(2, out_w - out_w % 2), max(2, out_h - out_h % 2)
+
+
+class OpenCVWriter:
+    """cv2.VideoWriter mp4v, avec réduction éventuelle de la résolution"""
+
+    def __init__(self, path: str, fps: float, size: tuple):
+        self.path = path
+        self.size = size
+        self._writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, size)
+
+    def write(self, frame):
+        if (frame.shape[1], frame.shape[0]) != self.size:
+            frame = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+        self._writer.write(frame)
+
+    def release(self):
+        self._writer.release()
+
+
+class FFmpegWriter:
+    """Encodage H.264 par ffmpeg : les frames BGR brutes sont envoyées sur stdin.
+
+    La réduction de résolution est faite par ffmpeg (filtre scale), hors du GIL.
+    En mode fragmenté, le fichier est lisible pendant l'écriture
+    (moov vide en tête, un fragment par image clé).
+    """
+
+    def __init__(self, path: str, fps: float, frame_size: tuple, size: tuple, preset: str, crf: int,
+                 fragmented: bool = False):
+        self.path = path
+        self.size = size
+        self._stderr = tempfile.TemporaryFile()
+        command = [
+            FFMPEG_BINARY, "-y", "-loglevel", "error",
+            "-f", "rawvideo", "-pix_fmt", "bgr24",
+            "-s", f"{frame_size[0]}x{frame_size[1]}", "-r", f"{fps or 30}",
+            "-i", "-",
+        ]
+        if size != tuple(frame_size):
+            command += ["-vf", f"scale={size[0]}:{size[1]}"]
+        movflags = "+frag_keyframe+empty_moov+default_base_moof" if fragmented else "+faststart"
+        command += [
+            "-c:v", "libx264", "-preset", preset, "-crf", str(crf),
+            # Une image clé par seconde : fragments courts pour la lecture en direct
+            *(["-g", str(max(1, round(fps or 30)))] if fragmented else []),
+            "-pix_fmt", "yuv420p", "-movflags", movflags, path,
+        ]
+        self._process = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=self._stderr)
+        self.streaming = fragmented
+        if fragmented:
+            _set_active(path, True)
+
+    def write(self, frame):
+        try:
+            self._process.stdin.write(memoryview(frame if frame.flags.c_contiguous else frame.copy()))
+        except BrokenPipeError:
+            self.release()
+
+    def release(self):
+        if self._stderr.closed:
+            return
+        if self._process.stdin and not self._process.stdin.closed:
+            try:
+                self._process.stdin.close()
+            except BrokenPipeError:
+                pass
+        returncode = self._process.wait()
+        _set_active(self.path, False)
+        self._stderr.seek(0)
+        error = self._stderr.read().decode(errors="replace").strip()
+        self._stderr.close()
+        if returncode != 0:
+            raise RuntimeError(f"ffmpeg a échoué ({returncode}): {error[-500:]}")
+
+
+class NullWriter:
+    """Mode métadonnées seules : aucune vidéo n'est écrite"""
+
+    path = None
+    streaming = False
+
+    def __init__(self, on_written=None):
+        self.on_written = on_written
+
+    def write(self, frame):
+        if self.on_written is not None:
+            self.on_written(frame)
+
+    def release(self):
+        pass
+
+
+class AsyncWriter:
+    """Encode dans un thread dédié : l'annotation de la frame suivante
+    recouvre l'encodage de la précédente. Les erreurs de l'encodeur sont
+    relevées au write suivant ou au release. ``on_written`` reçoit chaque
+    frame une fois encodée (ou abandonnée) : son buffer peut être réutilisé.
+    """
+
+    def __init__(self, writer, queue_size: int = VIDEO_ENCODER_QUEUE_SIZE, pipeline: str = "video",
+                 on_written=None):
+        self.writer = writer
+        self.on_written = on_written
+        self.path = writer.path
+        self.streaming = getattr(writer, "streaming", False)
+        self.pipeline = pipeline
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._error = None
+        self._thread = threading.Thread(target=self._loop, name="video-encoder", daemon=True)
+        self._thread.start()
+
+    def write(self, frame):
+        if self._error is not None:
+            raise self._error
+        self._queue.put(frame)
+
+    def release(self):
+        self._queue.put(None)
+        self._thread.join()
+        try:
+            self.writer.release()
+        except Exception as e:
+            self._error = self._error or e
+        if self._error is not None:
+            raise self._error
+
+    def _loop(self):
+        while True:
+            frame = self._queue.get()
+            if frame is None:
+                return
+            if self._error is None:
+                start = time.perf_counter()
+                try:
+                    self.writer.write(frame)
+                except Exception as e:
+                    self._error = e
+                STAGE_LATENCY.observe(time.perf_counter() - start, pipeline=self.pipeline, stage="encode")
+            # Encodeur en échec : la file est vidée sans bloquer le producteur
+            if self.on_written is not None:
+                self.on_written(frame)
+
+
+def open_writer(path: str, fps: float, frame_size: tuple, options: dict, pipeline: str = "video",
+                on_written=None):
+    """Ouvre l'encodeur choisi par ``options`` (voir encoding_options)"""
+    codec = options["codec"]
+    if codec == "none":
+        return NullWriter(on_written)
+
+    size = output_size(frame_size[0], frame_size[1], options["output_width"])
+    if codec == "h264":
+        if shutil.which(FFMPEG_BINARY) is not None:
+            writer = FFmpegWriter(path, fps, frame_size, size, options["preset"], options["crf"],
+                                  options.get("fragmented", False))
+            return AsyncWriter(writer, pipeline=pipeline, on_written=on_written)
+        print(f"⚠️ {FFMPEG_BINARY} introuvable, encodage mp4v via OpenCV")
+    return AsyncWriter(OpenCVWriter(path, fps, size), pipeline=pipeline, on_written=on_written)
@@ -0,0 +1,194 @@
+import queue
+import threading
+import time
+import weakref
+
+_END = object()
+
+# Pipelines en cours, pour exposer la profondeur de leurs files (/metrics)
+_running = weakref.WeakSet()
+
+
+def queue_depths() -> dict:
+    """Lots en attente entre les étages, cumulés sur les pipelines en cours"""
+    pipelines = list(_running)
+    return {
+        "decoded": sum(p.decoded.qsize() for p in pipelines),
+        "inferred": sum(p.inferred.qsize() for p in pipelines),
+    }
+
+
+class StageStats:
+    """Temps de travail et blocages d'un étage du pipeline"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.items = 0
+        self.busy_time = 0.0
+        self.stalls = 0
+        self.stall_time = 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "items": self.items,
+            "busy_s": round(self.busy_time, 4),
+            "stalls": self.stalls,
+            "stall_s": round(self.stall_time, 4),
+        }
+
+
+class VideoPipeline:
+    """Pipeline décodage -> inférence -> annotation+encodage.
+
+    Le décodage et l'encodage tournent dans leurs propres threads, l'inférence
+    dans le thread appelant. Les étages sont reliés par des files bornées
+    (contre-pression) : l'ordre des frames est conservé de bout en bout.
+
+    - ``read_batch()`` retourne une liste de frames (vide à la fin du flux)
+    - ``infer(frames)`` retourne les résultats du modèle pour ce lot
+    - ``consume(frames, results)`` annote et écrit les frames, dans l'ordre
+    """
+
+    def __init__(self, read_batch, infer, consume, queue_size: int = 4):
+        self.read_batch = read_batch
+        self.infer = infer
+        self.consume = consume
+        self.decoded = queue.Queue(maxsize=queue_size)
+        self.inferred = queue.Queue(maxsize=queue_size)
+        self.stats = {
+            "decode": StageStats("decode"),
+            "infer": StageStats("infer"),
+            "encode": StageStats("encode"),
+        }
+        self._stop = threading.Event()
+        self._error = None
+
+    def run(self) -> dict:
+        """Exécute le pipeline jusqu'à la fin du flux et retourne les statistiques"""
+        start = time.perf_counter()
+        decoder = threading.Thread(target=self._guard, args=(self._decode_loop,), name="video-decode", daemon=True)
+        encoder = threading.Thread(target=self._guard, args=(self._encode_loop,), name="video-encode", daemon=True)
+        decoder.start()
+        encoder.start()
+        _running.add(self)
+
+        try:
+            self._infer_loop()
+        except BaseException as e:
+            self._fail(e)
+        finally:
+            # Toujours débloquer l'encodeur, même en cas d'erreur
+            self._put(self.inferred, _END, None, force=True)
+            decoder.join()
+            encoder.join()
+            _running.discard(self)
+
+        if self._error is not None:
+            raise self._error
+
+        report = {name: s.as_dict() for name, s in self.stats.items()}
+        report["wall_s"] = round(time.perf_counter() - start, 4)
+        return report
+
+    def _guard(self, loop):
+        try:
+            loop()
+        except BaseException as e:
+            self._fail(e)
+
+    def _fail(self, error):
+        if self._error is None:
+            self._error = error
+        self._stop.set()
+
+    def _decode_loop(self):
+        stats = self.stats["decode"]
+        try:
+            while not self._stop.is_set():
+                t0 = time.perf_counter()
+                frames = self.read_batch()
+                stats.busy_time += time.perf_counter() - t0
+                if not frames:
+                    break
+                stats.items += len(frames)
+                if not self._put(self.decoded, frames, stats):
+                    break
+        finally:
+            self._put(self.decoded, _END, None, force=True)
+
+    def _infer_loop(self):
+        stats = self.stats["infer"]
+        while True:
+            frames = self._get(self.decoded, stats)
+            if frames is _END or frames is None:
+                break
+            t0 = time.perf_counter()
+            results = self.infer(frames)
+            stats.busy_time += time.perf_counter() - t0
+            stats.items += len(frames)
+            if not self._put(self.inferred, (frames, results), stats):
+                break
+
+    def _encode_loop(self):
+        stats = self.stats["encode"]
+        while True:
+            item = self._get(self.inferred, stats)
+            if item is _END or item is None:
+                break
+            frames, results = item
+            t0 = time.perf_counter()
+            self.consume(frames, results)
+            stats.busy_time += time.perf_counter() - t0
+            stats.items += len(frames)
+
+    def _put(self, q, item, stats, force=False) -> bool:
+        """Ajoute dans la file en comptant les blocages; False si le pipeline s'arrête"""
+        try:
+            q.put_nowait(item)
+            return True
+        except queue.Full:
+            pass
+
+        t0 = time.perf_counter()
+        if stats is not None:
+            stats.stalls += 1
+        while True:
+            if self._stop.is_set() and not force:
+                return False
+            try:
+                q.put(item, timeout=0.1)
+                break
+            except queue.Full:
+                if self._stop.is_set() and force:
+                    # Le consommateur est arrêté : vider la file pour passer le signal de fin
+                    self._drain(q)
+        if stats is not None:
+            stats.stall_time += time.perf_counter() - t0
+        return True
+
+    def _get(self, q, stats):
+        """Retire de la file en comptant les attentes; None si le pipeline s'arrête"""
+        try:
+            return q.get_nowait()
+        except queue.Empty:
+            pass
+
+        t0 = time.perf_counter()
+        stats.stalls += 1
+        while True:
+            try:
+                item = q.get(timeout=0.1)
+                break
+            except queue.Empty:
+                if self._stop.is_set():
+                    return None
+        stats.stall_time += time.perf_counter() - t0
+        return item
+
+    @staticmethod
+    def _drain(q):
+        try:
+            while True:
+                q.get_nowait()
+        except queue.Empty:
+            pass
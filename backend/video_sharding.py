@@ -0,0 +1,411 @@
+import multiprocessing
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed, wait
+
+import cv2
+import numpy as np
+import supervision as sv
+
+from box_ops import match_pairs
+from counting import COUNTER_TTL_FRAMES, LineCounter, UniqueVehicleCounter, ZoneCounter, counter_ttl
+from metrics import FRAMES_PROCESSED, VIDEO_FPS
+from retention import active_output
+from track_log import load_track_log, track_log_paths, write_track_log
+from video_encoding import FFMPEG_BINARY, OpenCVWriter, encoding_options
+
+# Processus de traitement vidéo (0 = désactivé, tout tourne dans le processus de l'API)
+VIDEO_PROCESS_WORKERS = int(os.environ.get("VIDEO_PROCESS_WORKERS", "0"))
+
+# Une vidéo n'est découpée que si chaque segment garde au moins ce nombre de frames
+VIDEO_SEGMENT_MIN_FRAMES = int(os.environ.get("VIDEO_SEGMENT_MIN_FRAMES", "900"))
+
+# Frames rejouées avant chaque segment pour amorcer le tracker et raccorder les ids
+VIDEO_SEGMENT_OVERLAP = int(os.environ.get("VIDEO_SEGMENT_OVERLAP", "30"))
+
+
+def _init_worker(threads: int):
+    """Initialisation d'un processus : threads limités, modèle chargé une fois"""
+    cv2.setNumThreads(threads)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+    # Sous spawn, app.py est réimporté (__mp_main__) avant l'initialisation : le
+    # registre existe déjà avec MODEL_INSTANCES du parent. Un processus ne traite
+    # qu'un segment à la fois, une instance suffit.
+    from model_registry import registry
+    registry.warmup(instances=1)
+
+
+def _run_segment(video_path: str, output_prefix: str, track: bool, start_frame: int, end_frame, warmup_frames: int,
+                 options: dict) -> dict:
+    from inference_tracking import _process_video
+    predicted = []
+    result = _process_video(video_path, output_prefix, track, start_frame=start_frame, end_frame=end_frame,
+                            warmup_frames=warmup_frames, predicted_frames=predicted, **options)
+    # Frames aux boîtes extrapolées : exclues du comptage ligne / zone à l'assemblage
+    result["predicted_frames"] = [frame for frame in predicted if frame > start_frame]
+    return result
+
+
+def plan_segments(total_frames: int, workers: int, min_frames: int = VIDEO_SEGMENT_MIN_FRAMES) -> list:
+    """Découpe [0, total_frames) en segments contigus de taille égale"""
+    count = max(1, min(workers, total_frames // max(1, min_frames)))
+    bounds = np.linspace(0, total_frames, count + 1).astype(int)
+    return [(int(start), int(end)) for start, end in zip(bounds[:-1], bounds[1:])]
+
+
+def _frame_slice(log: np.ndarray, frame: int) -> np.ndarray:
+    frames = log["frame"]
+    return log[np.searchsorted(frames, frame, side="left"):np.searchsorted(frames, frame, side="right")]
+
+
+def reconcile_tracks(logs: list, starts: list, overlap: int, min_votes: int = None) -> list:
+    """Table tracker_id local -> id global pour chaque segment.
+
+    Les ``overlap`` frames qui précèdent un segment ont été traitées par les
+    deux segments voisins : les boîtes y sont appariées par IoU et chaque
+    track du segment hérite de l'id global du track précédent le plus
+    souvent apparié. Les autres reçoivent un nouvel id.
+    """
+    min_votes = max(1, overlap // 4) if min_votes is None else min_votes
+    next_id = 1
+    mappings = []
+    for index, log in enumerate(logs):
+        mapping = {}
+        if index > 0 and overlap > 0:
+            previous, previous_mapping = logs[index - 1], mappings[index - 1]
+            votes = Counter()
+            for frame in range(starts[index] - overlap + 1, starts[index] + 1):
+                a, b = _frame_slice(previous, frame), _frame_slice(log, frame)
+                for i, j, _ in match_pairs(a["xyxy"], b["xyxy"]):
+                    votes[(int(a["tracker_id"][i]), int(b["tracker_id"][j]))] += 1
+
+            inherited = set()
+            for (previous_id, local_id), count in votes.most_common():
+                if count < min_votes:
+                    break
+                if local_id in mapping or previous_id in inherited or previous_id not in previous_mapping:
+                    continue
+                mapping[local_id] = previous_mapping[previous_id]
+                inherited.add(previous_id)
+
+        for local_id in np.unique(log["tracker_id"]).tolist():
+            if local_id >= 0 and local_id not in mapping:
+                mapping[local_id] = next_id
+                next_id += 1
+        mappings.append(mapping)
+    return mappings
+
+
+def stitch_logs(logs: list, starts: list, mappings: list) -> list:
+    """Lignes de chaque segment sans ses frames d'amorçage, ids globaux"""
+    parts = []
+    for log, start, mapping in zip(logs, starts, mappings):
+        part = np.array(log[log["frame"] > start])
+        if len(part) and mapping:
+            local_ids = np.fromiter(mapping.keys(), dtype=np.int64)
+            global_ids = np.fromiter(mapping.values(), dtype=np.int64)
+            order = np.argsort(local_ids)
+            local_ids, global_ids = local_ids[order], global_ids[order]
+            tracked = part["tracker_id"] >= 0
+            positions = np.searchsorted(local_ids, part["tracker_id"][tracked])
+            part["tracker_id"][tracked] = global_ids[positions]
+        parts.append(part)
+    return parts
+
+
+def replay_counts(log: np.ndarray, frames: int, class_names: dict, track: bool, line=None, zone=None,
+                  ttl_frames: int = COUNTER_TTL_FRAMES, predicted_frames=()) -> dict:
+    """Recalcule les comptages à partir du journal assemblé, sans modèle
+
+    ``ttl_frames`` : même expiration que les compteurs des segments (counter_ttl).
+    ``predicted_frames`` : frames sautées (stride), ignorées par la ligne et la
+    zone comme dans _process_video.
+    """
+    if not track:
+        counts = defaultdict(int)
+        for class_id, count in zip(*np.unique(log["class_id"], return_counts=True)):
+            counts[class_names.get(int(class_id), "unknown")] += int(count)
+        return {"final_counts": dict(counts), "total_vehicles": int(len(log))}
+
+    unique_counter = UniqueVehicleCounter(class_names, ttl_frames)
+    line_counter = LineCounter(line, class_names, ttl_frames) if line else None
+    zone_counter = ZoneCounter(zone, class_names, ttl_frames) if zone else None
+    position_counters = [c for c in (line_counter, zone_counter) if c is not None]
+    predicted_frames = set(predicted_frames)
+
+    bounds = np.searchsorted(log["frame"], np.arange(1, frames + 2), side="left")
+    for frame_index in range(1, frames + 1):
+        rows = log[bounds[frame_index - 1]:bounds[frame_index]]
+        if len(rows):
+            detections = sv.Detections(
+                xyxy=rows["xyxy"].astype(np.float32),
+                confidence=rows["confidence"].astype(np.float32),
+                class_id=rows["class_id"].astype(int),
+                tracker_id=rows["tracker_id"].astype(int),
+            )
+        else:
+            detections = sv.Detections.empty()
+        unique_counter.update(frame_index, detections)
+        if frame_index not in predicted_frames:
+            for counter in position_counters:
+                counter.update(frame_index, detections)
+
+    return {
+        "final_counts": dict(unique_counter.counts),
+        "total_vehicles": unique_counter.total,
+        **({"line_counts": line_counter.as_dict()} if line_counter is not None else {}),
+        **({"zone_counts": zone_counter.as_dict()} if zone_counter is not None else {}),
+    }
+
+
+def concat_videos(paths: list, output_path: str):
+    """Met bout à bout les vidéos des segments (copie sans réencodage avec ffmpeg)"""
+    if shutil.which(FFMPEG_BINARY) is not None:
+        with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as f:
+            for path in paths:
+                f.write(f"file '{os.path.abspath(path)}'\n")
+            list_path = f.name
+        try:
+            subprocess.run(
+                [FFMPEG_BINARY, "-y", "-loglevel", "error", "-f", "concat", "-safe", "0", "-i", list_path,
+                 "-c", "copy", "-movflags", "+faststart", output_path],
+                check=True, capture_output=True,
+            )
+        finally:
+            os.remove(list_path)
+        return
+
+    # Sans ffmpeg : relecture et réencodage mp4v
+    writer = None
+    try:
+        for path in paths:
+            cap = cv2.VideoCapture(path)
+            while True:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                if writer is None:
+                    writer = OpenCVWriter(output_path, cap.get(cv2.CAP_PROP_FPS), (frame.shape[1], frame.shape[0]))
+                writer.write(frame)
+            cap.release()
+    finally:
+        if writer is not None:
+            writer.release()
+
+
+def _remove_segment_outputs(result: dict):
+    run_id = result.get("run_id")
+    if not run_id:
+        return
+    stem = os.path.join("static", run_id)
+    for path in (stem + ".mp4", stem + "_preview.jpg", *track_log_paths(stem + ".mp4")):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+class ShardedVideoProcessor:
+    """Répartit les traitements vidéo sur un pool de processus.
+
+    Chaque processus charge son modèle une seule fois. Une vidéo courte est
+    traitée entière par un processus; une vidéo longue est découpée en
+    segments traités en parallèle, puis la vidéo, le journal des tracks et
+    les comptages sont reconstitués dans le processus de l'API.
+    """
+
+    def __init__(self, workers: int = VIDEO_PROCESS_WORKERS, min_segment_frames: int = VIDEO_SEGMENT_MIN_FRAMES,
+                 overlap: int = VIDEO_SEGMENT_OVERLAP):
+        self.workers = max(1, workers)
+        self.min_segment_frames = max(min_segment_frames, overlap + 1)
+        self.overlap = overlap
+        self.jobs = 0
+        self.segments = 0
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawn : pas de fork d'un processus qui a déjà des threads (torch, pipeline)
+                threads = max(1, (os.cpu_count() or 1) // self.workers)
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(threads,),
+                )
+            return self._executor
+
+    def stats(self) -> dict:
+        return {"workers": self.workers, "jobs": self.jobs, "segments": self.segments,
+                "min_segment_frames": self.min_segment_frames, "overlap": self.overlap}
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def process(self, video_path: str, output_prefix: str, track: bool, progress_callback=None, line=None,
+                zone=None, **options) -> dict:
+        start_time = time.perf_counter()
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            return {"success": False, "error": "Impossible d'ouvrir la vidéo"}
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        cap.release()
+
+        segments = plan_segments(total_frames, self.workers, self.min_segment_frames)
+        with self._lock:
+            self.jobs += 1
+            self.segments += len(segments)
+
+        # Les processus nomment leurs sorties "{préfixe}_{horodatage}_{suffixe}" : un préfixe
+        # propre au job suffit à les protéger de la rétention pendant le traitement
+        token = uuid.uuid4().hex[:8]
+        job_prefix, segment_prefix = f"{output_prefix}_{token}", f"segment_{token}"
+        with active_output(job_prefix), active_output(segment_prefix):
+            if len(segments) == 1:
+                # Vidéo courte : un processus la traite entière, sans assemblage
+                future = self.executor.submit(_run_segment, video_path, job_prefix, track, 0, None, 0,
+                                              {**options, "line": line, "zone": zone})
+                result = future.result()
+                result.pop("predicted_frames", None)
+                if progress_callback is not None:
+                    progress_callback(total_frames, total_frames)
+                return result
+
+            print(f"Vidéo découpée en {len(segments)} segments: {segments}")
+            futures = {}
+            for index, (start, end) in enumerate(segments):
+                # Le dernier segment lit jusqu'à la fin (CAP_PROP_FRAME_COUNT est une estimation)
+                end_frame = None if index == len(segments) - 1 else end
+                warmup = min(self.overlap, start)
+                future = self.executor.submit(_run_segment, video_path, segment_prefix, track, start, end_frame,
+                                              warmup, dict(options))
+                futures[future] = index
+
+            results = [None] * len(segments)
+            done_frames = 0
+            try:
+                for future in as_completed(futures):
+                    index = futures[future]
+                    results[index] = future.result()
+                    if not results[index].get("success"):
+                        raise RuntimeError(results[index].get("error"))
+                    done_frames += segments[index][1] - segments[index][0]
+                    if progress_callback is not None:
+                        progress_callback(min(done_frames, total_frames), total_frames)
+                return self._assemble(results, segments, job_prefix, track, fps, line, zone, options, start_time)
+            finally:
+                for future in futures:
+                    future.cancel()
+                # Les segments déjà lancés ne s'annulent pas : attendre qu'ils aient fini
+                # d'écrire pour supprimer aussi leurs sorties
+                wait(futures)
+                for future, index in futures.items():
+                    if results[index] is None and not future.cancelled() and future.exception() is None:
+                        results[index] = future.result()
+                for result in results:
+                    if result is not None:
+                        _remove_segment_outputs(result)
+
+    def _assemble(self, results, segments, output_prefix, track, fps, line, zone, options, start_time) -> dict:
+        starts = [start for start, _ in segments]
+        logs, metas = zip(*(load_track_log(os.path.join("static", r["run_id"] + ".mp4")) for r in results))
+        class_names = {int(k): v for k, v in metas[0]["class_names"].items()}
+        frames = max(meta["frames"] for meta in metas)
+
+        run_id = f"{output_prefix}_{int(time.time())}_{uuid.uuid4().hex[:8]}"
+        output_video_path = os.path.join("static", run_id + ".mp4")
+
+        mappings = reconcile_tracks(logs, starts, self.overlap) if track else [{} for _ in logs]
+        parts = stitch_logs(logs, starts, mappings)
+        write_track_log(output_video_path, parts, fps, frames, class_names)
+        ttl = counter_ttl(results[0]["sampling"].get("max_gap", 1))
+        predicted = [frame for r in results for frame in r.get("predicted_frames", ())]
+        counts = replay_counts(np.concatenate(parts), frames, class_names, track, line, zone, ttl, predicted)
+        del logs
+
+        encoding = results[0].get("encoding") or encoding_options()
+        if encoding["codec"] != "none":
+            concat_videos([os.path.join("static", r["processed_video"]) for r in results], output_video_path)
+
+        preview_url = None
+        if results[0].get("preview_url"):
+            preview_path = os.path.splitext(output_video_path)[0] + "_preview.jpg"
+            os.replace(os.path.join("static", os.path.basename(results[0]["preview_url"])), preview_path)
+            preview_url = f"/static/{os.path.basename(preview_path)}"
+
+        wall = round(time.perf_counter() - start_time, 4)
+        pipeline = "video_tracking" if track else "video_detection"
+        FRAMES_PROCESSED.inc(frames, pipeline=pipeline)
+        if wall > 0:
+            VIDEO_FPS.observe(frames / wall, pipeline=pipeline)
+
+        sampled = [r["sampling"] for r in results]
+        detected = sum(s["detected_frames"] for s in sampled)
+        sampled_frames = sum(s["frames"] for s in sampled)
+        return {
+            "success": True,
+            "processed_video": os.path.basename(output_video_path) if encoding["codec"] != "none" else None,
+            "encoding": encoding,
+            "run_id": run_id,
+            "roi": results[0].get("roi"),
+            "classes": results[0].get("classes"),
+            "tiling": {**results[0]["tiling"], "tiled_frames": sum(r["tiling"]["tiled_frames"] for r in results)}
+            if results[0].get("tiling") else None,
+            "track_log_url": f"/api/tracks/{run_id}",
+            "preview_image": results[0].get("preview_image"),
+            "preview_url": preview_url,
+            **counts,
+            "pipeline_stats": {"segments": [r["pipeline_stats"] for r in results], "wall_s": wall},
+            "sampling": {
+                "adaptive": sampled[0]["adaptive"],
+                "frames": sampled_frames,
+                "detected_frames": detected,
+                "detection_rate": round(detected / sampled_frames, 3) if sampled_frames else 0.0,
+            },
+            "segments": [list(segment) for segment in segments],
+        }
+
+
+sharded = ShardedVideoProcessor()
+
+
+def process_video_detection(video_file, progress_callback=None, **options) -> dict:
+    """Comme inference_tracking.process_video_detection, réparti sur le pool de processus"""
+    try:
+        print("=== PROCESS_VIDEO_DETECTION (SHARDED) START ===")
+        return sharded.process(video_file, "detection", False, progress_callback, **options)
+    except Exception as e:
+        print(f"=== PROCESS_VIDEO_DETECTION (SHARDED) ERROR ===")
+        print(f"Erreur: {e}")
+        import traceback
+        traceback.print_exc()
+        return {"success": False, "error": str(e)}
+
+
+def process_video_tracking(video_file, progress_callback=None, line=None, zone=None, **options) -> dict:
+    """Comme inference_tracking.process_video_tracking, réparti sur le pool de processus"""
+    try:
+        print("=== PROCESS_VIDEO (SHARDED) START ===")
+        return sharded.process(video_file, "output", True, progress_callback, line=line, zone=zone, **options)
+    except Exception as e:
+        print(f"=== PROCESS_VIDEO (SHARDED) ERROR ===")
+        print(f"Erreur: {e}")
+        import traceback
+        traceback.print_exc()
+        return {"success": False, "error": str(e)}
@@ -19,54 +19,113 @@ export interface ProcessVideoResponse {
   final_counts: Record<string, number>;
 }
 
-export const processImage = async (file: File): Promise<ProcessImageResponse> => {
-  const formData = new FormData();
-  formData.append('file', file);
-  
-  const response = await fetch(`${API_BASE_URL}/process-image`, {
-    method: 'POST',
-    body: formData,
-  });
-  
+export interface VideoJobStatus {
+  success: boolean;
+  job_id: string;
+  status: 'queued' | 'running' | 'done' | 'failed';
+  progress: {
+    frame: number;
+    total_frames: number;
+    percent: number;
+  };
+  error?: string | null;
+}
+
+const JOB_POLL_INTERVAL_MS = 1000;
+
+const sleep = (ms: number) => new Promise((resolve) => setTimeout(resolve, ms));
+
+export const getVideoJob = async (jobId: string): Promise<VideoJobStatus> => {
+  const response = await fetch(`${API_BASE_URL}/jobs/${jobId}`);
+
   if (!response.ok) {
-    throw new Error('Failed to process image');
+    throw new Error('Failed to fetch job status');
   }
-  
+
   return response.json();
 };
 
-export const processVideoDetection = async (file: File): Promise<ProcessVideoResponse> => {
+const submitVideoJob = async (
+  endpoint: string,
+  file: File,
+  onProgress?: (status: VideoJobStatus) => void,
+): Promise<ProcessVideoResponse> => {
   const formData = new FormData();
   formData.append('file', file);
-  
-  const response = await fetch(`${API_BASE_URL}/process-video`, {
+
+  const response = await fetch(`${API_BASE_URL}/${endpoint}`, {
     method: 'POST',
     body: formData,
   });
-  
+
+  if (response.status === 429) {
+    throw new Error('Server is busy, please retry later');
+  }
+
   if (!response.ok) {
     throw new Error('Failed to process video');
   }
-  
-  return response.json();
+
+  const submitted = await response.json();
+  if (!submitted.success) {
+    throw new Error(submitted.error || 'Failed to process video');
+  }
+
+  // Poll the job until the backend has finished processing the video
+  while (true) {
+    const status = await getVideoJob(submitted.job_id);
+    onProgress?.(status);
+
+    if (status.status === 'failed') {
+      throw new Error(status.error || 'Failed to process video');
+    }
+
+    if (status.status === 'done') {
+      break;
+    }
+
+    await sleep(JOB_POLL_INTERVAL_MS);
+  }
+
+  const result = await fetch(`${API_BASE_URL}/jobs/${submitted.job_id}/result`);
+  if (!result.ok) {
+    throw new Error('Failed to fetch video result');
+  }
+
+  const payload = await result.json();
+  if (!payload.success) {
+    throw new Error(payload.error || 'Failed to process video');
+  }
+
+  return payload;
 };
 
-export const processVideoTracking = async (file: File): Promise<ProcessVideoResponse> => {
+export const processImage = async (file: File): Promise<ProcessImageResponse> => {
   const formData = new FormData();
   formData.append('file', file);
   
-  const response = await fetch(`${API_BASE_URL}/process-video-tracking`, {
+  const response = await fetch(`${API_BASE_URL}/process-image`, {
     method: 'POST',
     body: formData,
   });
   
   if (!response.ok) {
-    throw new Error('Failed to process video');
+    throw new Error('Failed to process image');
   }
   
   return response.json();
 };
 
+export const processVideoDetection = async (
+  file: File,
+  onProgress?: (status: VideoJobStatus) => void,
+): Promise<ProcessVideoResponse> => submitVideoJob('process-video', file, onProgress);
+
+export const processVideoTracking = async (
+  file: File,
+  onProgress?: (status: VideoJobStatus) => void,
+): Promise<ProcessVideoResponse> => submitVideoJob('process-video-tracking', file, onProgress);
+
 export const downloadVideo = async (filename: string): Promise<void> => {
   const response = await fetch(`${API_BASE_URL}/download-video/${filename}`);
   